@@ -0,0 +1,70 @@
+"""
+Micro-benchmark del re-ranking MMR: implementación vectorizada (src.core.retrieval)
+contra la ruta anterior del retriever (`as_retriever(search_type="mmr")`, que usa
+`maximal_marginal_relevance` de langchain) para distintos fetch_k.
+
+Uso: python -m benchmarks.bench_mmr [--dim 1536] [--k 8] [--repeat 20]
+No llama a OpenAI: usa vectores aleatorios y un índice Chroma con embeddings falsos.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from src.core.retrieval import MMRRetriever, mmr_select
+
+FETCH_KS = (20, 100, 500)
+
+def _timeit(fn, repeat: int) -> float:
+    """Mediana en milisegundos."""
+    fn()  # calentamiento
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+def bench_rerank(dim: int, k: int, repeat: int):
+    print(f"\nRe-ranking aislado (dim={dim}, k={k}), mediana en ms")
+    print(f"{'fetch_k':>8} {'langchain':>12} {'vectorizado':>12} {'speedup':>8}")
+    rng = np.random.default_rng(0)
+    for fetch_k in FETCH_KS:
+        query = rng.normal(size=dim).astype(np.float32)
+        candidates = rng.normal(size=(fetch_k, dim)).astype(np.float32)
+        reference = _timeit(lambda: maximal_marginal_relevance(query, candidates, k=k), repeat)
+        vectorized = _timeit(lambda: mmr_select(query, candidates, k), repeat)
+        print(f"{fetch_k:>8} {reference:>12.2f} {vectorized:>12.2f} {reference / vectorized:>7.1f}x")
+
+def bench_retriever(dim: int, k: int, repeat: int, corpus: int):
+    print(f"\nRetriever completo sobre Chroma ({corpus} fragmentos, dim={dim}, k={k}), mediana en ms")
+    print(f"{'fetch_k':>8} {'as_retriever':>12} {'MMRRetriever':>12} {'speedup':>8}")
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    texts = [f"fragmento de prueba número {i}" for i in range(corpus)]
+    with tempfile.TemporaryDirectory() as tmp:
+        vs = Chroma(persist_directory=tmp, embedding_function=embeddings)
+        for start in range(0, corpus, 1000):
+            vs.add_texts(texts[start:start + 1000])
+        query = "¿cada cuánto se vacuna un cachorro?"
+        for fetch_k in FETCH_KS:
+            old = vs.as_retriever(search_type="mmr", search_kwargs={"k": k, "fetch_k": fetch_k})
+            new = MMRRetriever(vectorstore=vs, k=k, fetch_k=fetch_k)
+            reference = _timeit(lambda: old.invoke(query), repeat)
+            vectorized = _timeit(lambda: new.invoke(query), repeat)
+            print(f"{fetch_k:>8} {reference:>12.2f} {vectorized:>12.2f} {reference / vectorized:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del re-ranking MMR.")
+    parser.add_argument("--dim", type=int, default=1536, help="dimensión de los embeddings (1536 = text-embedding-ada-002)")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--corpus", type=int, default=5000, help="fragmentos en el índice del benchmark completo")
+    args = parser.parse_args()
+
+    bench_rerank(args.dim, args.k, args.repeat)
+    bench_retriever(args.dim, args.k, args.repeat, args.corpus)
+
+if __name__ == "__main__":
+    main()
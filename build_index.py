@@ -0,0 +1,31 @@
+import argparse
+import json
+import os
+from src.core.vectorstore import build_snapshot, DATA_PATH, SNAPSHOTS_PATH
+
+# construye el índice offline (ej: en CI) para que los nodos solo tengan que abrirlo
+# uso: python build_index.py [--data-path ...] [--output ...] [--name ...]
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye un snapshot versionado e inmutable de la base de conocimientos.")
+    parser.add_argument("--data-path", default=DATA_PATH, help=f"carpeta con los documentos (por defecto {DATA_PATH})")
+    parser.add_argument("--output", default=SNAPSHOTS_PATH, help=f"carpeta de snapshots (por defecto {SNAPSHOTS_PATH})")
+    parser.add_argument("--name", default=None, help="nombre del snapshot (por defecto fecha + hash del manifest)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_path) or not os.listdir(args.data_path):
+        print(f"❌ No hay documentos en {args.data_path}")
+        return 1
+
+    print(f"🧠 Construyendo índice desde {args.data_path}...")
+    snapshot_dir = build_snapshot(args.data_path, args.output, args.name)
+
+    with open(os.path.join(snapshot_dir, "snapshot.json"), "r", encoding="utf-8") as f:
+        info = json.load(f)
+    print(f"✅ Snapshot '{info['name']}' listo en {snapshot_dir}")
+    print(f"   {info['files']} archivos, {info['chunk_count']} fragmentos, modelo {info['embedding_model']}, {info['timings']['total_s']}s")
+    print(f"   Para usarlo: VECTORSTORE_SNAPSHOT={info['name']} python main.py")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
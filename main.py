@@ -1,7 +1,7 @@
 import sys
 from langchain_core.messages import HumanMessage
-from src.graph.workflow import create_graph
-from src.core.vectorstore import get_vectorstore
+from src.graph.workflow import create_graph, stream_graph
+from src.core.vectorstore import get_vectorstore, start_watcher, KB_HOT_RELOAD
 
 # colores para la terminal pq se ve más bonito
 GREEN = "\033[92m"
@@ -17,6 +17,10 @@ def main():
         # forzar el OCR al inicio, no durante el chat
         get_vectorstore() 
         print("✅ Cerebro cargado y listo.")
+        # opcional: recargar manuales nuevos sin reiniciar el asistente
+        if KB_HOT_RELOAD:
+            start_watcher()
+            print("👀 Recarga en caliente activa: los cambios en los manuales se aplican solos.")
     except Exception as e:
         print(f"❌ Error cargando conocimientos: {e}")
         return
@@ -50,9 +54,16 @@ def main():
                 "availability_attempts": availability_counter  # persistir contador
             }
 
-            # ejecutar el grafo
-            print(f"{BLUE}VetCare AI pensando...{RESET}")
-            result = app.invoke(initial_state)
+            # ejecutar el grafo mostrando la respuesta token a token (lo que importa es el primer token)
+            print(f"{BLUE}VetCare AI:{RESET} ", end="", flush=True)
+            streamed = ""
+            result = None
+            for kind, payload in stream_graph(app, initial_state):
+                if kind == "token":
+                    print(payload, end="", flush=True)
+                    streamed += payload
+                else:
+                    result = payload
             
             # extraer la respuesta final y el estado actualizado
             last_message = result["messages"][-1].content
@@ -61,7 +72,12 @@ def main():
             
             chat_history = result["messages"] # actualizar historial completo
             
-            print(f"{BLUE}VetCare AI:{RESET} {last_message}\n")
+            # las respuestas que no se generaron con el LLM (o un error a mitad de la generación) llegan completas al final
+            if streamed != last_message:
+                if streamed:
+                    print()
+                print(last_message, end="")
+            print("\n")
 
         except KeyboardInterrupt:
             print("\nSalida forzada.")
@@ -5,7 +5,10 @@ from typing import Optional
 import re
 from src.core.llm import get_llm
 from src.state import AgentState
-from src.tools.mock_api import check_availability
+from datetime import datetime
+from src.tools.mock_api import book_appointment, find_available_slots, request_human_agent
+from src.utils.booking_extractor import extract_asked_field, extract_offered_choice
+from src.utils.datetime_parser import format_slot, get_datetime_parser, parse_desired_time
 from src.core.logger import get_logger
 
 
@@ -52,180 +55,321 @@ class BookingSchema(BaseModel):
         
         return v
 
-def booking_node(state: AgentState):
-    """
-    Gestiona el flujo de agendamiento: Recolecta datos -> Verifica disponibilidad -> Confirma.
-    """
-    logger.info("--- AGENTE BOOKING: Gestionando cita ---")
-    
-    # recuperar estado actual
-    messages = state["messages"]
+    @validator('desired_time')
+    def validate_desired_time(cls, v):
+        """normaliza la fecha y hora a un horario concreto (ej: "sábado 18/10/2026 a las 16:00")"""
+        if v is None:
+            return v
+
+        slot = parse_desired_time(v)
+        if slot is None:
+            raise ValueError('indica el día y la hora (ej: "mañana a las 16:00", "el lunes a las 10")')
+        if slot <= get_datetime_parser().clock():
+            raise ValueError('ese horario ya pasó, indica una fecha y hora futuras')
+
+        return format_slot(slot)
+
+# campos obligatorios (validación)
+REQUIRED_FIELDS = ["owner_name", "phone", "email", "pet_name", "pet_species", "pet_age", "reason", "desired_time"]
+# TC-E12: intentos de disponibilidad antes de escalar a un humano
+MAX_ATTEMPTS = 3
+
+def _start(state: AgentState) -> dict:
+    """Info de la cita en curso."""
     current_info = state.get("booking_info", {}) or {} # asegurar que sea dict para parseo
-    last_message = messages[-1]
-    
     if "status" not in current_info:
         current_info["status"] = "in_progress"
+    return current_info
 
-    # --- FASE 1: ACTUALIZACIÓN DE ESTADO (Extracción) ---
+def _extraction_chain():
+    llm = get_llm()
+    # modo estructurado para que actúe como un extractor de datos
+    extractor = llm.with_structured_output(BookingSchema, method="function_calling")
     
-    # si el último mensaje es del usuario, extraer datos nuevos
-    if not isinstance(last_message, (AIMessage, ToolMessage)):
-        llm = get_llm()
-        # modo estructurado para que actúe como un extractor de datos
-        extractor = llm.with_structured_output(BookingSchema, method="function_calling")
+    extraction_prompt = ChatPromptTemplate.from_messages([
+        ("system", """Eres un experto extrayendo datos para citas veterinarias.
+        Tu trabajo es leer el último mensaje del usuario y actualizar la información YA CONOCIDA.
+        Si el usuario menciona un dato nuevo, agrégalo. Si no, mantén lo que ya tenías.
         
-        extraction_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Eres un experto extrayendo datos para citas veterinarias.
-            Tu trabajo es leer el último mensaje del usuario y actualizar la información YA CONOCIDA.
-            Si el usuario menciona un dato nuevo, agrégalo. Si no, mantén lo que ya tenías.
-            
-            Información actual conocida:
-            {current_info}
-            """),
-            ("human", "{user_input}"),
-        ])
-        
-        chain = extraction_prompt | extractor
-        try:
-            logger.info(f"   Analizando input: '{last_message.content}'")
-            # extracción
-            result = chain.invoke({
-                "current_info": str(current_info),
-                "user_input": last_message.content
-            })
-            
-            # actualizar solo los campos que el LLM encontró
-            result_dict = result.model_dump(exclude_none=True)
-            if result_dict:
-                logger.info(f"   📝 Datos extraídos: {result_dict}")
-                current_info.update(result_dict)
-            else:
-                logger.info("   ⚠️ No se extrajeron datos nuevos.")
-        
-        except ValidationError as ve:
-            # TC-E08, TC-E09: manejar errores de validación (email, teléfono inválidos)
-            logger.warning(f"validación fallida: {ve}")
-            
-            # identificar el campo problemático
-            error_field = ve.errors()[0]['loc'][0]
-            error_msg = ve.errors()[0]['msg']
-            
-            # mapeo de nombres técnicos a nombres amigables
-            field_names = {
-                "phone": "número de teléfono",
-                "email": "correo electrónico",
-                "pet_age": "edad de la mascota",
-                "owner_name": "nombre",
-                "reason": "motivo de la consulta"
-            }
-            
-            friendly_field = field_names.get(error_field, error_field)
-            friendly_msg = f"Disculpa, el {friendly_field} que proporcionaste no tiene un formato válido.\n\n{error_msg}\n\n¿Podrías intentar de nuevo?"
-            
-            return {
-                "messages": [AIMessage(content=friendly_msg)],
-                "booking_info": current_info  # mantener lo que ya teníamos
-            }
-                
-        except Exception as e:
-            logger.error(f"Error en extracción: {e}")
-            # continuar sin actualizar
+        Información actual conocida:
+        {current_info}
+        """),
+        ("human", "{user_input}"),
+    ])
+    
+    return extraction_prompt | extractor
 
-    # guardar la info actualizada en el estado global inmediatamente
+def _extraction_input(current_info: dict, user_input: str) -> dict:
+    logger.info(f"   Analizando input: '{user_input}'")
+    return {"current_info": str(current_info), "user_input": user_input}
 
-    # --- FASE 2: LÓGICA DE NEGOCIO Y DECISIÓN ---
+def _merge_extraction(current_info: dict, result: BookingSchema):
+    # actualizar solo los campos que el LLM encontró
+    result_dict = result.model_dump(exclude_none=True)
+    if result_dict:
+        logger.info(f"   📝 Datos extraídos: {result_dict}")
+        current_info.update(result_dict)
+    else:
+        logger.info("   ⚠️ No se extrajeron datos nuevos.")
+
+def _prefilled_fields(state: AgentState, current_info: dict) -> dict | None:
+    """Datos que no necesitan el extractor LLM: los que trajo el router o el campo pedido, si el mensaje es solo ese valor."""
+    if state.get("extracted_booking") is not None:
+        return state["extracted_booking"]
+    text = state["messages"][-1].content
+    if current_info.get("asking") == "desired_time" and current_info.get("offered_slots"):
+        # "la 2", "la primera": elige uno de los horarios que se ofrecieron
+        choice = extract_offered_choice(text, current_info["offered_slots"])
+        if choice is not None:
+            return choice
+    return extract_asked_field(text, current_info.get("asking"))
+
+def _apply_prefilled(current_info: dict, fields: dict) -> dict | None:
+    """Valida con BookingSchema los datos que extrajo el router; retorna la respuesta de error si alguno no es válido."""
+    try:
+        _merge_extraction(current_info, BookingSchema(**fields))
+    except ValidationError as ve:
+        return _validation_reply(ve, current_info)
+    return None
+
+def _input_for_extractor(state: AgentState, current_info: dict) -> tuple[str | None, dict | None]:
+    """
+    Aplica los datos que no necesitan el extractor LLM. Retorna (mensaje que sí debe pasar por el extractor,
+    respuesta de error de validación); ambos None si no hay mensaje nuevo del usuario o ya se aplicó.
+    """
+    # si el último mensaje no es del usuario no hay nada que extraer
+    if isinstance(state["messages"][-1], (AIMessage, ToolMessage)):
+        return None, None
+    # el router ya extrajo los datos en su misma llamada, o el mensaje es solo el dato que se pidió
+    # ("ana@mail.cl", "3 años"): en ambos casos no hace falta otra ida al LLM
+    prefilled = _prefilled_fields(state, current_info)
+    if prefilled is not None:
+        return None, _apply_prefilled(current_info, prefilled)
+    return state["messages"][-1].content, None
+
+def _apply_extraction(current_info: dict, result: BookingSchema | Exception) -> dict | None:
+    """Aplica el resultado del extractor LLM (o su error); retorna la respuesta de error si un dato no es válido."""
+    if isinstance(result, ValidationError):
+        return _validation_reply(result, current_info)
+    if isinstance(result, Exception):
+        # continuar sin actualizar
+        logger.error(f"Error en extracción: {result}")
+        return None
+    _merge_extraction(current_info, result)
+    return None
+
+def _validation_reply(ve: ValidationError, current_info: dict) -> dict:
+    # TC-E08, TC-E09: manejar errores de validación (email, teléfono inválidos)
+    logger.warning(f"validación fallida: {ve}")
+    
+    # identificar el campo problemático
+    error_field = ve.errors()[0]['loc'][0]
+    error_msg = ve.errors()[0]['msg']
     
-    # campos obligatorios (validación)
-    required_fields = ["owner_name", "phone", "email", "pet_name", "pet_species", "pet_age", "reason", "desired_time"]
-    missing = [f for f in required_fields if f not in current_info]
+    # mapeo de nombres técnicos a nombres amigables
+    field_names = {
+        "phone": "número de teléfono",
+        "email": "correo electrónico",
+        "pet_age": "edad de la mascota",
+        "owner_name": "nombre",
+        "reason": "motivo de la consulta",
+        "desired_time": "horario"
+    }
+    
+    friendly_field = field_names.get(error_field, error_field)
+    if error_field in REQUIRED_FIELDS:
+        # la próxima respuesta del usuario es, casi siempre, el dato corregido
+        current_info["asking"] = error_field
+    friendly_msg = f"Disculpa, el {friendly_field} que proporcionaste no tiene un formato válido.\n\n{error_msg}\n\n¿Podrías intentar de nuevo?"
+    
+    return {
+        "messages": [AIMessage(content=friendly_msg)],
+        "booking_info": current_info  # mantener lo que ya teníamos
+    }
+
+def _missing_data_reply(current_info: dict) -> dict | None:
+    """Pregunta por el primer dato faltante; None si ya están todos."""
+    missing = [f for f in REQUIRED_FIELDS if f not in current_info]
     
     # caso a: faltan datos -> preguntar nuevamente
-    if missing:
-        field_names_es = {
-            "owner_name": "su nombre completo",
-            "phone": "un teléfono de contacto",
-            "email": "un correo electrónico",
-            "pet_name": "el nombre de la mascota",
-            "pet_species": "la especie (perro, gato...)",
-            "pet_age": "la edad de la mascota",
-            "reason": "el motivo de la consulta",
-            "desired_time": "la fecha y hora deseada"
-        }
-        
-        # tomar el primer campo faltante para no abrumar al usuario
-        next_missing = missing[0]
-        question = f"Para agendar, necesito {field_names_es.get(next_missing, next_missing)}. ¿Podría indicármelo?"
-        
-        # si existen ciertos datos se personaliza un poco la pregunta
-        if current_info.get("pet_name"):
-            question = f"Perfecto. Para atender a {current_info['pet_name']}, necesito {field_names_es.get(next_missing, next_missing)}."
-            
-        return {
-            "messages": [AIMessage(content=question)],
-            "booking_info": current_info # persistir los cambios
-        }
-
-    # caso b: tenemos todo -> verificar disponibilidad (tool call)
+    if not missing:
+        return None
+    field_names_es = {
+        "owner_name": "su nombre completo",
+        "phone": "un teléfono de contacto",
+        "email": "un correo electrónico",
+        "pet_name": "el nombre de la mascota",
+        "pet_species": "la especie (perro, gato...)",
+        "pet_age": "la edad de la mascota",
+        "reason": "el motivo de la consulta",
+        "desired_time": "la fecha y hora deseada"
+    }
     
-    # aquí simulamos la llamada a la herramienta dentro del nodo para simplificar el flujo
-    # (en un grafo más complejo, la herramienta sería otro nodo, pero aquí lo haremos directo)
+    # tomar el primer campo faltante para no abrumar al usuario
+    next_missing = missing[0]
+    # recordar qué se preguntó: si la respuesta es solo ese dato se extrae sin LLM
+    current_info["asking"] = next_missing
+    question = f"Para agendar, necesito {field_names_es.get(next_missing, next_missing)}. ¿Podría indicármelo?"
     
+    # si existen ciertos datos se personaliza un poco la pregunta
+    if current_info.get("pet_name"):
+        question = f"Perfecto. Para atender a {current_info['pet_name']}, necesito {field_names_es.get(next_missing, next_missing)}."
+        
+    return {
+        "messages": [AIMessage(content=question)],
+        "booking_info": current_info # persistir los cambios
+    }
+
+def _availability_query(current_info: dict) -> tuple[dict | None, dict | None]:
+    """Retorna (pregunta por el dato faltante, consulta para la agenda): solo uno de los dos."""
+    reply = _missing_data_reply(current_info)
+    if reply:
+        return reply, None
     logger.info("   ✅ Todos los datos recolectados. Verificando disponibilidad...")
+    return None, _slot_query(current_info["desired_time"])
+
+def _slot_query(time_str: str) -> dict:
+    # día ISO y hora HH:MM para la agenda; la frase ya quedó interpretada (y memorizada) al validar
+    slot = parse_desired_time(time_str)
+    if slot is None:
+        return {"day": "generic", "hour": time_str}
+    return {"day": slot.date().isoformat(), "hour": f"{slot:%H:%M}"}
+
+def _confirmation_reply(current_info: dict, reservation: dict) -> dict:
     time_str = current_info["desired_time"]
+    response = f"¡Listo! He confirmado la cita para {current_info['pet_name']} ({current_info['pet_species']}) el {time_str}"
+    response += f" con {reservation['vet']} en {reservation['room']}. \nDatos de contacto: {current_info['owner_name']} - {current_info['phone']}.\n¡Nos vemos pronto!"
+    # limpiar el estado de booking y resetear contador después de confirmar
+    return {
+        "messages": [AIMessage(content=response)],
+        "booking_info": {},  # limpiar para la próxima
+        "availability_attempts": 0  # resetear contador
+    }
+
+def _escalation_reason(state: AgentState, current_info: dict, alternatives: list[str]) -> str | None:
+    """Motivo para escalar a un humano (dicho al usuario); None si todavía se pueden ofrecer alternativas."""
+    attempts = state.get("availability_attempts", 0) + 1
+    if not alternatives:
+        # la agenda no tiene nada cerca: no sirve seguir probando, aunque sea el primer intento
+        logger.warning("   ⚠️ sin horarios libres cercanos. escalando a humano...")
+        return f"Revisé la agenda y no quedan horarios libres cerca de '{current_info['desired_time']}'."
+    # TC-E12: si supera el máximo, escalar a humano automáticamente
+    if attempts >= MAX_ATTEMPTS:
+        logger.warning(f"   ⚠️ máximo de intentos alcanzado ({MAX_ATTEMPTS}). escalando a humano...")
+        return f"Veo que has intentado {attempts} horarios diferentes y ninguno está disponible."
+    return None
+
+def _ticket_info(current_info: dict, reason: str) -> dict:
+    # preparar información para el ticket
+    user_summary = f"Usuario: {current_info.get('owner_name', 'Desconocido')}, Teléfono: {current_info.get('phone', 'N/A')}, Email: {current_info.get('email', 'N/A')}"
+    issue_summary = f"Problemas de disponibilidad: {reason} Última hora solicitada: {current_info['desired_time']}"
+    return {"user_info": f"{user_summary} | {issue_summary}"}
+
+def _escalation_reply(ticket_id: str, reason: str) -> dict:
+    escalation_msg = f"{reason} 😓\n\n"
+    escalation_msg += f"He generado un ticket de atención prioritaria (**{ticket_id}**) para que un coordinador humano revise la agenda completa contigo y te ofrezca las mejores alternativas disponibles.\n\n"
+    escalation_msg += "Te contactaremos pronto a tu teléfono o email. ¡Gracias por tu paciencia!"
     
-    # TC-E12: obtener el contador de intentos de disponibilidad
-    attempts = state.get("availability_attempts", 0)
-    MAX_ATTEMPTS = 3
-    
-    # llamada a la herramienta (función importada)
-    is_available = check_availability.invoke({"day": "generic", "hour": time_str})
+    return {
+        "messages": [AIMessage(content=escalation_msg)],
+        "booking_info": {},  # limpiar
+        "availability_attempts": 0,  # resetear
+        "next_step": "end"  # terminar el flujo
+    }
+
+def _alternatives_reply(state: AgentState, current_info: dict, alternatives: list[str]) -> dict:
+    time_str = current_info["desired_time"]
+    # incrementar el contador de intentos fallidos
+    new_attempts = state.get("availability_attempts", 0) + 1
+    # el horario está ocupado: ofrecer directamente los libres más cercanos en vez de pedir otro a ciegas
+    offered = [format_slot(datetime.fromisoformat(slot)) for slot in alternatives]
+    response = f"Lo siento, verifiqué la agenda y el horario '{time_str}' NO está disponible. 😓\n"
+    response += "Estos son los horarios libres más cercanos:\n\n"
+    response += "\n".join(f"{i}. {slot}" for i, slot in enumerate(offered, 1))
+    response += "\n\n¿Te sirve alguno? Respóndeme con el número de la opción o indícame otra fecha u hora."
     
-    if is_available:
-        response = f"¡Listo! He confirmado la cita para {current_info['pet_name']} ({current_info['pet_species']}) el {time_str}. \nDatos de contacto: {current_info['owner_name']} - {current_info['phone']}.\n¡Nos vemos pronto!"
-        # limpiar el estado de booking y resetear contador después de confirmar
-        return {
-            "messages": [AIMessage(content=response)],
-            "booking_info": {},  # limpiar para la próxima
-            "availability_attempts": 0  # resetear contador
-        }
-    else:
-        # incrementar el contador de intentos fallidos
-        new_attempts = attempts + 1
-        
-        # TC-E12: si supera el máximo, escalar a humano automáticamente
-        if new_attempts >= MAX_ATTEMPTS:
-            from src.tools.mock_api import request_human_agent
-            
-            logger.warning(f"   ⚠️ máximo de intentos alcanzado ({MAX_ATTEMPTS}). escalando a humano...")
-            
-            # preparar información para el ticket
-            user_summary = f"Usuario: {current_info.get('owner_name', 'Desconocido')}, Teléfono: {current_info.get('phone', 'N/A')}, Email: {current_info.get('email', 'N/A')}"
-            issue_summary = f"Problemas de disponibilidad después de {MAX_ATTEMPTS} intentos. Última hora solicitada: {time_str}"
-            
-            ticket_id = request_human_agent.invoke({
-                "user_info": f"{user_summary} | {issue_summary}"
-            })
-            
-            escalation_msg = f"Veo que has intentado {MAX_ATTEMPTS} horarios diferentes y ninguno está disponible. 😓\n\n"
-            escalation_msg += f"He generado un ticket de atención prioritaria (**{ticket_id}**) para que un coordinador humano revise la agenda completa contigo y te ofrezca las mejores alternativas disponibles.\n\n"
-            escalation_msg += "Te contactaremos pronto a tu teléfono o email. ¡Gracias por tu paciencia!"
-            
-            return {
-                "messages": [AIMessage(content=escalation_msg)],
-                "booking_info": {},  # limpiar
-                "availability_attempts": 0,  # resetear
-                "next_step": "end"  # terminar el flujo
-            }
-        
-        # si aún hay intentos disponibles, continuar solicitando otra hora
-        response = f"Lo siento, verifiqué la agenda y el horario '{time_str}' NO está disponible. 😓\n"
-        response += f"(Intento {new_attempts}/{MAX_ATTEMPTS})\n\n"
-        response += "¿Podrías indicarme otra fecha u hora alternativa?"
-        
-        # borrar solo la hora para obligar a pedirla de nuevo
-        del current_info["desired_time"]
-        return {
-            "messages": [AIMessage(content=response)],
-            "booking_info": current_info,
-            "availability_attempts": new_attempts  # persistir el nuevo contador
-        }
\ No newline at end of file
+    # borrar solo la hora para obligar a elegirla de nuevo
+    del current_info["desired_time"]
+    current_info["asking"] = "desired_time"
+    current_info["offered_slots"] = offered
+    return {
+        "messages": [AIMessage(content=response)],
+        "booking_info": current_info,
+        "availability_attempts": new_attempts  # persistir el nuevo contador
+    }
+
+def booking_node(state: AgentState):
+    """
+    Gestiona el flujo de agendamiento: Recolecta datos -> Verifica disponibilidad -> Confirma.
+    """
+    logger.info("--- AGENTE BOOKING: Gestionando cita ---")
+    # los datos que trajo el router se consumen en este turno: en el siguiente manda el mensaje nuevo
+    return {**_booking_turn(state), "extracted_booking": None}
+
+def _booking_turn(state: AgentState) -> dict:
+    # recuperar estado actual
+    current_info = _start(state)
+
+    # --- FASE 1: ACTUALIZACIÓN DE ESTADO (Extracción) ---
+    user_input, reply = _input_for_extractor(state, current_info)
+    if user_input is not None:
+        chain = _extraction_chain()
+        try:
+            result = chain.invoke(_extraction_input(current_info, user_input))
+        except Exception as e:
+            result = e
+        reply = _apply_extraction(current_info, result)
+    if reply:
+        return reply
+
+    # --- FASE 2: LÓGICA DE NEGOCIO Y DECISIÓN ---
+    reply, query = _availability_query(current_info)
+    if reply:
+        return reply
+
+    # llamada a la herramienta (función importada): reserva el bloque si sigue libre
+    # (en un grafo más complejo, la herramienta sería otro nodo, pero aquí lo haremos directo)
+    reservation = book_appointment.invoke(query)
+    if reservation:
+        return _confirmation_reply(current_info, reservation)
+
+    alternatives = find_available_slots.invoke(query)
+    reason = _escalation_reason(state, current_info, alternatives)
+    if reason:
+        return _escalation_reply(request_human_agent.invoke(_ticket_info(current_info, reason)), reason)
+    return _alternatives_reply(state, current_info, alternatives)
+
+async def abooking_node(state: AgentState):
+    """
+    Versión async de `booking_node`: la extracción con el LLM y las herramientas de agenda se esperan sin bloquear.
+    """
+    logger.info("--- AGENTE BOOKING: Gestionando cita ---")
+    return {**await _abooking_turn(state), "extracted_booking": None}
+
+async def _abooking_turn(state: AgentState) -> dict:
+    current_info = _start(state)
+
+    user_input, reply = _input_for_extractor(state, current_info)
+    if user_input is not None:
+        chain = _extraction_chain()
+        try:
+            result = await chain.ainvoke(_extraction_input(current_info, user_input))
+        except Exception as e:
+            result = e
+        reply = _apply_extraction(current_info, result)
+    if reply:
+        return reply
+
+    reply, query = _availability_query(current_info)
+    if reply:
+        return reply
+
+    reservation = await book_appointment.ainvoke(query)
+    if reservation:
+        return _confirmation_reply(current_info, reservation)
+
+    alternatives = await find_available_slots.ainvoke(query)
+    reason = _escalation_reason(state, current_info, alternatives)
+    if reason:
+        return _escalation_reply(await request_human_agent.ainvoke(_ticket_info(current_info, reason)), reason)
+    return _alternatives_reply(state, current_info, alternatives)
@@ -1,8 +1,11 @@
+import asyncio
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import AIMessage
-from src.core.llm import get_llm
-from src.core.vectorstore import get_retriever
+from langchain_core.messages import AIMessage, HumanMessage
+from src.core.llm import get_llm, STREAM_TAG
+from src.core.vectorstore import get_retriever, get_index_version, get_faq_index
+from src.core.answer_cache import answer_key, get_answer_cache
+from src.core.context import pack_context
 from src.state import AgentState
 from src.core.logger import get_logger
 
@@ -46,53 +49,16 @@ def is_veterinary_domain(question: str) -> bool:
     # por defecto asumir que está en dominio (mejor falso positivo que negativo)
     return True
 
-def rag_node(state: AgentState):
-    """
-    Estrategia RAG: Recupera contexto y responde preguntas técnicas.
-    """
-    logger.info("--- AGENTE RAG: Procesando consulta ---")
-    
-    messages = state["messages"]
-    # asumir que la pregunta es el último mensaje del usuario
-    question = messages[-1].content
-    
-    # TC-E05: pre-filtro para detectar preguntas fuera del dominio veterinario
-    if not is_veterinary_domain(question):
-        logger.info(f"   ⚠️ pregunta fuera de dominio detectada: '{question}'")
-        off_topic_msg = """Hola! Soy el asistente veterinario de VetCare AI. 🐾
+OFF_TOPIC_MSG = """Hola! Soy el asistente veterinario de VetCare AI. 🐾
 
 Mi especialidad es ayudarte con temas relacionados con el cuidado y la salud de tus mascotas (perros, gatos, aves, conejos, etc.).
 
 La pregunta que hiciste parece estar fuera de mi área de conocimiento. ¿Tienes alguna consulta sobre tu mascota en la que pueda ayudarte?"""
-        
-        return {"messages": [AIMessage(content=off_topic_msg)]}
-    
-    llm = get_llm()
-    retriever = get_retriever()
-    
-    # 1. validación de seguridad: si no hay base de datos
-    if not retriever:
-        error_msg = "Lo siento, el sistema de conocimiento no está disponible temporalmente."
-        return {"messages": [AIMessage(content=error_msg)]}
+UNAVAILABLE_MSG = "Lo siento, el sistema de conocimiento no está disponible temporalmente."
+NO_DOCS_MSG = "Lo siento, no encontré información específica sobre eso en mis manuales."
+LLM_ERROR_MSG = "Tuve un problema generando la respuesta. Por favor intenta más tarde."
 
-    # 2. recuperación (Retrieval)
-    logger.info(f"Buscando en documentos sobre: '{question}'")
-    try:
-        docs = retriever.invoke(question)
-    except Exception as e:
-        logger.error(f"Error recuperando documentos: {e}")
-        docs = []
-    
-    # si no encuentra nada o falla
-    if not docs:
-         return {"messages": [AIMessage(content="Lo siento, no encontré información específica sobre eso en mis manuales.")]}
-
-    # formatear contexto
-    context = "\n\n".join([d.page_content for d in docs])
-    logger.info(f"Contexto recuperado: {len(docs)} fragmentos.")
-
-    # 3. generación de respuesta 
-    system_prompt = """Eres un asistente veterinario de la clínica 'VetCare AI'.
+SYSTEM_PROMPT = """Eres un asistente veterinario de la clínica 'VetCare AI'.
     Responde a la pregunta del usuario basándote EXCLUSIVAMENTE en el siguiente contexto.
     
     Reglas:
@@ -103,21 +69,211 @@ La pregunta que hiciste parece estar fuera de mi área de conocimiento. ¿Tienes
     Contexto:
     {context}
     """
-    
+
+def _reply(content: str) -> dict:
+    # retornamos el mensaje para que LangGraph lo añada al historial
+    return {"messages": [AIMessage(content=content)]}
+
+def _faq_answer(faq, question: str, embed_query) -> str | None:
+    """Respuesta precalculada de la tabla FAQ (coincidencia exacta o vecino más cercano)."""
+    try:
+        match = faq.match(question, embed_query)
+    except Exception as e:
+        logger.error(f"Error consultando la tabla FAQ: {e}")
+        return None
+    if not match:
+        return None
+    entry, similarity = match
+    logger.info(f"--- 📖 Respuesta desde FAQ: '{entry['question']}' (similitud {similarity:.3f}) ---")
+    return entry["answer"]
+
+def _answer_key(messages: list) -> str:
+    # la pregunta anterior del usuario es parte de la clave: un seguimiento depende de la conversación
+    previous = [m.content for m in messages[:-1] if isinstance(m, HumanMessage)]
+    return answer_key(messages[-1].content, previous[-1] if previous else None)
+
+def _cached_answer(answer_cache, question_embedding, index_version, key: str) -> str | None:
+    try:
+        cached = answer_cache.lookup(question_embedding, index_version, key)
+    except Exception as e:
+        logger.error(f"Error consultando la caché de respuestas: {e}")
+        return None
+    if not cached:
+        return None
+    answer, similarity = cached
+    logger.info(f"--- ⚡ Respuesta desde caché (similitud {similarity:.3f}, {answer_cache.stats()}) ---")
+    return answer
+
+def _rag_chain():
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
+        ("system", SYSTEM_PROMPT),
         ("human", "{question}"),
     ])
+    # el LLM solo se necesita si la respuesta no salió de la tabla FAQ ni de la caché
+    llm = get_llm()
+    # con app.stream(stream_mode="messages") los tokens de esta cadena llegan al usuario mientras se generan
+    return (prompt | llm | StrOutputParser()).with_config(tags=[STREAM_TAG])
+
+class _RagTurn:
+    """
+    Pasos de `rag_node` y `arag_node` que no dependen de si el nodo es sync o async: filtros, tabla FAQ,
+    caché de respuestas y armado del prompt. Cada nodo solo pone las llamadas de red (embedding,
+    recuperación y LLM).
+    """
+
+    def __init__(self, state: AgentState):
+        # asumir que la pregunta es el último mensaje del usuario
+        self.question = state["messages"][-1].content
+        self.use_cache = state.get("use_answer_cache", True) is not False
+        self.cache_key = _answer_key(state["messages"])
+        self.retriever = None
+        self.faq = None
+        self.answer_cache = None
+        self.index_version = 0
+        self.embedding = None
+
+    def early_reply(self) -> dict | None:
+        """Respuesta que no necesita ninguna llamada de red: fuera de dominio, sin base o pregunta exacta de la tabla FAQ."""
+        # TC-E05: pre-filtro para detectar preguntas fuera del dominio veterinario
+        if not is_veterinary_domain(self.question):
+            logger.info(f"   ⚠️ pregunta fuera de dominio detectada: '{self.question}'")
+            return _reply(OFF_TOPIC_MSG)
+
+        # validación de seguridad: si no hay base de datos
+        self.retriever = get_retriever()
+        if not self.retriever:
+            return _reply(UNAVAILABLE_MSG)
+
+        # preguntas frecuentes precalculadas en la ingesta: la respuesta sale directo de los manuales
+        self.faq = get_faq_index()
+        answer = _faq_answer(self.faq, self.question, None) if self.faq else None
+        if answer:
+            return _reply(answer)
+
+        # caché semántica: una pregunta casi idéntica ya respondida con este índice no vuelve al LLM
+        self.answer_cache = get_answer_cache() if self.use_cache else None
+        self.index_version = get_index_version()
+        return None
+
+    @property
+    def needs_embedding(self) -> bool:
+        # el embedding de la pregunta se pide una sola vez y sirve para la tabla FAQ y la caché
+        return bool(self.faq) or self.answer_cache is not None
+
+    def stored_answer(self, embedding: list[float] | None) -> dict | None:
+        """Respuesta por similitud con la tabla FAQ o la caché; la primera búsqueda en la tabla embebe sus preguntas."""
+        self.embedding = embedding
+        if embedding is None:
+            return None
+        answer = _faq_answer(self.faq, self.question, lambda _: embedding) if self.faq else None
+        if not answer and self.answer_cache is not None:
+            answer = _cached_answer(self.answer_cache, embedding, self.index_version, self.cache_key)
+        return _reply(answer) if answer else None
+
+    def prompt_input(self, docs: list) -> dict | None:
+        """Entrada de la cadena RAG; None si la recuperación no trajo nada."""
+        if not docs:
+            return None
+        # formatear contexto: sin texto repetido y dentro del presupuesto de tokens
+        context, packed = pack_context(docs)
+        logger.info(f"Contexto recuperado: {len(docs)} fragmentos ({len(packed)} en el prompt).")
+        return {"context": context, "question": self.question}
+
+    def finish(self, response: str | None) -> dict:
+        """Respuesta final; None significa que el LLM falló."""
+        if response is None:
+            response = LLM_ERROR_MSG
+        elif self.answer_cache is not None and self.embedding is not None:
+            # solo se guardan respuestas generadas, nunca los mensajes de error
+            try:
+                self.answer_cache.store(self.question, self.embedding, response, self.index_version, self.cache_key)
+            except Exception as e:
+                logger.error(f"Error guardando en la caché de respuestas: {e}")
+        logger.info("--- ✅ Respuesta generada ---")
+        return _reply(response)
+
+def rag_node(state: AgentState):
+    """
+    Estrategia RAG: Recupera contexto y responde preguntas técnicas.
+    """
+    logger.info("--- AGENTE RAG: Procesando consulta ---")
     
-    rag_chain = prompt | llm | StrOutputParser()
-    
+    turn = _RagTurn(state)
+    reply = turn.early_reply()
+    if reply:
+        return reply
+
+    embedding = None
+    if turn.needs_embedding:
+        try:
+            embedding = turn.retriever.embed_query(turn.question)
+        except Exception as e:
+            logger.error(f"Error calculando el embedding de la pregunta: {e}")
+    reply = turn.stored_answer(embedding)
+    if reply:
+        return reply
+
+    # recuperación (Retrieval)
+    logger.info(f"Buscando en documentos sobre: '{turn.question}'")
+    try:
+        docs = turn.retriever.invoke(turn.question)
+    except Exception as e:
+        logger.error(f"Error recuperando documentos: {e}")
+        docs = []
+
+    # si no encuentra nada o falla
+    inputs = turn.prompt_input(docs)
+    if inputs is None:
+        return _reply(NO_DOCS_MSG)
+
+    # generación de respuesta
+    rag_chain = _rag_chain()
     try:
-        response = rag_chain.invoke({"context": context, "question": question})
+        response = rag_chain.invoke(inputs)
     except Exception as e:
         logger.error(f"Error generando respuesta LLM: {e}")
-        response = "Tuve un problema generando la respuesta. Por favor intenta más tarde."
+        response = None
+    return turn.finish(response)
 
-    logger.info("--- ✅ Respuesta generada ---")
+async def arag_node(state: AgentState):
+    """
+    Versión async de `rag_node`: embedding de la pregunta, recuperación y generación usan las APIs async,
+    así muchas conversaciones avanzan en un mismo event loop mientras esperan a la red.
+    """
+    logger.info("--- AGENTE RAG: Procesando consulta ---")
     
-    # retornamos el mensaje para que LangGraph lo añada al historial
-    return {"messages": [AIMessage(content=response)]}
\ No newline at end of file
+    turn = _RagTurn(state)
+    # en frío get_retriever/get_faq_index abren Chroma o construyen el índice: fuera del event loop
+    reply = await asyncio.to_thread(turn.early_reply)
+    if reply:
+        return reply
+
+    embedding = None
+    if turn.needs_embedding:
+        try:
+            embedding = await turn.retriever.aembed_query(turn.question)
+        except Exception as e:
+            logger.error(f"Error calculando el embedding de la pregunta: {e}")
+    # la primera búsqueda en la tabla FAQ embebe sus preguntas: fuera del event loop
+    reply = await asyncio.to_thread(turn.stored_answer, embedding)
+    if reply:
+        return reply
+
+    logger.info(f"Buscando en documentos sobre: '{turn.question}'")
+    try:
+        docs = await turn.retriever.ainvoke(turn.question)
+    except Exception as e:
+        logger.error(f"Error recuperando documentos: {e}")
+        docs = []
+
+    inputs = turn.prompt_input(docs)
+    if inputs is None:
+        return _reply(NO_DOCS_MSG)
+
+    rag_chain = _rag_chain()
+    try:
+        response = await rag_chain.ainvoke(inputs)
+    except Exception as e:
+        logger.error(f"Error generando respuesta LLM: {e}")
+        response = None
+    return turn.finish(response)
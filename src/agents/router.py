@@ -1,13 +1,20 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage
-from pydantic import BaseModel, Field
+import os
+from typing import Optional
+from pydantic import BaseModel, Field, create_model
 from src.core.llm import get_llm
+from src.core.intent import ROUTER_LOCAL, get_intent_classifier
+from src.agents.booking import BookingSchema
 from src.state import AgentState
 from src.core.logger import get_logger
 from src.utils.input_sanitizer import sanitize_user_input
 
 logger = get_logger("Router")
 
+# una sola llamada al LLM que clasifica y además extrae los datos de la cita (el booking no vuelve a llamar)
+ROUTER_COMBINED = os.getenv("ROUTER_COMBINED", "").lower() in ("1", "true", "yes")
+
 class RouteQuery(BaseModel):
     """Decide a qué agente dirigir la consulta del usuario."""
     destination: str = Field(
@@ -15,11 +22,20 @@ class RouteQuery(BaseModel):
         description="Elegir 'technical_question', 'schedule_appointment' o 'escalate_to_human'."
     )
 
-def router_node(state: AgentState):
+# ruta + campos de BookingSchema como texto libre: un dato mal escrito no debe hacer fallar la clasificación,
+# los valida después el agente de citas con BookingSchema (y responde con el error de formato si corresponde)
+RouteWithBooking = create_model(
+    "RouteWithBooking",
+    __base__=RouteQuery,
+    __doc__="Decide a qué agente dirigir la consulta y, si es un agendamiento, extrae los datos de la cita mencionados.",
+    **{name: (Optional[str], Field(None, description=field.description)) for name, field in BookingSchema.model_fields.items()},
+)
+
+def _pre_route(state: AgentState) -> tuple[dict | None, str]:
     """
-    Analiza el último mensaje y decide el siguiente paso.
+    Reglas que deciden sin llamar al LLM (input bloqueado, cita en curso o clasificador local con confianza).
+    Retorna (decisión, texto sanitizado); la decisión es None si hay que clasificar con el LLM.
     """
-    logger.info("--- ROUTER: Clasificando intención ---")
     messages = state["messages"]
     last_message = messages[-1]
     user_text = last_message.content
@@ -31,11 +47,14 @@ def router_node(state: AgentState):
         logger.warning(f"input bloqueado por seguridad: '{user_text[:50]}...'")
         return {
             "next_step": "escalate_to_human",
+            "extracted_booking": None,
             "messages": [AIMessage(content="Detecté un patrón inusual en tu mensaje. Por tu seguridad y la del sistema, te conectaré con un agente humano que podrá ayudarte mejor.")]
-        }
+        }, user_text
     
     # usar el texto sanitizado para el resto del procesamiento
     user_text = sanitized_text.lower()
+    # con el modo combinado el LLM también extrae nombres, así que recibe el texto con sus mayúsculas
+    llm_text = sanitized_text if ROUTER_COMBINED else user_text
     
     # manejo de salida/cancelación temprana 
     cancel_keywords = ["cancelar", "cancel", "no quiero", "olvídalo", "salir", "stop", "chao"]
@@ -47,12 +66,21 @@ def router_node(state: AgentState):
     # si el diccionario tiene datos, significa que el usuario ya empezó a agendar.
     if booking_info and len(booking_info) > 0 and not is_cancelling:
         logger.info(f"   Contexto activo detectado ({len(booking_info)} datos). Saltando clasificación y yendo a Booking.")
-        return {"next_step": "schedule_appointment"}
+        # sin clasificar no hay datos nuevos del router: los de un turno anterior no deben volver a aplicarse
+        return {"next_step": "schedule_appointment", "extracted_booking": None}, llm_text
     # --------------------------------------
     
+    # mensajes obvios ("quiero agendar una hora", "mi perro vomita") se clasifican sin llamar al LLM
+    if ROUTER_LOCAL:
+        local = get_intent_classifier().route(user_text)
+        if local:
+            return {"next_step": local[0], "extracted_booking": None}, llm_text
+    return None, llm_text
+
+def _router_chain():
     llm = get_llm()
     # usar function_calling para asegurar compatibilidad y precisión
-    structured_llm = llm.with_structured_output(RouteQuery, method="function_calling")
+    structured_llm = llm.with_structured_output(RouteWithBooking if ROUTER_COMBINED else RouteQuery, method="function_calling")
     
     system_prompt = """Eres el encargado de triaje de 'VetCare AI'. Clasifica la intención:
     
@@ -60,20 +88,64 @@ def router_node(state: AgentState):
     2. 'schedule_appointment': Agendar citas, ver horarios, o si el usuario da sus datos de contacto.
     3. 'escalate_to_human': Solo si el usuario está muy enojado, insulta o pide ayuda explícita.
     """
+    if ROUTER_COMBINED:
+        system_prompt += """
+    Si es 'schedule_appointment', extrae además los datos de la cita que el usuario mencione. No inventes datos.
+    """
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("human", "{question}"),
     ])
     
-    router = prompt | structured_llm
+    return prompt | structured_llm
+
+def _route_update(decision: RouteQuery) -> dict:
+    destination = decision.destination
+    logger.info(f"   Decisión: {destination}")
+    if ROUTER_LOCAL:
+        get_intent_classifier().record_llm(destination)
+    update = {"next_step": destination, "extracted_booking": None}
+    if isinstance(decision, RouteWithBooking) and destination == "schedule_appointment":
+        # el agente de citas usa estos datos en vez de volver a llamar al LLM en este turno
+        update["extracted_booking"] = decision.model_dump(exclude_none=True, exclude={"destination"})
+        logger.info(f"   Datos de la cita extraídos junto con la ruta: {update['extracted_booking']}")
+    return update
+
+def router_node(state: AgentState):
+    """
+    Analiza el último mensaje y decide el siguiente paso.
+    """
+    logger.info("--- ROUTER: Clasificando intención ---")
+    decision, user_text = _pre_route(state)
+    if decision is not None:
+        return decision
+    
+    router = _router_chain()
     
     try:
         decision = router.invoke({"question": user_text})
-        destination = decision.destination
     except Exception as e:
         logger.error(f"Error en router: {e}, derivando a humano por seguridad.")
-        destination = "escalate_to_human"
+        decision = RouteQuery(destination="escalate_to_human")
         
-    logger.info(f"   Decisión: {destination}")
-    return {"next_step": destination}
\ No newline at end of file
+    return _route_update(decision)
+
+async def arouter_node(state: AgentState):
+    """
+    Versión async de `router_node` (ainvoke/astream del grafo): la clasificación espera al LLM sin bloquear.
+    """
+    logger.info("--- ROUTER: Clasificando intención ---")
+    decision, user_text = _pre_route(state)
+    if decision is not None:
+        return decision
+    
+    router = _router_chain()
+    
+    try:
+        decision = await router.ainvoke({"question": user_text})
+    except Exception as e:
+        logger.error(f"Error en router: {e}, derivando a humano por seguridad.")
+        decision = RouteQuery(destination="escalate_to_human")
+        
+    return _route_update(decision)
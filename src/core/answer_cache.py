@@ -0,0 +1,133 @@
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+from src.core.lexical import normalize_text
+from src.core.query_cache import normalize_question
+from src.core.logger import get_logger
+
+logger = get_logger("AnswerCache")
+
+# respuestas guardadas como máximo (0 = desactivada) y similitud coseno mínima para reutilizar una
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+
+# términos que cambian la respuesta aunque la pregunta sea casi idéntica ("¿vacuna para perros?" / "¿... gatos?")
+_SPECIES = [
+    ("perro", re.compile(r"\b(?:perr|cachorr|canin|can\b)")),
+    ("gato", re.compile(r"\b(?:gat|felin)")),
+    ("conejo", re.compile(r"\bconej")),
+    ("hamster", re.compile(r"\bhamster")),
+    ("ave", re.compile(r"\b(?:ave|aves|pajar|loro|canari)")),
+    ("tortuga", re.compile(r"\btortug")),
+    ("huron", re.compile(r"\bhuron")),
+    ("cobayo", re.compile(r"\b(?:cobay|cuy)")),
+]
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+def answer_key(question: str, previous_question: str = None) -> str:
+    """
+    Clave exacta que acompaña al embedding: especies y números de la pregunta, más la pregunta anterior
+    de la conversación si la hay. Solo se reutiliza una respuesta con la misma clave, así la similitud
+    no puede confundir especies o dosis, ni un seguimiento ("¿y para gatos?") con otra conversación.
+    """
+    text = normalize_text(question)
+    terms = [name for name, pattern in _SPECIES if pattern.search(text)] + _NUMBER_RE.findall(text)
+    key = "|".join(terms)
+    if previous_question:
+        key += "#" + hashlib.sha256(normalize_text(normalize_question(previous_question)).encode()).hexdigest()[:16]
+    return key
+
+class SemanticAnswerCache:
+    """
+    Caché semántica de respuestas del RAG: si una pregunta nueva está a menos del umbral
+    de similitud coseno de una ya respondida (con el mismo índice y la misma `answer_key`),
+    se reutiliza la respuesta sin llamar al LLM.
+    Los embeddings viven en una matriz NumPy preasignada, así la búsqueda es un solo producto matriz-vector.
+    Cuando se llena se desaloja la entrada usada hace más tiempo (LRU).
+    """
+
+    def __init__(self, maxsize: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._matrix = None
+        self._entries: list[tuple[str, str]] = []  # (pregunta, respuesta)
+        self._keys: list[str] = []
+        self._last_used = np.zeros(max(self.maxsize, 0), dtype=np.int64)
+        self._tick = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": round(self.hit_rate, 3)}
+
+    def _check_version(self, version: int):
+        # otro índice puede responder distinto: las respuestas anteriores dejan de valer
+        if version != self.version:
+            self._clear()
+            self.version = version
+
+    def lookup(self, embedding: list[float], version: int, key: str = "") -> tuple[str, float] | None:
+        """Retorna (respuesta, similitud) de la pregunta guardada más parecida con la misma clave, si supera el umbral."""
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            self._check_version(version)
+            if not self._entries:
+                self.misses += 1
+                return None
+            vector = np.asarray(embedding, dtype=np.float32)
+            similarities = self._matrix[:len(self._entries)] @ (vector / (np.linalg.norm(vector) or 1.0))
+            # las entradas con otra clave no compiten
+            similarities[[k != key for k in self._keys]] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tick += 1
+            self._last_used[best] = self._tick
+            return self._entries[best][1], float(similarities[best])
+
+    def store(self, question: str, embedding: list[float], answer: str, version: int, key: str = ""):
+        if self.maxsize <= 0:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+            if len(self._entries) < self.maxsize:
+                slot = len(self._entries)
+                self._entries.append((question, answer))
+                self._keys.append(key)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._tick += 1
+            self._matrix[slot] = vector
+            self._entries[slot] = (question, answer)
+            self._keys[slot] = key
+            self._last_used[slot] = self._tick
+
+_answer_cache = SemanticAnswerCache()
+
+def get_answer_cache() -> SemanticAnswerCache:
+    return _answer_cache
@@ -0,0 +1,115 @@
+import os
+import re
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.core.context import count_tokens
+
+# tamaño de los fragmentos en tokens (no caracteres) y solapamiento al partir una sección larga
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "300"))
+CHUNK_TOKEN_OVERLAP = int(os.getenv("CHUNK_TOKEN_OVERLAP", "40"))
+
+_ATX_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_SETEXT_RE = re.compile(r"^(=+|-+)\s*$")
+_BOLD_RE = re.compile(r"^\*\*(.+?)\*\*:?\s*$")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+def markdown_headings(lines: list[str]) -> list[tuple[int, int, str, int]]:
+    """(línea de inicio, nivel, título, línea donde empieza el cuerpo) de cada encabezado Markdown."""
+    headings = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        atx = _ATX_RE.match(stripped)
+        if atx:
+            headings.append((i, len(atx.group(1)), atx.group(2), i + 1))
+            continue
+        underline = lines[i + 1].strip() if i + 1 < len(lines) else ""
+        if stripped and len(underline) >= 3 and _SETEXT_RE.match(underline):
+            headings.append((i, 1 if underline[0] == "=" else 2, stripped, i + 2))
+            continue
+        bold = _BOLD_RE.match(stripped)
+        if bold:
+            # línea solo en negrita: sub-encabezado (así están escritas las guías)
+            headings.append((i, 3, bold.group(1), i + 1))
+    return headings
+
+def _clean_title(title: str) -> str:
+    return title.replace("*", "").strip().rstrip(":")
+
+def markdown_sections(text: str) -> list[tuple[list[str], str]]:
+    """Divide un Markdown en secciones (ruta de encabezados, texto con su encabezado)."""
+    lines = text.splitlines()
+    headings = markdown_headings(lines)
+    sections = []
+    if not headings or headings[0][0] > 0:
+        sections.append(([], "\n".join(lines[:headings[0][0] if headings else len(lines)])))
+
+    path: list[tuple[int, str]] = []
+    for n, (start, level, title, _) in enumerate(headings):
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, _clean_title(title)))
+        end = headings[n + 1][0] if n + 1 < len(headings) else len(lines)
+        sections.append(([t for _, t in path], "\n".join(lines[start:end])))
+    return [(path, body.strip()) for path, body in sections if body.strip()]
+
+def _looks_like_heading(paragraph: str) -> bool:
+    """Bloque de una sola línea corta y sin puntuación final (títulos de PDFs y TXT)."""
+    return "\n" not in paragraph and len(paragraph) <= 80 and len(paragraph.split()) <= 12 \
+        and not paragraph.endswith((".", ",", ";", ":")) and any(c.isalpha() for c in paragraph)
+
+def text_sections(text: str) -> list[tuple[list[str], str]]:
+    """Divide texto plano (o los bloques de layout de una página PDF) en secciones por títulos."""
+    sections: list[tuple[list[str], list[str]]] = [([], [])]
+    for paragraph in (p.strip() for p in _PARAGRAPH_RE.split(text)):
+        if not paragraph:
+            continue
+        if _looks_like_heading(paragraph):
+            sections.append(([paragraph], [paragraph]))
+        else:
+            sections[-1][1].append(paragraph)
+    return [(path, "\n\n".join(parts)) for path, parts in sections if parts]
+
+def _common_prefix(a: list[str], b: list[str]) -> list[str]:
+    prefix = []
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        prefix.append(x)
+    return prefix
+
+def _pack_sections(sections: list[tuple[list[str], str]], max_tokens: int) -> list[tuple[list[str], str]]:
+    """Junta secciones consecutivas pequeñas del mismo capítulo mientras entren en max_tokens."""
+    packed = []
+    for path, text in sections:
+        if packed:
+            prev_path, prev_text = packed[-1]
+            same_chapter = prev_path[:1] == path[:1]
+            merged = f"{prev_text}\n\n{text}"
+            if same_chapter and count_tokens(merged) <= max_tokens:
+                packed[-1] = (_common_prefix(prev_path, path), merged)
+                continue
+        packed.append((path, text))
+    return packed
+
+def split_structured(docs: list[Document], max_tokens: int = None, overlap: int = None) -> list[Document]:
+    """
+    Trocea siguiendo la estructura del documento: encabezados Markdown (ATX, setext y líneas en negrita)
+    o títulos/bloques de layout en TXT y PDF. Las secciones chicas del mismo capítulo se agrupan,
+    las que superan max_tokens se parten por párrafos con solapamiento, y cada fragmento
+    lleva la ruta de encabezados en la metadata `headings` ("Capítulo > Sección").
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    overlap = CHUNK_TOKEN_OVERLAP if overlap is None else overlap
+    splitter = RecursiveCharacterTextSplitter(chunk_size=max_tokens, chunk_overlap=overlap, length_function=count_tokens)
+
+    chunks = []
+    for doc in docs:
+        source = str(doc.metadata.get("source", ""))
+        sections = markdown_sections(doc.page_content) if source.lower().endswith(".md") else text_sections(doc.page_content)
+        for path, text in _pack_sections(sections, max_tokens):
+            metadata = dict(doc.metadata)
+            if path:
+                metadata["headings"] = " > ".join(path)
+            pieces = [text] if count_tokens(text) <= max_tokens else splitter.split_text(text)
+            chunks.extend(Document(page_content=piece, metadata=dict(metadata)) for piece in pieces)
+    return chunks
@@ -0,0 +1,117 @@
+import os
+import re
+from langchain_core.documents import Document
+from src.core.logger import get_logger
+
+logger = get_logger("Context")
+
+# tokens máximos de contexto que se envían al LLM en cada pregunta técnica
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# encoding de gpt-3.5-turbo
+CONTEXT_ENCODING = "cl100k_base"
+# similitud (Jaccard de trigramas de palabras) desde la que dos fragmentos se consideran el mismo
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# solapamiento mínimo (en caracteres) para unir dos fragmentos consecutivos
+MIN_OVERLAP_CHARS = 20
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(CONTEXT_ENCODING)
+        except Exception as e:
+            # sin el archivo del encoding (p. ej. sin red) se estima ~4 caracteres por token
+            logger.warning(f"   tiktoken no disponible ({e}), se estiman los tokens por largo.")
+            _encoding = False
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def _truncate(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+def _overlap(left: str, right: str) -> int:
+    """Largo del sufijo más largo de `left` que es prefijo de `right` (el chunk_overlap del splitter)."""
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def merge_overlapping(docs: list[Document]) -> list[Document]:
+    """
+    Une los fragmentos de la misma fuente/página que se solapan (o uno contiene al otro),
+    así el texto repetido por el chunk_overlap del splitter va una sola vez al prompt.
+    Mantiene el orden del retriever: cada bloque unido queda en la posición de su mejor fragmento.
+    """
+    merged: list[Document] = []
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        text = doc.page_content
+        for i, block in enumerate(merged):
+            if (block.metadata.get("source"), block.metadata.get("page")) != key:
+                continue
+            current = block.page_content
+            if text in current:
+                break
+            if current in text:
+                merged[i] = Document(page_content=text, metadata=block.metadata)
+                break
+            after, before = _overlap(current, text), _overlap(text, current)
+            if after or before:
+                content = current + text[after:] if after >= before else text + current[before:]
+                merged[i] = Document(page_content=content, metadata=block.metadata)
+                break
+        else:
+            merged.append(Document(id=doc.id, page_content=text, metadata=dict(doc.metadata)))
+    # un bloque que creció puede ahora solapar con otro: repetir hasta que no haya cambios
+    return merged if len(merged) == len(docs) else merge_overlapping(merged)
+
+def _shingles(text: str) -> set[tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+def drop_near_duplicates(docs: list[Document], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> list[Document]:
+    """Descarta fragmentos casi idénticos a uno mejor rankeado (p. ej. el mismo párrafo en dos manuales)."""
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+def pack_context(docs: list[Document], budget: int = None, count=count_tokens) -> tuple[str, list[Document]]:
+    """
+    Arma el contexto del prompt: une solapamientos, descarta casi-duplicados y agrega los fragmentos
+    en orden de puntaje (el orden del retriever) mientras entren en el presupuesto de tokens.
+    Si ni el mejor fragmento entra, se trunca. Retorna (contexto, fragmentos usados).
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    separator_tokens = count("\n\n")
+    candidates = drop_near_duplicates(merge_overlapping(docs))
+
+    packed, used = [], 0
+    for doc in candidates:
+        tokens = count(doc.page_content) + (separator_tokens if packed else 0)
+        if used + tokens <= budget:
+            packed.append(doc)
+            used += tokens
+    if not packed and candidates:
+        best = candidates[0]
+        packed = [Document(id=best.id, page_content=_truncate(best.page_content, budget), metadata=best.metadata)]
+        used = count(packed[0].page_content)
+
+    logger.info(f"   Contexto: {len(docs)} fragmentos -> {len(candidates)} tras unir/deduplicar -> "
+                f"{len(packed)} en el prompt ({used}/{budget} tokens).")
+    return "\n\n".join(doc.page_content for doc in packed), packed
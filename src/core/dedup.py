@@ -0,0 +1,109 @@
+import os
+import re
+import sqlite3
+import mmh3
+import numpy as np
+from src.core.lexical import normalize_text
+from src.core.logger import get_logger
+
+logger = get_logger("Dedup")
+
+# eliminar fragmentos casi duplicados en la ingesta (folletos repetidos, copias escaneadas del mismo manual)
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "1").lower() in ("1", "true", "yes")
+# similitud de Jaccard estimada desde la que dos fragmentos se consideran el mismo
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+# firma MinHash de 64 permutaciones, dividida en 16 bandas de 4 filas para el LSH
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# permutaciones (a*x + b) mod p, fijas para que las firmas persistidas sigan siendo comparables
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"\w+")
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Firma MinHash de los trigramas de palabras del texto (sin tildes ni mayúsculas)."""
+    words = _WORD_RE.findall(normalize_text(text))
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = np.fromiter((mmh3.hash(s, signed=False) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # a < 2^31 y hash < 2^32: el producto entra en 64 bits sin desbordar
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+def _band_keys(signature: np.ndarray) -> list[int]:
+    return [mmh3.hash(signature[b * ROWS:(b + 1) * ROWS].tobytes(), signed=True) for b in range(BANDS)]
+
+class DedupIndex:
+    """
+    Índice LSH persistente (SQLite) con la firma MinHash de cada fragmento representante del vectorstore.
+    Un fragmento nuevo se compara solo contra los que comparten alguna banda, no contra todo el índice.
+    """
+
+    def __init__(self, path: str, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS signatures (chunk_id TEXT PRIMARY KEY, signature BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, key INTEGER, chunk_id TEXT)")
+        # una fila por (banda, bucket, fragmento): re-ingestar un archivo con los mismos IDs no duplica filas.
+        # los índices creados antes de esta restricción pueden traer filas repetidas: se limpian primero
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'bands_unique'").fetchone():
+            with self.conn:
+                self.conn.execute("DELETE FROM bands WHERE rowid NOT IN (SELECT MIN(rowid) FROM bands GROUP BY band, key, chunk_id)")
+                self.conn.execute("CREATE UNIQUE INDEX bands_unique ON bands (band, key, chunk_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bands_chunk ON bands (chunk_id)")
+
+    def find(self, signature: np.ndarray) -> tuple[str, float] | None:
+        """Representante más parecido (id, similitud estimada) si supera el umbral."""
+        candidates = set()
+        for band, key in enumerate(_band_keys(signature)):
+            rows = self.conn.execute("SELECT chunk_id FROM bands WHERE band = ? AND key = ?", (band, key)).fetchall()
+            candidates.update(row[0] for row in rows)
+
+        best = None
+        for chunk_id in candidates:
+            row = self.conn.execute("SELECT signature FROM signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            similarity = float(np.mean(np.frombuffer(row[0], dtype=np.uint32) == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (chunk_id, similarity)
+        return best
+
+    def add(self, chunk_id: str, signature: np.ndarray):
+        self.conn.execute("INSERT OR REPLACE INTO signatures (chunk_id, signature) VALUES (?, ?)",
+                          (chunk_id, signature.tobytes()))
+        self.conn.executemany("INSERT OR IGNORE INTO bands (band, key, chunk_id) VALUES (?, ?, ?)",
+                              [(band, key, chunk_id) for band, key in enumerate(_band_keys(signature))])
+
+    def remove(self, chunk_ids: list[str]):
+        for start in range(0, len(chunk_ids), 500):
+            part = chunk_ids[start:start + 500]
+            marks = ",".join("?" * len(part))
+            self.conn.execute(f"DELETE FROM signatures WHERE chunk_id IN ({marks})", part)
+            self.conn.execute(f"DELETE FROM bands WHERE chunk_id IN ({marks})", part)
+
+    def retain(self, chunk_ids: set[str]):
+        """Descarta las firmas de fragmentos que no quedaron registrados (p. ej. una ingesta interrumpida)."""
+        stored = [row[0] for row in self.conn.execute("SELECT chunk_id FROM signatures")]
+        orphans = [chunk_id for chunk_id in stored if chunk_id not in chunk_ids]
+        if orphans:
+            self.remove(orphans)
+            self.commit()
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM signatures")
+            self.conn.execute("DELETE FROM bands")
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.core.logger import get_logger
+
+logger = get_logger("Embeddings")
+
+# caché persistente de vectores (vacío = desactivada)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/.embedding_cache.sqlite")
+# textos por request y cantidad máxima de requests simultáneos hacia la API
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+
+def _text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings con una caché en SQLite indexada por (modelo, hash del texto).
+    Solo los textos nunca vistos llegan a la API, agrupados en lotes que se envían
+    en paralelo con un máximo de `max_concurrency` requests en vuelo.
+    """
+
+    def __init__(self, underlying: Embeddings, cache_path: str = EMBED_CACHE_PATH,
+                 model_name: str = None, batch_size: int = EMBED_BATCH_SIZE,
+                 max_concurrency: int = EMBED_MAX_CONCURRENCY):
+        self.underlying = underlying
+        self.model_name = model_name or getattr(underlying, "model", None) or type(underlying).__name__
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        # la misma instancia se usa desde varios hilos (ingesta en segundo plano)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, key))"
+        )
+
+    def _lookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            # sqlite limita la cantidad de parámetros por consulta
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                    [self.model_name, *part],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items: list[tuple[str, list[float]]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                [(self.model_name, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items],
+            )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [_text_key(t) for t in texts]
+        vectors = self._lookup(list(set(keys)))
+
+        # textos faltantes, sin repetir
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += sum(1 for key in keys if key in vectors)
+        self.misses += len(missing)
+
+        if missing:
+            items = list(missing.items())
+            batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+            logger.info(f"   [Embeddings] {len(texts) - len(items)} en caché, {len(items)} nuevos en {len(batches)} lotes.")
+
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                futures = {
+                    pool.submit(self.underlying.embed_documents, [text for _, text in batch]): batch
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    # float32 igual que en la caché, para que un vector no cambie según su origen
+                    result = [
+                        (key, np.asarray(vector, dtype=np.float32).tolist())
+                        for (key, _), vector in zip(batch, future.result())
+                    ]
+                    # se guarda cada lote apenas llega: un fallo posterior no pierde lo ya pagado
+                    self._store(result)
+                    vectors.update(result)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.underlying.aembed_query(text)
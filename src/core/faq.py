@@ -0,0 +1,109 @@
+import os
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from src.core.chunking import markdown_headings
+from src.core.lexical import normalize_text
+from src.core.query_cache import normalize_question
+from src.core.answer_cache import answer_key
+from src.core.logger import get_logger
+
+logger = get_logger("FAQ")
+
+# generar la tabla de preguntas frecuentes en la ingesta y consultarla antes del RAG
+KB_FAQ = os.getenv("KB_FAQ", "").lower() in ("1", "true", "yes")
+# similitud coseno mínima para responder con la pregunta más parecida de la tabla
+# (preguntas cortas que solo cambian la especie o la dosis superan con facilidad 0.92)
+FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.97"))
+# largo máximo de una respuesta (secciones más largas no son una FAQ)
+FAQ_MAX_ANSWER_CHARS = 2500
+
+def extract_faq(text: str) -> list[dict]:
+    """
+    Encabezados con forma de pregunta ("¿Cómo prevenir la ansiedad...?") y el texto de su sección,
+    hasta el siguiente encabezado de igual o mayor nivel.
+    """
+    lines = text.splitlines()
+    headings = markdown_headings(lines)
+    entries = []
+    for n, (start, level, title, body_start) in enumerate(headings):
+        question = title.replace("*", "").strip()
+        if "?" not in question:
+            continue
+        end = next((h[0] for h in headings[n + 1:] if h[1] <= level), len(lines))
+        answer = "\n".join(lines[body_start:end]).strip()
+        if answer and len(answer) <= FAQ_MAX_ANSWER_CHARS:
+            entries.append({"question": question, "answer": answer})
+    return entries
+
+def faq_for_file(docs: list[Document], chunks: list[Document], ids: list[str]) -> list[dict]:
+    """Tabla FAQ de un archivo de texto, con los ids de los fragmentos que cubren cada respuesta."""
+    entries = []
+    for doc in docs:
+        for entry in extract_faq(doc.page_content):
+            head = entry["answer"][:200]
+            entry["source"] = doc.metadata.get("source")
+            entry["chunks"] = [
+                chunk_id for chunk_id, chunk in zip(ids, chunks)
+                if head in chunk.page_content or chunk.page_content[:200] in entry["answer"]
+            ]
+            entries.append(entry)
+    return entries
+
+def _question_key(question: str) -> str:
+    return normalize_text(normalize_question(question))
+
+class FAQIndex:
+    """
+    Tabla de preguntas frecuentes del índice activo. Se busca primero por la pregunta normalizada
+    (sin tildes, mayúsculas ni signos) y después por el vecino más cercano en el espacio de embeddings,
+    solo entre las preguntas que mencionan las mismas especies y números (`answer_key`).
+    Los embeddings de las preguntas canónicas se calculan recién en la primera búsqueda aproximada.
+    """
+
+    def __init__(self, entries: list[dict], embeddings, threshold: float = FAQ_THRESHOLD):
+        self.entries = entries
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self._exact = {_question_key(e["question"]): i for i, e in enumerate(entries)}
+        self._keys = [answer_key(e["question"]) for e in entries]
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _question_matrix(self) -> np.ndarray:
+        with self._lock:
+            if self._matrix is None:
+                matrix = np.asarray(self.embeddings.embed_documents([e["question"] for e in self.entries]), dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                self._matrix = matrix / norms
+            return self._matrix
+
+    def match(self, question: str, embed_query=None) -> tuple[dict, float] | None:
+        """Retorna (entrada, similitud) si la pregunta está en la tabla; 1.0 si es la misma pregunta."""
+        if not self.entries:
+            return None
+        exact = self._exact.get(_question_key(question))
+        if exact is not None:
+            return self.entries[exact], 1.0
+        if embed_query is None:
+            return None
+
+        vector = np.asarray(embed_query(question), dtype=np.float32)
+        similarities = self._question_matrix() @ (vector / (np.linalg.norm(vector) or 1.0))
+        # "¿vacuna para perros?" nunca responde con la sección de gatos, por parecidas que sean
+        key = answer_key(question)
+        similarities[[k != key for k in self._keys]] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return self.entries[best], float(similarities[best])
+
+    @classmethod
+    def from_manifest(cls, manifest: dict, embeddings) -> "FAQIndex":
+        entries = [entry for info in manifest.get("files", {}).values() for entry in info.get("faq", [])]
+        logger.info(f"   Tabla FAQ: {len(entries)} preguntas.")
+        return cls(entries, embeddings)
@@ -0,0 +1,173 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+from src.core.lexical import normalize_text
+from src.core.logger import get_logger
+
+logger = get_logger("Intent")
+
+# clasificar localmente antes del router LLM (opcional: un mensaje mal clasificado no pasa por el LLM)
+# y confianza mínima para no llamar al LLM
+ROUTER_LOCAL = os.getenv("ROUTER_LOCAL", "0").lower() in ("1", "true", "yes")
+ROUTER_LOCAL_THRESHOLD = float(os.getenv("ROUTER_LOCAL_THRESHOLD", "0.8"))
+
+ROUTES = ("technical_question", "schedule_appointment", "escalate_to_human")
+
+# reglas sobre el texto sin tildes: (ruta, patrón, confianza)
+RULES = [
+    # pedidos explícitos de una persona: "humano" suelto aparece en preguntas técnicas
+    # ("¿la toxocariasis se transmite al humano?"), así que solo cuentan dentro del pedido
+    ("escalate_to_human", r"\b(hablar|hable|comunicarme|contactarme|pasame|pasenme|paseme|comuniqueme) con "
+                          r"(un |una |el |la |algun |alguna )?(humano|persona|operador\w*|ejecutiv[oa]|supervisor\w*"
+                          r"|recepcionista|encargad[oa]|alguien)\b", 0.95),
+    ("escalate_to_human", r"\b(persona real|agente humano)\b", 0.95),
+    # signos de emergencia en curso
+    ("escalate_to_human", r"\b(convulsi\w*|envenen\w*|no respira|atropell\w*|hemorragia)\b", 0.95),
+    # palabras de urgencia que también aparecen en preguntas hipotéticas ("¿qué hago en una emergencia si...?"):
+    # con confianza bajo el umbral, decide el LLM
+    ("escalate_to_human", r"\b(emergencia|urgencia|urgente|intoxic\w*)\b", 0.6),
+    ("escalate_to_human", r"\b(harto|hart[ao]s|reclamo|queja|pesim[oa]|estafa|inutiles?|idiotas?)\b", 0.9),
+    # no hay herramienta de cancelación de citas: la atiende una persona
+    ("escalate_to_human", r"\bcancel\w* (la |mi |esa |una )?(cita|hora|reserva|turno)\b", 0.9),
+    # síntomas y cuidados: preguntas técnicas para el RAG
+    ("technical_question", r"\b(vomit\w*|diarrea|tos|estornud\w*|pulgas?|garrapatas?|parasit\w*|desparasit\w*|vacunas?"
+                           r"|alimento|alimentacion|sintomas?|picazon|rasca\w*|cojea\w*|pelaje)\b", 0.85),
+    ("schedule_appointment", r"\b(agendar|agend\w+|reservar|reserv\w+|pedir (una )?hora|una hora|cita|turno|disponibilidad)\b", 0.9),
+]
+
+# ejemplos etiquetados para el modelo de n-gramas (mensajes típicos de la CLI)
+INTENT_EXAMPLES = {
+    "technical_question": [
+        "mi perro vomita", "mi gato no quiere comer", "que vacunas necesita un cachorro",
+        "cada cuanto desparasito a mi perro", "mi perro tiene pulgas que hago", "que alimento recomiendas para un gato",
+        "mi gato esta botando mucho pelo", "es normal que mi perro tome tanta agua", "como cuido los dientes de mi perro",
+        "mi conejo tiene diarrea", "cuando se esteriliza una gata", "que hago si mi perro tiene garrapatas",
+        "mi perro se rasca mucho", "que es la toxocariasis", "puede mi perro comer huesos",
+        "como baño a mi gato", "mi cachorro llora en la noche", "cuanto debe pesar un gato adulto",
+    ],
+    "schedule_appointment": [
+        "quiero agendar una hora", "necesito una cita para mi perro", "tienen disponibilidad el martes",
+        "quisiera reservar para mañana", "me llamo ana y mi telefono es 912345678", "mi correo es ana@mail.cl",
+        "quiero llevar a mi gato a control", "pueden atender a mi perro el viernes", "a que hora puedo ir mañana",
+        "quiero vacunar a mi perro en la clinica", "necesito hora con el veterinario", "mañana a las 4 de la tarde",
+        "el lunes en la mañana", "quiero pedir hora para mi conejo",
+    ],
+    "escalate_to_human": [
+        "quiero hablar con una persona", "estoy harto de este bot", "esto no sirve para nada",
+        "mi perro comio chocolate y esta convulsionando", "mi gato no respira", "atropellaron a mi perro",
+        "necesito ayuda urgente", "me quiero quejar", "quiero cancelar todo", "pasame con alguien de la clinica",
+        "mi perro se envenenó", "nadie me responde", "exijo hablar con el encargado",
+    ],
+}
+
+_WORD_RE = re.compile(r"\w+")
+
+def _features(text: str) -> list[str]:
+    """unigramas y bigramas de palabras sin tildes (los bigramas captan "no respira", "una hora")"""
+    words = _WORD_RE.findall(normalize_text(text))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class NgramIntentModel:
+    """
+    Naive Bayes multinomial sobre unigramas y bigramas, entrenado con ejemplos etiquetados.
+    La confianza es el posterior con la log-verosimilitud promedio por n-grama conocido escalada por
+    la raíz de su cantidad, así un mensaje no sale con probabilidades extremas solo por ser largo.
+    """
+
+    def __init__(self, examples: dict[str, list[str]], alpha: float = 1.0):
+        self.routes = list(examples)
+        self.counts = {route: Counter(f for text in texts for f in _features(text)) for route, texts in examples.items()}
+        self.totals = {route: sum(counts.values()) for route, counts in self.counts.items()}
+        self.vocabulary = set().union(*self.counts.values())
+        self.alpha = alpha
+        total_examples = sum(len(texts) for texts in examples.values())
+        self.priors = {route: math.log(len(texts) / total_examples) for route, texts in examples.items()}
+
+    def predict(self, text: str) -> tuple[str, float]:
+        features = [f for f in _features(text) if f in self.vocabulary]
+        if not features:
+            # nada conocido: sin opinión
+            return self.routes[0], 0.0
+        size = len(self.vocabulary)
+        scores = {
+            route: self.priors[route] + sum(
+                math.log((self.counts[route][f] + self.alpha) / (self.totals[route] + self.alpha * size))
+                for f in features
+            ) / len(features) * math.sqrt(len(features))
+            for route in self.routes
+        }
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
+
+class IntentClassifier:
+    """
+    Clasificador local de intención delante del router LLM: reglas (palabras clave/regex) y,
+    si ninguna aplica, el modelo de n-gramas. Lleva la cuenta de cuántos mensajes resolvió
+    localmente y cuántos fueron al LLM, por ruta.
+    """
+
+    def __init__(self, rules: list[tuple[str, str, float]] = None, model: NgramIntentModel = None,
+                 threshold: float = ROUTER_LOCAL_THRESHOLD):
+        self.rules = [(route, re.compile(pattern), confidence) for route, pattern, confidence in (rules or RULES)]
+        self.model = model or NgramIntentModel(INTENT_EXAMPLES)
+        self.threshold = threshold
+        self.local_hits = Counter()
+        self.llm_calls = Counter()
+        self._lock = threading.Lock()
+
+    def classify(self, text: str) -> tuple[str, float, str]:
+        """(ruta, confianza, origen) con origen "reglas" o "modelo"."""
+        normalized = normalize_text(text)
+        matched = [(route, confidence) for route, pattern, confidence in self.rules if pattern.search(normalized)]
+        if matched:
+            routes = {route for route, _ in matched}
+            if len(routes) == 1:
+                return matched[0][0], max(confidence for _, confidence in matched), "reglas"
+            # las reglas apuntan a rutas distintas: gana la de mayor prioridad, pero decide el LLM
+            return matched[0][0], 0.5, "reglas"
+        route, confidence = self.model.predict(text)
+        return route, confidence, "modelo"
+
+    def route(self, text: str) -> tuple[str, float, str] | None:
+        """Clasificación local si supera el umbral (y la registra); None si hay que preguntarle al LLM."""
+        route, confidence, source = self.classify(text)
+        if confidence < self.threshold:
+            logger.info(f"   Clasificador local sin confianza suficiente ({route}, {confidence:.2f} < {self.threshold}).")
+            return None
+        with self._lock:
+            self.local_hits[route] += 1
+        logger.info(f"   Clasificador local: {route} ({confidence:.2f}, {source}) | {self.summary()}")
+        return route, confidence, source
+
+    def record_llm(self, route: str):
+        with self._lock:
+            self.llm_calls[route] += 1
+        logger.info(f"   Router LLM: {route} | {self.summary()}")
+
+    @property
+    def hit_rate(self) -> float:
+        local, llm = sum(self.local_hits.values()), sum(self.llm_calls.values())
+        return local / (local + llm) if local + llm else 0.0
+
+    def stats(self) -> dict:
+        return {route: {"local": self.local_hits[route], "llm": self.llm_calls[route]} for route in ROUTES}
+
+    def summary(self) -> str:
+        local, llm = sum(self.local_hits.values()), sum(self.llm_calls.values())
+        per_route = ", ".join(f"{route} {self.local_hits[route]}/{self.local_hits[route] + self.llm_calls[route]}"
+                              for route in ROUTES if self.local_hits[route] + self.llm_calls[route])
+        return f"resueltos localmente {local}/{local + llm} ({self.hit_rate:.0%}): {per_route}"
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_intent_classifier() -> IntentClassifier:
+    """Singleton: el modelo se entrena con los ejemplos en el primer mensaje."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = IntentClassifier()
+        return _classifier
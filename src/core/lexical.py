@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import math
+import heapq
+import unicodedata
+from collections import Counter
+from langchain_core.documents import Document
+from src.core.logger import get_logger
+
+logger = get_logger("Lexical")
+
+# palabras vacías del español (ya sin tildes), no aportan al ranking
+STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuales cuando de del desde donde durante e el ella
+ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos fue ha hay la las le les lo los
+mas me mi mis mucho muy ni no nos o otra otro para pero poco por porque que quien se sea ser si sin sobre
+son su sus tambien te tiene tienen tu un una unas uno unos y ya yo
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def normalize_text(text: str) -> str:
+    """minúsculas y sin tildes: "Antirrábica" y "antirrabica" son el mismo término"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize_text(text)):
+        if token in STOPWORDS:
+            continue
+        # plural simple: "vacunas" -> "vacuna", "pulgas" -> "pulga"
+        if len(token) > 4 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class BM25Index:
+    """
+    Índice invertido BM25 en memoria sobre los mismos fragmentos del vectorstore.
+    Guarda también texto y metadata, así un acierto léxico se convierte en Document sin ir a Chroma.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[str, int]] = {}
+        self.docs: dict[str, tuple[str, dict, int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc_id: str, text: str, metadata: dict = None):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.docs[doc_id] = (text, metadata or {}, length)
+        self._total_length += length
+
+    def remove(self, doc_id: str):
+        text, _, length = self.docs.pop(doc_id)
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self._total_length -= length
+
+    def search(self, query: str, k: int = 10) -> list[tuple[str, float]]:
+        """(id, puntaje BM25) de los k mejores fragmentos, de mayor a menor."""
+        n = len(self.docs)
+        if n == 0:
+            return []
+        avg_length = self._total_length / n or 1.0
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = self.docs[doc_id][2]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def document(self, doc_id: str) -> Document:
+        text, metadata, _ = self.docs[doc_id]
+        return Document(id=doc_id, page_content=text, metadata=dict(metadata))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self.docs, "postings": self.postings}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["k1"], data["b"])
+        index.postings = data["postings"]
+        index.docs = {doc_id: tuple(entry) for doc_id, entry in data["docs"].items()}
+        index._total_length = sum(entry[2] for entry in index.docs.values())
+        return index
+
+    @classmethod
+    def from_store(cls, vs, page_size: int = 1000) -> "BM25Index":
+        """Construye el índice con los fragmentos de un vectorstore (Chroma o índice NumPy)."""
+        index = cls()
+        if hasattr(vs, "documents"):
+            for doc_id, text, metadata in zip(vs.ids, vs.documents, vs.metadatas):
+                index.add(doc_id, text, metadata)
+        else:
+            for offset in range(0, vs._collection.count(), page_size):
+                page = vs._collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                for doc_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                    index.add(doc_id, text, metadata)
+        logger.info(f"   Índice léxico: {len(index)} fragmentos, {len(index.postings)} términos.")
+        return index
@@ -7,6 +7,9 @@ from src.core.logger import get_logger
 _llm_instance = None
 logger = get_logger("LLM")
 
+# tag de las cadenas cuya respuesta va directo al usuario: sus tokens se emiten a medida que llegan
+STREAM_TAG = "stream_to_user"
+
 def get_llm():
     """
     Implementación del Patrón Singleton para obtener la instancia del LLM.
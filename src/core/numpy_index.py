@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+from typing import Any, Iterable
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from src.core.logger import get_logger
+from src.core.retrieval import mmr_select
+
+logger = get_logger("NumpyIndex")
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def write_numpy_index(path: str, count: int, dim: int, batches: Iterable[tuple[list, Any, list, list]]):
+    """
+    Escribe el índice: una matriz float32 contigua (vectores normalizados, así el producto
+    punto es la similitud coseno) y un sidecar JSON con ids, textos y metadata.
+    `batches` entrega lotes (ids, vectores, textos, metadatas), así nunca está toda la matriz en memoria.
+    Se escribe en un directorio temporal y se publica con un rename.
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    matrix = np.lib.format.open_memmap(
+        os.path.join(tmp_path, EMBEDDINGS_FILE), mode="w+", dtype=np.float32, shape=(count, dim)
+    )
+    ids, documents, metadatas = [], [], []
+    for batch_ids, vectors, batch_documents, batch_metadatas in batches:
+        row = len(ids)
+        matrix[row:row + len(batch_ids)] = _normalize(np.asarray(vectors, dtype=np.float32))
+        ids.extend(batch_ids)
+        documents.extend(batch_documents)
+        metadatas.extend([m or {} for m in batch_metadatas])
+    if len(ids) != count:
+        raise ValueError(f"Se esperaban {count} vectores y llegaron {len(ids)}.")
+    matrix.flush()
+    del matrix
+
+    with open(os.path.join(tmp_path, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f, ensure_ascii=False)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+def export_chroma(vs, path: str, page_size: int = 1000):
+    """Exporta una colección de Chroma (con sus vectores ya calculados) al formato NumPy."""
+    collection = vs._collection
+    total = collection.count()
+    first = collection.get(include=["embeddings"], limit=1)
+    dim = len(first["embeddings"][0]) if total else 0
+
+    def batches():
+        for offset in range(0, total, page_size):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            yield page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+
+    write_numpy_index(path, total, dim, batches())
+    logger.info(f"   Índice NumPy exportado: {total} vectores de dimensión {dim} en {path}")
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store en memoria compartida: la matriz de embeddings se abre con mmap
+    (carga en milisegundos y varios procesos comparten las mismas páginas del sistema operativo)
+    y las búsquedas son productos punto vectorizados de NumPy.
+    Es de solo lectura: el índice se construye con Chroma y se exporta con `export_chroma`.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings):
+        self.path = path
+        self._embedding = embedding
+        self.matrix = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadatas = meta["metadatas"]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _document(self, i: int) -> Document:
+        return Document(id=self.ids[i], page_content=self.documents[i], metadata=dict(self.metadatas[i]))
+
+    def _query_vector(self, query: str) -> np.ndarray:
+        vector = np.asarray(self._embedding.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _top_k(self, vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Índices y similitudes coseno de los k vectores más cercanos, de mayor a menor."""
+        if len(self.ids) == 0:
+            return np.array([], dtype=int), np.array([], dtype=np.float32)
+        scores = self.matrix @ vector
+        k = min(k, len(scores))
+        # argpartition es O(n); solo se ordenan los k candidatos
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float], k: int = 4) -> list[tuple[Document, float]]:
+        top, scores = self._top_k(np.asarray(embedding, dtype=np.float32), k)
+        return [(self._document(i), float(s)) for i, s in zip(top, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> list[tuple[Document, float]]:
+        """Retorna (documento, similitud coseno): a diferencia de Chroma, mayor es mejor."""
+        return self.similarity_search_by_vector_with_score(self._query_vector(query).tolist(), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def _select_relevance_score_fn(self):
+        # los puntajes ya son similitudes coseno
+        return lambda score: score
+
+    def max_marginal_relevance_search_by_vector(self, embedding: list[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs: Any) -> list[Document]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        candidates, _ = self._top_k(vector, fetch_k)
+        if len(candidates) == 0:
+            return []
+        selected, _ = mmr_select(vector, self.matrix[candidates], k, lambda_mult)
+        return [self._document(candidates[i]) for i in selected]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(self._query_vector(query).tolist(), k, fetch_k, lambda_mult)
+
+    def get_by_ids(self, ids: list[str], /) -> list[Document]:
+        return [self._document(self._positions[i]) for i in ids if i in self._positions]
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: list[dict] | None = None,
+                   *, ids: list[str] | None = None, path: str = None, **kwargs: Any) -> "NumpyVectorStore":
+        if path is None:
+            raise ValueError("NumpyVectorStore.from_texts necesita `path` donde escribir el índice.")
+        texts = list(texts)
+        ids = ids or [str(i) for i in range(len(texts))]
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        write_numpy_index(path, len(texts), vectors.shape[1], [(ids, vectors, texts, metadatas or [{} for _ in texts])])
+        return cls(path, embedding)
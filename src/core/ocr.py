@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import threading
+import importlib.metadata
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+import fitz
+import numpy as np
+import xxhash
+from langchain_core.documents import Document
+from src.core.logger import get_logger
+
+logger = get_logger("OCR")
+
+# número de procesos para el OCR (0 = uno por núcleo). con 1 se ejecuta todo en el proceso actual
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or os.cpu_count() or 1
+
+# máximo de páginas encoladas en el pool a la vez (0 = 4 por worker)
+OCR_MAX_PENDING_PAGES = int(os.getenv("OCR_MAX_PENDING_PAGES", "0"))
+
+# caché persistente de resultados OCR (vacío = desactivada)
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/.ocr_cache.sqlite")
+
+# resolución y espacio de color del render que se entrega al OCR ("rgb" o "gray")
+OCR_DPI = int(os.getenv("OCR_DPI", "72"))
+OCR_COLORSPACE = os.getenv("OCR_COLORSPACE", "rgb").lower()
+
+# heurística: si la página tiene muy poco texto (<50 chars), asumimos que es imagen
+MIN_TEXT_CHARS = 50
+
+# estado por proceso: un solo motor OCR y la conexión a la caché; el último PDF abierto es por hilo
+_ocr_engine = None
+_open_doc = threading.local()
+_cache = None
+_cache_lock = threading.Lock()
+
+def _engine_version() -> str:
+    try:
+        return importlib.metadata.version("rapidocr-onnxruntime")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+ENGINE_VERSION = _engine_version()
+
+class OCRCache:
+    """
+    Caché en SQLite: hash de los píxeles de la página renderizada -> texto reconocido.
+    La versión del motor forma parte de la clave, así un cambio de modelo invalida todo.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # la caché del proceso se comparte entre hilos (watcher, camino async)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self.conn.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, items: list[tuple[str, str]]):
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO ocr (key, text) VALUES (?, ?)", items)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def _reset_worker_state():
+    """Inicializador del pool: cada proceso abre sus propios recursos."""
+    global _ocr_engine, _open_doc, _cache
+    _ocr_engine, _open_doc, _cache = None, threading.local(), None
+
+def _get_engine():
+    global _ocr_engine
+    if _ocr_engine is None:
+        # import diferido: el proceso principal no necesita cargar los modelos ONNX
+        from rapidocr_onnxruntime import RapidOCR
+        _ocr_engine = RapidOCR()
+    return _ocr_engine
+
+def _get_cache() -> OCRCache | None:
+    global _cache
+    with _cache_lock:
+        if _cache is None and OCR_CACHE_PATH:
+            _cache = OCRCache(OCR_CACHE_PATH)
+    return _cache
+
+def _get_page(file_path: str, page_index: int):
+    path, doc = getattr(_open_doc, "current", (None, None))
+    if path != file_path:
+        if doc is not None:
+            doc.close()
+        doc = fitz.open(file_path)
+        _open_doc.current = (file_path, doc)
+    return doc[page_index]
+
+def _close_open_doc():
+    """Cierra el último PDF que abrió este hilo, así no queda vivo después de la ingesta."""
+    _, doc = getattr(_open_doc, "current", (None, None))
+    if doc is not None:
+        doc.close()
+    _open_doc.current = (None, None)
+
+def render_page(page):
+    """Renderiza la página con la resolución y espacio de color configurados (sin canal alfa)."""
+    colorspace = fitz.csGRAY if OCR_COLORSPACE == "gray" else fitz.csRGB
+    return page.get_pixmap(dpi=OCR_DPI, colorspace=colorspace, alpha=False)
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """
+    Envuelve el buffer de muestras del pixmap como arreglo NumPy sin copiarlo
+    (nada de codificar a PNG para que el OCR lo vuelva a decodificar).
+    El arreglo solo es válido mientras el pixmap siga vivo.
+    """
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    # el stride puede traer relleno al final de cada fila
+    rows = samples.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    if pix.n == 1:
+        return rows
+    return rows.reshape(pix.height, pix.width, pix.n)
+
+def page_cache_key(pix) -> str:
+    """Clave de caché: versión del motor + dimensiones + hash de los píxeles."""
+    digest = xxhash.xxh3_128_hexdigest(pix.samples_mv)
+    return f"{ENGINE_VERSION}:{pix.width}x{pix.height}x{pix.n}:{digest}"
+
+def ocr_page(file_path: str, page_index: int) -> tuple[str, str, bool]:
+    """
+    Renderiza una página y le aplica OCR, salvo que sus píxeles ya estén en la caché.
+    Se ejecuta dentro de los procesos del pool, por eso solo recibe datos serializables.
+    Retorna (texto, clave_de_caché, acierto_de_caché).
+    """
+    page = _get_page(file_path, page_index)
+    # convertir la página a imagen en memoria
+    pix = render_page(page)
+    key = page_cache_key(pix)
+
+    cache = _get_cache()
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        return cached, key, True
+
+    # ejecutamos OCR directamente sobre los píxeles; RapidOCR trata los arreglos como BGR (orden de OpenCV),
+    # así que el render RGB se entrega con los canales invertidos (la escala de grises va tal cual)
+    image = pixmap_to_array(pix)
+    if image.ndim == 3:
+        image = image[..., ::-1]
+    result, _ = _get_engine()(image)
+
+    # rapidOCR devuelve una lista de tuplas, unimos el texto encontrado
+    text = "\n".join([line[1] for line in result]) if result else ""
+    return text, key, False
+
+def _read_text_layer(file_path: str) -> list[str]:
+    """
+    Texto seleccionable de cada página (rápido, sin OCR), armado con los bloques de layout
+    en orden de lectura y separados por una línea en blanco, así el troceado respeta títulos y párrafos.
+    """
+    with fitz.open(file_path) as doc:
+        # bloques: (x0, y0, x1, y1, texto, n, tipo); tipo 0 es texto, 1 imagen
+        return ["\n\n".join(block[4].strip() for block in page.get_text("blocks", sort=True)
+                             if block[6] == 0 and block[4].strip())
+                for page in doc]
+
+def load_pdfs(file_paths: Iterable[str], workers: int = None, stats: dict = None) -> Iterator[tuple[str, list[Document] | None]]:
+    """
+    Lee varios PDFs repartiendo el OCR de sus páginas escaneadas entre un pool de procesos.
+    Las páginas de varios archivos se encolan juntas (no archivo por archivo),
+    y los resultados se re-ensamblan en orden de página.
+
+    Es un generador con contrapresión: solo se leen archivos nuevos mientras haya
+    menos de OCR_MAX_PENDING_PAGES páginas en vuelo, así la memoria no crece con el corpus.
+
+    Entrega (ruta, documentos) por archivo en el mismo orden de entrada;
+    si un archivo falla se registra el error y se entrega (ruta, None).
+    Si se entrega `stats`, se acumulan ahí los aciertos/fallos de la caché OCR.
+    """
+    workers = workers or OCR_WORKERS
+    max_pending = OCR_MAX_PENDING_PAGES or workers * 4
+    stats = stats if stats is not None else {}
+    stats.setdefault("ocr_cache_hits", 0)
+    stats.setdefault("ocr_cache_misses", 0)
+
+    files = iter(file_paths)
+    window = deque()  # archivos en vuelo: (ruta, textos, {página: future})
+    in_flight = 0
+    pool = None
+
+    def admit() -> bool:
+        """Lee la capa de texto del siguiente PDF y encola sus páginas escaneadas."""
+        nonlocal in_flight, pool
+        file_path = next(files, None)
+        if file_path is None:
+            return False
+        try:
+            texts = _read_text_layer(file_path)
+        except Exception as e:
+            logger.error(f"   ❌ Error abriendo PDF {os.path.basename(file_path)}: {e}")
+            texts = None
+
+        futures = {}
+        scanned = [i for i, text in enumerate(texts or []) if len(text.strip()) < MIN_TEXT_CHARS]
+        # con un solo worker no vale la pena levantar procesos: el OCR se hace al ensamblar
+        if scanned and workers > 1:
+            if pool is None:
+                # spawn y no fork: el proceso ya tiene hilos vivos (watcher, to_thread, locks de las cachés)
+                # y un hijo forkeado puede heredar un lock tomado y quedarse bloqueado
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_reset_worker_state)
+            futures = {i: pool.submit(ocr_page, file_path, i) for i in scanned}
+            in_flight += len(futures)
+        window.append((file_path, texts, futures))
+        return True
+
+    # los resultados nuevos se guardan desde el proceso principal (un solo escritor)
+    cache = _get_cache()
+    exhausted = False
+    try:
+        while True:
+            # contrapresión: un archivo siempre entra completo, pero no se leen más si la ventana está llena
+            while not exhausted and (not window or (in_flight < max_pending and len(window) < max_pending)):
+                exhausted = not admit()
+            if not window:
+                break
+
+            # re-ensamblar el archivo más antiguo, en orden de página
+            file_path, texts, futures = window.popleft()
+            in_flight -= len(futures)
+            if texts is None:
+                yield file_path, None
+                continue
+
+            logger.info(f"   [OCR] Procesando {os.path.basename(file_path)} ({len(futures)} páginas en el pool)...")
+            try:
+                extracted_docs = []
+                new_entries = []
+                for i, text in enumerate(texts):
+                    if len(text.strip()) < MIN_TEXT_CHARS:
+                        future = futures.get(i)
+                        text, key, hit = future.result() if future else ocr_page(file_path, i)
+                        if hit:
+                            stats["ocr_cache_hits"] += 1
+                        else:
+                            logger.info(f"      - Pág {i+1}: Detectada imagen/escaneo. OCR aplicado.")
+                            stats["ocr_cache_misses"] += 1
+                            new_entries.append((key, text))
+
+                    # solo agregamos si logramos sacar texto
+                    if text.strip():
+                        extracted_docs.append(Document(
+                            page_content=text,
+                            metadata={"source": file_path, "page": i+1}
+                        ))
+                if cache and new_entries:
+                    cache.put_many(new_entries)
+            except Exception as e:
+                logger.error(f"   ❌ Error procesando PDF {os.path.basename(file_path)}: {e}")
+                extracted_docs = None
+
+            yield file_path, extracted_docs
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        _close_open_doc()
+        logger.info(f"   [OCR] Caché: {stats['ocr_cache_hits']} aciertos, {stats['ocr_cache_misses']} páginas con OCR.")
@@ -0,0 +1,98 @@
+import os
+import re
+import time
+import threading
+from cachetools import TTLCache
+from src.core.logger import get_logger
+
+logger = get_logger("QueryCache")
+
+# entradas máximas por caché (desalojo LRU) y tiempo de vida en segundos (0 = caché desactivada)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+_SPACES_RE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    """minúsculas, espacios colapsados y sin signos de pregunta/exclamación en los bordes"""
+    return _SPACES_RE.sub(" ", question.lower()).strip(" ¿?¡!.").strip()
+
+class QueryCache:
+    """
+    Cachés LRU + TTL del camino de recuperación, indexadas por la pregunta normalizada:
+      - pregunta -> embedding de la consulta (no depende del índice, sí del modelo)
+      - pregunta -> ids y puntajes de los fragmentos recuperados (depende del índice)
+    Los resultados se invalidan cuando cambia la versión del índice publicado.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL, timer=time.monotonic):
+        self.enabled = maxsize > 0 and ttl > 0
+        size, ttl = max(1, maxsize), max(ttl, 1e-9)
+        self.embeddings = TTLCache(maxsize=size, ttl=ttl, timer=timer)
+        self.results = TTLCache(maxsize=size, ttl=ttl, timer=timer)
+        self.version = None
+        self.stats = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0}
+        self._lock = threading.Lock()
+
+    def set_version(self, version: int):
+        """Fija la versión del índice; si cambió, los resultados guardados dejan de ser válidos."""
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    logger.info(f"   Índice v{version}: se descartan {len(self.results)} resultados en caché.")
+                self.results.clear()
+                self.version = version
+
+    def _cached_embedding(self, key: tuple) -> list[float] | None:
+        with self._lock:
+            vector = self.embeddings.get(key)
+            self.stats["embedding_hits" if vector is not None else "embedding_misses"] += 1
+        return vector
+
+    def _store_embedding(self, key: tuple, vector: list[float]):
+        with self._lock:
+            self.embeddings[key] = vector
+
+    def embed_query(self, question: str, model: str, embed) -> list[float]:
+        if not self.enabled:
+            return embed(question)
+        key = (model, normalize_question(question))
+        vector = self._cached_embedding(key)
+        if vector is None:
+            vector = embed(question)
+            self._store_embedding(key, vector)
+        return vector
+
+    async def aembed_query(self, question: str, model: str, aembed) -> list[float]:
+        """Como `embed_query`, pero esperando la corrutina `aembed` (API async de embeddings)."""
+        if not self.enabled:
+            return await aembed(question)
+        key = (model, normalize_question(question))
+        vector = self._cached_embedding(key)
+        if vector is None:
+            vector = await aembed(question)
+            self._store_embedding(key, vector)
+        return vector
+
+    def get_results(self, question: str, scope: str) -> list[tuple[str, dict]] | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            results = self.results.get((scope, normalize_question(question)))
+            self.stats["result_hits" if results is not None else "result_misses"] += 1
+        return results
+
+    def put_results(self, question: str, scope: str, results: list[tuple[str, dict]]):
+        if self.enabled:
+            with self._lock:
+                self.results[(scope, normalize_question(question))] = results
+
+    def clear(self):
+        with self._lock:
+            self.embeddings.clear()
+            self.results.clear()
+
+_query_cache = QueryCache()
+
+def get_query_cache() -> QueryCache:
+    return _query_cache
@@ -0,0 +1,302 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from typing import Any
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from src.core.lexical import BM25Index
+from src.core.logger import get_logger
+from src.core.query_cache import QueryCache
+
+logger = get_logger("Retrieval")
+
+# parámetros del re-ranking MMR: candidatos a traer, resultados finales y balance relevancia/diversidad
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "8"))
+RETRIEVER_FETCH_K = int(os.getenv("RETRIEVER_FETCH_K", "100"))
+RETRIEVER_LAMBDA = float(os.getenv("RETRIEVER_LAMBDA", "0.5"))
+
+# "mmr" (solo vectorial), "hybrid" (vectorial + BM25 fusionados con RRF)
+# o "threshold" (k adaptativo según la similitud)
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "mmr").lower()
+# con candidatos más precisos alcanza con menos fragmentos en el prompt
+HYBRID_K = int(os.getenv("HYBRID_K", "5"))
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "30"))
+# constante de Reciprocal Rank Fusion (60 es el valor del paper original)
+RRF_K = 60
+
+# modo threshold: similitud coseno mínima, caída entre puntajes consecutivos que marca el "codo" y límites de k
+RETRIEVER_MIN_SCORE = float(os.getenv("RETRIEVER_MIN_SCORE", "0.75"))
+RETRIEVER_ELBOW_GAP = float(os.getenv("RETRIEVER_ELBOW_GAP", "0.05"))
+RETRIEVER_MIN_K = int(os.getenv("RETRIEVER_MIN_K", "1"))
+RETRIEVER_MAX_K = int(os.getenv("RETRIEVER_MAX_K", "8"))
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int = 4,
+               lambda_mult: float = 0.5) -> tuple[list[int], list[float]]:
+    """
+    MMR sobre la matriz de candidatos: la similitud candidato-candidato se calcula una sola vez
+    y en cada selección solo se actualiza, con un máximo elemento a elemento, la similitud
+    de cada candidato con lo ya elegido (O(fetch_k) por paso, sin bucles en Python).
+    Retorna (índices en orden de selección, puntaje MMR de cada uno).
+    """
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return [], []
+
+    matrix = _normalize(np.asarray(candidates, dtype=np.float32))
+    relevance = matrix @ _normalize(np.asarray(query, dtype=np.float32))
+    similarity = matrix @ matrix.T
+
+    # la primera selección es la más relevante (aún no hay redundancia que penalizar)
+    first = int(np.argmax(relevance))
+    selected, scores = [first], [float(relevance[first])]
+    max_similarity = similarity[first].copy()
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+
+    while len(selected) < k:
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        scores.append(float(mmr[best]))
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected, scores
+
+def fetch_candidates(vectorstore: VectorStore, embedding: list[float], fetch_k: int) -> tuple[list[Document], np.ndarray]:
+    """Los fetch_k vecinos más cercanos junto con sus vectores (Chroma o índice NumPy)."""
+    # import diferido: numpy_index importa este módulo para su propio MMR
+    from src.core.numpy_index import NumpyVectorStore
+
+    if isinstance(vectorstore, NumpyVectorStore):
+        top, _ = vectorstore._top_k(np.asarray(embedding, dtype=np.float32), fetch_k)
+        return [vectorstore._document(i) for i in top], np.asarray(vectorstore.matrix[top])
+
+    results = vectorstore._collection.query(
+        query_embeddings=[embedding],
+        n_results=fetch_k,
+        include=["metadatas", "documents", "embeddings"],
+    )
+    docs = [
+        Document(id=doc_id, page_content=text, metadata=metadata or {})
+        for doc_id, text, metadata in zip(results["ids"][0], results["documents"][0], results["metadatas"][0])
+    ]
+    return docs, np.asarray(results["embeddings"][0], dtype=np.float32)
+
+# puntajes que los retrievers agregan a la metadata (se guardan en la caché junto a los ids)
+SCORE_KEYS = ("mmr_score", "relevance_score", "rrf_score", "bm25_score")
+
+def get_documents(vectorstore: VectorStore, ids: list[str]) -> dict[str, Document]:
+    """Fragmentos por id (Chroma o índice NumPy); los ids que ya no existen se omiten."""
+    if not hasattr(vectorstore, "_collection"):
+        return {doc.id: doc for doc in vectorstore.get_by_ids(ids)}
+    # get_by_ids de langchain_chroma falla con fragmentos sin metadata
+    results = vectorstore._collection.get(ids=ids, include=["documents", "metadatas"])
+    return {
+        doc_id: Document(id=doc_id, page_content=text, metadata=metadata or {})
+        for doc_id, text, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+    }
+
+class ScoredRetriever(BaseRetriever, ABC):
+    """
+    Base de los retrievers: embeber la consulta, buscar y retornar (documento, puntaje).
+    Con `cache` se reutilizan el embedding de la pregunta y los ids recuperados
+    (las preguntas repetidas no llaman a la API de embeddings ni al índice).
+    """
+
+    vectorstore: Any
+    cache: QueryCache | None = None
+
+    def _scope(self) -> str:
+        # preguntas iguales con otra configuración de retriever no comparten resultados
+        return f"{type(self).__name__}:{self.k}:{self.fetch_k}"
+
+    def embed_query(self, query: str) -> list[float]:
+        """Embedding de la consulta (desde la caché si la pregunta ya se vio)."""
+        embeddings = self.vectorstore.embeddings
+        if self.cache is None:
+            return embeddings.embed_query(query)
+        return self.cache.embed_query(query, self._embedding_model(), embeddings.embed_query)
+
+    async def aembed_query(self, query: str) -> list[float]:
+        """Como `embed_query`, con la API async del modelo de embeddings (no bloquea el event loop)."""
+        embeddings = self.vectorstore.embeddings
+        if self.cache is None:
+            return await embeddings.aembed_query(query)
+        return await self.cache.aembed_query(query, self._embedding_model(), embeddings.aembed_query)
+
+    def _embedding_model(self) -> str:
+        embeddings = self.vectorstore.embeddings
+        return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    @abstractmethod
+    def _search(self, query: str, embedding: list[float]) -> list[tuple[Document, float]]:
+        """Búsqueda en el índice con el embedding ya calculado; cada subclase define su estrategia."""
+
+    def _cached_results(self, query: str) -> list[tuple[Document, float]] | None:
+        if self.cache is None:
+            return None
+        cached = self.cache.get_results(query, self._scope())
+        if cached is None:
+            return None
+        docs = get_documents(self.vectorstore, [doc_id for doc_id, _, _ in cached])
+        return [
+            (Document(id=doc_id, page_content=docs[doc_id].page_content,
+                      metadata={**docs[doc_id].metadata, **scores}), score)
+            for doc_id, score, scores in cached if doc_id in docs
+        ]
+
+    def _store_results(self, query: str, results: list[tuple[Document, float]]):
+        if self.cache is not None:
+            self.cache.put_results(query, self._scope(), [
+                (doc.id, score, {key: doc.metadata[key] for key in SCORE_KEYS if key in doc.metadata})
+                for doc, score in results
+            ])
+
+    def search_with_scores(self, query: str) -> list[tuple[Document, float]]:
+        results = self._cached_results(query)
+        if results is None:
+            results = self._search(query, self.embed_query(query))
+            self._store_results(query, results)
+        return results
+
+    async def asearch_with_scores(self, query: str) -> list[tuple[Document, float]]:
+        """
+        Versión async: el embedding de la pregunta se espera sin bloquear, y todo lo que toca el índice
+        (Chroma hace I/O de disco y SQLite, MMR y BM25 son CPU) corre en un hilo, fuera del event loop:
+        tanto la búsqueda como la lectura de los documentos de un resultado en caché.
+        """
+        results = await asyncio.to_thread(self._cached_results, query)
+        if results is None:
+            embedding = await self.aembed_query(query)
+            results = await asyncio.to_thread(self._search, query, embedding)
+            self._store_results(query, results)
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        return [doc for doc, _ in await self.asearch_with_scores(query)]
+
+class MMRRetriever(ScoredRetriever):
+    """
+    Retriever MMR con re-ranking vectorizado (ver `mmr_select`), pensado para fetch_k altos.
+    Cada documento retornado lleva en su metadata `mmr_score` y `relevance_score` (coseno con la pregunta).
+    """
+
+    k: int = RETRIEVER_K
+    fetch_k: int = RETRIEVER_FETCH_K
+    lambda_mult: float = RETRIEVER_LAMBDA
+
+    def _search(self, query: str, embedding: list[float]) -> list[tuple[Document, float]]:
+        docs, matrix = fetch_candidates(self.vectorstore, embedding, self.fetch_k)
+        if not docs:
+            return []
+
+        selected, scores = mmr_select(np.asarray(embedding), matrix, self.k, self.lambda_mult)
+        relevance = _normalize(matrix) @ _normalize(np.asarray(embedding, dtype=np.float32))
+
+        results = []
+        for i, score in zip(selected, scores):
+            doc = docs[i]
+            metadata = {**doc.metadata, "mmr_score": score, "relevance_score": float(relevance[i])}
+            results.append((Document(id=doc.id, page_content=doc.page_content, metadata=metadata), score))
+        return results
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[tuple[str, float]]:
+    """Fusiona varios rankings de ids: cada aparición suma 1 / (k + posición)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class HybridRetriever(ScoredRetriever):
+    """
+    Recuperación híbrida: vecinos vectoriales + BM25 sobre los mismos fragmentos, fusionados con RRF.
+    Los términos exactos ("antirrábica", "Toxocariasis", nombres de fármacos) que el embedding
+    rankea de forma irregular suben por el lado léxico.
+    Cada documento lleva `rrf_score`, `relevance_score` (coseno, si vino del lado vectorial) y `bm25_score`.
+    """
+
+    lexical: BM25Index
+    k: int = HYBRID_K
+    fetch_k: int = HYBRID_FETCH_K
+
+    def _search(self, query: str, embedding: list[float]) -> list[tuple[Document, float]]:
+        docs, matrix = fetch_candidates(self.vectorstore, embedding, self.fetch_k)
+        relevance = _normalize(matrix) @ _normalize(np.asarray(embedding, dtype=np.float32)) if docs else []
+        vector_hits = {doc.id: (doc, float(score)) for doc, score in zip(docs, relevance)}
+        vector_ranking = sorted(vector_hits, key=lambda doc_id: vector_hits[doc_id][1], reverse=True)
+        lexical_hits = dict(self.lexical.search(query, self.fetch_k))
+
+        results = []
+        for doc_id, score in reciprocal_rank_fusion([vector_ranking, list(lexical_hits)])[:self.k]:
+            doc = vector_hits[doc_id][0] if doc_id in vector_hits else self.lexical.document(doc_id)
+            metadata = {**doc.metadata, "rrf_score": score}
+            if doc_id in vector_hits:
+                metadata["relevance_score"] = vector_hits[doc_id][1]
+            if doc_id in lexical_hits:
+                metadata["bm25_score"] = lexical_hits[doc_id]
+            results.append((Document(id=doc_id, page_content=doc.page_content, metadata=metadata), score))
+        return results
+
+def adaptive_cutoff(scores: list[float], min_score: float, elbow_gap: float, min_k: int, max_k: int) -> int:
+    """
+    Cuántos resultados conservar de una lista de puntajes ordenada de mayor a menor:
+    0 si ninguno supera el piso; si no, los que lo superan (al menos min_k, como mucho max_k),
+    cortando antes si entre dos puntajes consecutivos hay una caída mayor a elbow_gap.
+    """
+    if not scores or scores[0] < min_score:
+        return 0
+    above = sum(1 for score in scores if score >= min_score)
+    n = min(max(above, min_k), max_k, len(scores))
+    for i in range(max(min_k, 1), n):
+        if scores[i - 1] - scores[i] > elbow_gap:
+            return i
+    return n
+
+class ThresholdRetriever(ScoredRetriever):
+    """
+    Retriever con k adaptativo: ordena los candidatos por similitud coseno y se detiene en el piso
+    de similitud o en el codo de la curva de puntajes. Si nada supera el piso no retorna nada
+    (rag_node responde que no encontró información sin llamar al LLM).
+    Cada documento lleva `relevance_score` en su metadata.
+    """
+
+    k: int = RETRIEVER_MAX_K
+    fetch_k: int = RETRIEVER_FETCH_K
+    min_k: int = RETRIEVER_MIN_K
+    min_score: float = RETRIEVER_MIN_SCORE
+    elbow_gap: float = RETRIEVER_ELBOW_GAP
+
+    def _search(self, query: str, embedding: list[float]) -> list[tuple[Document, float]]:
+        docs, matrix = fetch_candidates(self.vectorstore, embedding, self.fetch_k)
+        if not docs:
+            return []
+
+        relevance = _normalize(matrix) @ _normalize(np.asarray(embedding, dtype=np.float32))
+        order = np.argsort(-relevance)
+        scores = [float(relevance[i]) for i in order]
+        n = adaptive_cutoff(scores, self.min_score, self.elbow_gap, self.min_k, self.k)
+        if n == 0:
+            logger.info(f"   Ningún fragmento supera la similitud mínima {self.min_score} (mejor: {scores[0]:.3f}).")
+
+        results = []
+        for i, score in zip(order[:n], scores[:n]):
+            doc = docs[i]
+            metadata = {**doc.metadata, "relevance_score": score}
+            results.append((Document(id=doc.id, page_content=doc.page_content, metadata=metadata), score))
+        return results
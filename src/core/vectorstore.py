@@ -1,135 +1,767 @@
 import os
+import json
 import shutil
-import fitz 
-from rapidocr_onnxruntime import RapidOCR
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
+import hashlib
+import time
+import threading
+import itertools
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple
+from langchain_community.document_loaders import TextLoader
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
+from watchfiles import watch
 from dotenv import load_dotenv
 from src.core.logger import get_logger
+from src.core.ocr import load_pdfs
+from src.core.chunking import split_structured, CHUNK_TOKENS, CHUNK_TOKEN_OVERLAP
+from src.core.embeddings import CachedEmbeddings, EMBED_CACHE_PATH
+from src.core.numpy_index import NumpyVectorStore, export_chroma
+from src.core.retrieval import MMRRetriever, HybridRetriever, ThresholdRetriever, RETRIEVER_MODE
+from src.core.lexical import BM25Index
+from src.core.query_cache import get_query_cache
+from src.core.faq import FAQIndex, KB_FAQ, faq_for_file
+from src.core.dedup import DedupIndex, INGEST_DEDUP, DEDUP_THRESHOLD, minhash_signature
 
 logger = get_logger("VectorStore")
 load_dotenv()
 
-_vectorstore_instance = None
+# colección de Chroma donde se ingesta (con el backend numpy, las consultas van a su export)
+_ingest_store = None
+# retriever del índice activo: (versión, retriever), se reconstruye solo al publicar otro índice
+_retriever = (None, None)
+_reload_lock = threading.Lock()
+# primera carga: dos llamadas concurrentes no deben construir el índice dos veces
+_init_lock = threading.Lock()
+_watcher = None
 DATA_PATH = "data/info-mascotas"
 CHROMA_PATH = "data/.chroma_db"
+# manifest con los hashes de cada archivo y de sus fragmentos, vive junto a la DB
+MANIFEST_PATH = "data/.chroma_manifest.json"
+
+# backend de consultas: "chroma" o "numpy" (matriz float32 en mmap exportada desde Chroma)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+NUMPY_INDEX_PATH = "data/.numpy_index"
+LEXICAL_INDEX_PATH = "data/.lexical_index"
+
+# recarga en caliente: vigilar DATA_PATH y publicar un índice nuevo al detectar cambios
+KB_HOT_RELOAD = os.getenv("KB_HOT_RELOAD", "").lower() in ("1", "true", "yes")
+
+# colección de Chroma del índice; el manifest puede indicar otra (índices de versiones que recargaban en colecciones kb-<ns>)
+DEFAULT_COLLECTION = "langchain"
+
+# snapshots inmutables generados por build_index.py
+SNAPSHOTS_PATH = os.getenv("SNAPSHOTS_PATH", "data/.snapshots")
+# si se define, el runtime solo abre ese snapshot (o "latest") en modo lectura y nunca ingesta
+VECTORSTORE_SNAPSHOT = os.getenv("VECTORSTORE_SNAPSHOT", "")
+
+# si cambia cualquiera de estos valores, el manifest deja de ser válido y se re-indexa todo
+MANIFEST_VERSION = 2
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".pdf")
+# fragmentos por lote de embedding + upsert (acota la memoria de la ingesta)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1024"))
+
+class ActiveIndex(NamedTuple):
+    """
+    Índice publicado: store de consultas, BM25 y tabla FAQ de la misma versión.
+    Se reemplaza entero con una sola asignación, así un lector nunca mezcla piezas de dos versiones.
+    """
+    vectorstore: object = None
+    lexical: BM25Index | None = None   # solo con RETRIEVER_MODE=hybrid
+    faq: FAQIndex | None = None        # solo con KB_FAQ
+    version: int = 0                   # cambia en cada swap, las cachés la usan para invalidarse
+
+_active = ActiveIndex()
+# contador global de versiones: nunca se repite, aunque el índice activo se descarte (reset, tests)
+_index_versions = itertools.count(1)
 
 def ocr_pdf_loader(file_path: str) -> list[Document]:
     """
     Función personalizada que lee PDFs.
     Si el PDF es de texto, lo lee rápido.
-    Si es de imágenes (scanned), usa RapidOCR para extraer el texto.
-    """
-    doc = fitz.open(file_path)
-    ocr_engine = RapidOCR() # modo OCR
-    extracted_docs = []
-
-    logger.info(f"   [OCR] Procesando {os.path.basename(file_path)}...")
-    
-    for i, page in enumerate(doc):
-        text = page.get_text()
-        
-        # heurística: si la página tiene muy poco texto (<50 chars), asumimos que es imagen
-        if len(text.strip()) < 50:
-            logger.info(f"      - Pág {i+1}: Detectada imagen/escaneo. Aplicando OCR...")
-            # convertir la página a imagen en memoria
-            pix = page.get_pixmap()
-            img_bytes = pix.tobytes("png")
-            
-            # ejecutamos OCR
-            result, _ = ocr_engine(img_bytes)
-            
-            if result:
-                # rapidOCR devuelve una lista de tuplas, unimos el texto encontrado
-                text = "\n".join([line[1] for line in result])
-            else:
-                text = ""
-        
-        # solo agregamos si logramos sacar texto
-        if text.strip():
-            # creamos el objeto Document con metadata
-            extracted_docs.append(Document(
-                page_content=text,
-                metadata={"source": file_path, "page": i+1}
-            ))
-            
-    return extracted_docs
+    Si es de imágenes (scanned), usa RapidOCR para extraer el texto (en paralelo por página).
+    """
+    _, docs = next(load_pdfs([file_path]))
+    return docs or []
 
-def get_vectorstore():
-    global _vectorstore_instance
-    
-    if _vectorstore_instance is None:
-        embeddings = OpenAIEmbeddings()
-
-        # si ya existe DB, se carga nomás
-        if os.path.exists(CHROMA_PATH):
-             logger.info("--- Cargando Vector Store existente desde disco ---")
-             _vectorstore_instance = Chroma(
-                 persist_directory=CHROMA_PATH, 
-                 embedding_function=embeddings
-             )
-        
-        # si no, se crea uno nuevo
-        elif os.path.exists(DATA_PATH) and os.listdir(DATA_PATH):
-            logger.info("--- 🚀 Inicializando Vector Store con MOTOR OCR ---")
-            
-            docs = []
-            
-            # 1. cargar TXT y MD
-            logger.info("   Buscando archivos de texto (TXT/MD)...")
-            txt_loader = DirectoryLoader(DATA_PATH, glob="*.txt", loader_cls=TextLoader)
-            md_loader = DirectoryLoader(DATA_PATH, glob="*.md", loader_cls=TextLoader)
-            docs.extend(txt_loader.load())
-            docs.extend(md_loader.load())
-
-            # 2. cargar PDFs con OCR
-            pdf_files = [f for f in os.listdir(DATA_PATH) if f.lower().endswith(".pdf")]
-            logger.info(f"   Buscando PDFs ({len(pdf_files)} encontrados)...")
-            
-            for pdf_file in pdf_files:
-                full_path = os.path.join(DATA_PATH, pdf_file)
-                try:
-                    pdf_docs = ocr_pdf_loader(full_path)
-                    docs.extend(pdf_docs)
-                except Exception as e:
-                    logger.error(f"   ❌ Error procesando PDF {pdf_file}: {e}")
-
-            logger.info(f"   Total páginas/documentos procesados: {len(docs)}")
-            
-            if not docs:
-                return None
-
-            # transformación
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-            splits = text_splitter.split_documents(docs)
-            logger.info(f"   Divididos en {len(splits)} fragmentos.")
-            
-            # ingesta
-            _vectorstore_instance = Chroma.from_documents(
-                documents=splits, 
-                embedding=embeddings,
-                persist_directory=CHROMA_PATH
+def _get_embeddings():
+    """
+    Crea el modelo de embeddings (punto único para poder reemplazarlo en tests).
+    Por defecto va detrás de la caché persistente, así un re-build solo paga los fragmentos nuevos.
+    """
+    embeddings = OpenAIEmbeddings()
+    if EMBED_CACHE_PATH:
+        return CachedEmbeddings(embeddings, EMBED_CACHE_PATH)
+    return embeddings
+
+def _file_hash(file_path: str) -> str:
+    """Hash sha256 del contenido del archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _pipeline_fingerprint() -> str:
+    """
+    Identifica la configuración de troceado con la que se generó el índice.
+    El tokenizer no forma parte: si tiktoken no carga (sin red) se cuentan los tokens por largo,
+    y eso solo cambia cómo se empaquetan los fragmentos nuevos, no obliga a re-embeber el corpus.
+    """
+    config = {"version": MANIFEST_VERSION, "chunk_tokens": CHUNK_TOKENS, "chunk_overlap": CHUNK_TOKEN_OVERLAP,
+              "dedup": DEDUP_THRESHOLD if INGEST_DEDUP else None}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def _list_data_files(data_path: str) -> dict[str, str]:
+    """Devuelve {nombre_archivo: ruta} de los documentos soportados en data_path."""
+    if not os.path.isdir(data_path):
+        return {}
+    return {
+        name: os.path.join(data_path, name)
+        for name in sorted(os.listdir(data_path))
+        if name.lower().endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(os.path.join(data_path, name))
+    }
+
+def _load_files(file_paths: list[str], stats: dict = None):
+    """
+    Carga archivos según su extensión (TXT/MD directo, PDF con OCR).
+    Todos los PDFs se entregan juntos al pool de OCR para repartir sus páginas entre procesos.
+    Entrega (ruta, documentos) por archivo; documentos es None si el archivo falló.
+    """
+    pdf_paths = [p for p in file_paths if p.lower().endswith(".pdf")]
+    for file_path in file_paths:
+        if file_path in pdf_paths:
+            continue
+        try:
+            yield file_path, TextLoader(file_path).load()
+        except Exception as e:
+            logger.error(f"   ❌ Error leyendo {os.path.basename(file_path)}: {e}")
+            yield file_path, None
+    if pdf_paths:
+        yield from load_pdfs(pdf_paths, stats=stats)
+
+def _split_documents(docs: list[Document]) -> list[Document]:
+    return split_structured(docs)
+
+def _chunk_ids(chunks: list[Document]) -> list[str]:
+    """
+    IDs deterministas por contenido: el mismo fragmento siempre obtiene el mismo ID,
+    así un archivo modificado solo re-embebe los fragmentos que realmente cambiaron.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        key = (f"{chunk.metadata.get('source')}\x00{chunk.metadata.get('page', '')}\x00"
+               f"{chunk.metadata.get('headings', '')}\x00{chunk.page_content}")
+        chunk_id = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        # fragmentos idénticos dentro del mismo archivo necesitan IDs distintos
+        count = seen.get(chunk_id, 0)
+        seen[chunk_id] = count + 1
+        ids.append(chunk_id if count == 0 else f"{chunk_id}-{count}")
+    return ids
+
+def _load_manifest(manifest_path: str) -> dict | None:
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"   Manifest ilegible ({e}), se re-indexará todo.")
+        return None
+
+def _save_manifest(manifest_path: str, manifest: dict):
+    # escritura atómica: nunca dejar un manifest a medio escribir
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+def _dedup_path(manifest_path: str) -> str:
+    """Índice MinHash que acompaña a cada manifest (firmas de los fragmentos representantes)."""
+    return f"{os.path.splitext(manifest_path)[0]}.minhash.sqlite"
+
+def _representatives(files: dict) -> set[str]:
+    """IDs de los fragmentos que están en el vectorstore (los casi duplicados solo figuran en el manifest)."""
+    return {
+        chunk_id for info in files.values()
+        for chunk_id in info["chunks"] if chunk_id not in info.get("merged", {})
+    }
+
+def _update_duplicate_sources(vs: Chroma, files: dict, rep_ids: set[str]):
+    """Anota en cada representante los otros archivos cuyos fragmentos casi idénticos absorbió."""
+    sources = {rep_id: set() for rep_id in rep_ids}
+    for name, info in files.items():
+        for rep_id in info.get("merged", {}).values():
+            if rep_id in sources:
+                sources[rep_id].add(name)
+    ids = sorted(sources)
+    for start in range(0, len(ids), 500):
+        page = vs._collection.get(ids=ids[start:start + 500], include=["metadatas"])
+        if not page["ids"]:
+            continue
+        metadatas = [
+            {**(metadata or {}), "duplicate_sources": "; ".join(sorted(sources[chunk_id]))}
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"])
+        ]
+        vs._collection.update(ids=page["ids"], metadatas=metadatas)
+
+def sync_vectorstore(vs: Chroma, data_path: str = DATA_PATH, manifest_path: str = MANIFEST_PATH,
+                     on_progress: Callable[[dict], None] = None, deferred_deletes: list[str] = None) -> dict:
+    """
+    Sincroniza el índice con los archivos de data_path usando el manifest de hashes.
+    Solo los archivos nuevos o modificados se vuelven a trocear y embeber,
+    y los fragmentos de archivos eliminados se borran del índice.
+
+    Funciona como un pipeline en streaming (cargar -> trocear -> embeber -> upsert):
+    los fragmentos se suben en lotes de INGEST_BATCH_SIZE, así la memoria no depende
+    del tamaño del corpus. `on_progress` recibe el resumen parcial después de cada lote, con el lote
+    ya subido: en la primera carga `get_vectorstore` lo usa para publicar el índice parcial, así los
+    primeros fragmentos son consultables antes de leer el último archivo.
+
+    Con INGEST_DEDUP, entre el troceado y el embedding cada fragmento se compara (MinHash + LSH)
+    contra los ya indexados: si es casi idéntico a uno existente no se embebe, queda registrado
+    en el manifest como absorbido (`merged`) y el representante anota el archivo en `duplicate_sources`.
+
+    Con `deferred_deletes` los fragmentos obsoletos no se borran: sus IDs se acumulan en esa lista
+    y los borra el llamador al terminar (la recarga en caliente, así un archivo modificado nunca
+    queda sin fragmentos mientras se suben los nuevos).
+    Retorna un resumen con lo que se hizo.
+    """
+    manifest = _load_manifest(manifest_path)
+    fingerprint = _pipeline_fingerprint()
+    dedup = DedupIndex(_dedup_path(manifest_path)) if INGEST_DEDUP else None
+
+    if manifest is None or manifest.get("fingerprint") != fingerprint:
+        # sin manifest válido no sabemos qué IDs hay en la colección: partir de cero
+        if vs._collection.count() > 0:
+            logger.info("   Manifest ausente o de otra configuración. Re-indexando desde cero...")
+            vs.reset_collection()
+        manifest = {"fingerprint": fingerprint, "files": {}}
+        if dedup:
+            dedup.clear()
+
+    try:
+        return _sync(vs, data_path, manifest_path, manifest, dedup, on_progress, deferred_deletes)
+    finally:
+        if dedup:
+            dedup.close()
+
+def _sync(vs: Chroma, data_path: str, manifest_path: str, manifest: dict, dedup: DedupIndex | None,
+          on_progress: Callable[[dict], None] = None, deferred_deletes: list[str] = None) -> dict:
+    """Cuerpo de sync_vectorstore, con el manifest ya validado y el índice MinHash abierto."""
+
+    def delete(ids: list[str]):
+        if deferred_deletes is None:
+            vs.delete(ids=ids)
+        else:
+            deferred_deletes.extend(ids)
+
+    known_files = manifest["files"]
+    current_files = _list_data_files(data_path)
+    stats = {
+        "added": 0, "changed": 0, "deleted": 0, "unchanged": 0, "chunks_added": 0, "chunks_deleted": 0,
+        # progreso del pipeline
+        "files_total": 0, "files_done": 0, "pages": 0, "chunks": 0, "bytes": 0,
+        # fragmentos casi duplicados que no se embebieron
+        "duplicates": 0,
+    }
+    # representantes cuya lista de archivos absorbidos cambió
+    touched = set()
+    if dedup:
+        dedup.retain(_representatives(known_files))
+
+    # 1. archivos eliminados -> borrar sus fragmentos
+    for name in [n for n in known_files if n not in current_files]:
+        entry = known_files.pop(name)
+        old_ids = entry["chunks"]
+        rep_ids = [c for c in old_ids if c not in entry.get("merged", {})]
+        if rep_ids:
+            delete(rep_ids)
+            if dedup:
+                dedup.remove(rep_ids)
+        touched.update(entry.get("merged", {}).values())
+        stats["deleted"] += 1
+        stats["chunks_deleted"] += len(old_ids)
+        logger.info(f"   🗑️ {name} eliminado ({len(old_ids)} fragmentos).")
+
+    # 2. detectar archivos nuevos o modificados
+    pending = {}
+    for name, file_path in current_files.items():
+        file_hash = _file_hash(file_path)
+        if name in known_files and known_files[name]["hash"] == file_hash:
+            stats["unchanged"] += 1
+            if KB_FAQ and "faq" not in known_files[name] and not file_path.lower().endswith(".pdf"):
+                # índice anterior a la tabla FAQ: se completa sin volver a embeber
+                docs = TextLoader(file_path).load()
+                chunks = _split_documents(docs)
+                known_files[name]["faq"] = faq_for_file(docs, chunks, _chunk_ids(chunks))
+        else:
+            pending[file_path] = (name, file_hash)
+    stats["files_total"] = len(pending)
+
+    # 3. pipeline: los fragmentos nuevos se acumulan en un lote de tamaño fijo
+    batch_ids, batch_docs = [], []
+    # archivos cuyos fragmentos ya están todos en el lote actual (o en uno anterior)
+    ready = []
+
+    def flush():
+        if batch_docs:
+            # add_documents embebe (en lotes concurrentes) y hace upsert
+            vs.add_documents(documents=batch_docs, ids=batch_ids)
+            stats["chunks_added"] += len(batch_docs)
+            batch_ids.clear()
+            batch_docs.clear()
+        # checkpoint: el manifest solo registra archivos completamente subidos
+        for name, entry in ready:
+            known_files[name] = entry
+        ready.clear()
+        _save_manifest(manifest_path, manifest)
+        if dedup:
+            dedup.commit()
+        logger.info(
+            f"   📦 Progreso: {stats['files_done']}/{stats['files_total']} archivos, {stats['pages']} páginas, "
+            f"{stats['chunks']} fragmentos, {stats['bytes'] / 1e6:.1f} MB"
+        )
+        if on_progress:
+            on_progress(dict(stats))
+
+    def ingest(files: dict, orphaned: set[str] = None):
+        """Carga, trocea y encola los fragmentos nuevos de `files`; `orphaned` fuerza a re-procesar esos IDs."""
+        for file_path, docs in _load_files(list(files), stats):
+            name, file_hash = files[file_path]
+            entry = known_files.get(name)
+            stats["files_done"] += 1
+            stats["bytes"] += os.path.getsize(file_path)
+            if docs is None:
+                # se conserva la versión anterior indexada (si existía)
+                continue
+
+            chunks = _split_documents(docs)
+            ids = _chunk_ids(chunks)
+            old_merged = entry.get("merged", {}) if entry else {}
+            old_ids = (set(entry["chunks"]) if entry else set()) - (orphaned or set())
+            stale_ids = list(old_ids - set(ids))
+            stats["pages"] += len(docs)
+            stats["chunks"] += len(chunks)
+            new_entry = {"hash": file_hash, "chunks": ids}
+            if KB_FAQ and not file_path.lower().endswith(".pdf"):
+                new_entry["faq"] = faq_for_file(docs, chunks, ids)
+            del docs
+
+            stale_reps = [c for c in stale_ids if c not in old_merged]
+            if stale_reps:
+                delete(stale_reps)
+                if dedup:
+                    dedup.remove(stale_reps)
+            touched.update(old_merged[c] for c in stale_ids if c in old_merged)
+
+            # los fragmentos ya absorbidos siguen así mientras su representante exista
+            merged = {c: old_merged[c] for c in ids if c in old_ids and c in old_merged}
+            new_count = 0
+            for chunk_id, chunk in zip(ids, chunks):
+                if chunk_id in old_ids:
+                    continue
+                if dedup:
+                    signature = minhash_signature(chunk.page_content)
+                    match = dedup.find(signature)
+                    if match and match[0] != chunk_id:
+                        merged[chunk_id] = match[0]
+                        touched.add(match[0])
+                        stats["duplicates"] += 1
+                        continue
+                    dedup.add(chunk_id, signature)
+                batch_ids.append(chunk_id)
+                batch_docs.append(chunk)
+                new_count += 1
+                if len(batch_docs) >= INGEST_BATCH_SIZE:
+                    flush()
+            if merged:
+                new_entry["merged"] = merged
+
+            ready.append((name, new_entry))
+            if orphaned is None:
+                stats["changed" if entry else "added"] += 1
+            stats["chunks_deleted"] += len(stale_ids)
+            logger.info(
+                f"   {'♻️' if entry else '➕'} {name}: {len(chunks)} fragmentos ({new_count} nuevos, "
+                f"{len(merged)} casi duplicados, {len(stale_ids)} obsoletos)."
             )
-            logger.info("--- Vector Store Listo ---")
-            
+
+    ingest(pending)
+    flush()
+
+    if dedup:
+        # 4. fragmentos absorbidos por un representante que ya no existe: vuelven a procesarse
+        while True:
+            alive = _representatives(known_files)
+            orphaned, orphan_files = set(), {}
+            for name, info in known_files.items():
+                lost = {c for c, rep_id in info.get("merged", {}).items() if rep_id not in alive}
+                if lost:
+                    orphaned |= lost
+                    orphan_files[current_files[name]] = (name, info["hash"])
+            if not orphan_files:
+                break
+            logger.info(f"   Restaurando {len(orphaned)} fragmentos cuyo representante se eliminó...")
+            stats["files_total"] += len(orphan_files)
+            ingest(orphan_files, orphaned)
+            flush()
+
+        _update_duplicate_sources(vs, known_files, touched & _representatives(known_files))
+        dedup.commit()
+        if stats["duplicates"]:
+            logger.info(f"   🧬 {stats['duplicates']} fragmentos casi duplicados no se embebieron.")
+
+    logger.info(f"   Sincronización completa: {stats}")
+    return stats
+
+def _embedding_model_name(embeddings) -> str:
+    return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+def build_snapshot(data_path: str = DATA_PATH, snapshots_path: str = SNAPSHOTS_PATH, name: str = None) -> str:
+    """
+    Construye el índice completo desde data_path en un directorio de snapshot versionado e inmutable:
+        <snapshots_path>/<nombre>/chroma/        base vectorial
+        <snapshots_path>/<nombre>/numpy/         export NumPy para VECTOR_BACKEND=numpy
+        <snapshots_path>/<nombre>/lexical.json   índice BM25 para RETRIEVER_MODE=hybrid
+        <snapshots_path>/<nombre>/manifest.json  hashes de archivos y fragmentos
+        <snapshots_path>/<nombre>/snapshot.json  metadatos del build (modelo, conteos, tiempos)
+    Se construye en un directorio temporal y se publica con un rename atómico.
+    Retorna la ruta del snapshot.
+    """
+    if name and os.path.exists(os.path.join(snapshots_path, name)):
+        raise FileExistsError(f"El snapshot '{name}' ya existe y es inmutable.")
+
+    started = time.perf_counter()
+    staging = os.path.join(snapshots_path, f".tmp-{os.getpid()}-{int(time.time())}")
+    os.makedirs(staging)
+
+    try:
+        embeddings = _get_embeddings()
+        vs = Chroma(persist_directory=os.path.join(staging, "chroma"), embedding_function=embeddings)
+        manifest_path = os.path.join(staging, "manifest.json")
+        stats = sync_vectorstore(vs, data_path, manifest_path)
+        ingest_seconds = time.perf_counter() - started
+
+        manifest = _load_manifest(manifest_path)
+        manifest_hash = _file_hash(manifest_path)
+        created_at = datetime.now(timezone.utc)
+        name = name or f"{created_at:%Y%m%d-%H%M%S}-{manifest_hash[:8]}"
+        snapshot_dir = os.path.join(snapshots_path, name)
+        if os.path.exists(snapshot_dir):
+            raise FileExistsError(f"El snapshot '{name}' ya existe y es inmutable.")
+
+        info = {
+            "name": name,
+            "created_at": created_at.isoformat(),
+            "data_path": data_path,
+            "fingerprint": manifest["fingerprint"],
+            "manifest_sha256": manifest_hash,
+            "embedding_model": _embedding_model_name(embeddings),
+            "files": len(manifest["files"]),
+            "chunk_count": vs._collection.count(),
+            "backends": ["chroma", "numpy"],
+            "stats": stats,
+            "timings": {"ingest_s": round(ingest_seconds, 3), "total_s": round(time.perf_counter() - started, 3)},
+        }
+        # el export NumPy permite abrir el snapshot sin levantar Chroma
+        export_chroma(vs, os.path.join(staging, "numpy"))
+        BM25Index.from_store(vs).save(os.path.join(staging, "lexical.json"))
+        with open(os.path.join(staging, "snapshot.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=1)
+
+        # publicación atómica: el snapshot aparece completo o no aparece
+        os.rename(staging, snapshot_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_latest(snapshots_path, name)
+    logger.info(f"--- Snapshot '{name}' listo: {info['chunk_count']} fragmentos en {info['timings']['total_s']}s ---")
+    return snapshot_dir
+
+def _write_latest(snapshots_path: str, name: str):
+    # escritura atómica del puntero: un lector nunca lo ve vacío o a medio escribir
+    latest_path = os.path.join(snapshots_path, "LATEST")
+    with open(f"{latest_path}.tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(f"{latest_path}.tmp", latest_path)
+
+def _resolve_snapshot(name: str, snapshots_path: str) -> str:
+    if name == "latest":
+        latest_path = os.path.join(snapshots_path, "LATEST")
+        if not os.path.exists(latest_path):
+            raise FileNotFoundError(f"No hay snapshots publicados en {snapshots_path}.")
+        with open(latest_path, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    snapshot_dir = os.path.join(snapshots_path, name)
+    if not os.path.exists(os.path.join(snapshot_dir, "snapshot.json")):
+        raise FileNotFoundError(f"El snapshot '{name}' no existe en {snapshots_path}.")
+    return snapshot_dir
+
+def open_snapshot(name: str, snapshots_path: str = None):
+    """Abre un snapshot ya construido, solo para consultas (nunca ingesta)."""
+    snapshot_dir = _resolve_snapshot(name, snapshots_path or SNAPSHOTS_PATH)
+    with open(os.path.join(snapshot_dir, "snapshot.json"), "r", encoding="utf-8") as f:
+        info = json.load(f)
+
+    embeddings = _get_embeddings()
+    # las consultas deben embeberse con el mismo modelo que los documentos del snapshot
+    if _embedding_model_name(embeddings) != info["embedding_model"]:
+        raise ValueError(
+            f"El snapshot '{info['name']}' usa el modelo {info['embedding_model']}, "
+            f"pero el runtime está configurado con {_embedding_model_name(embeddings)}."
+        )
+
+    logger.info(f"--- Abriendo snapshot '{info['name']}' ({info['chunk_count']} fragmentos, solo lectura, backend {VECTOR_BACKEND}) ---")
+    if VECTOR_BACKEND == "numpy":
+        return NumpyVectorStore(os.path.join(snapshot_dir, "numpy"), embeddings)
+    return Chroma(persist_directory=os.path.join(snapshot_dir, "chroma"), embedding_function=embeddings)
+
+def get_index_version() -> int:
+    """Versión del índice activo (0 = aún no cargado). Cambia cada vez que se publica uno nuevo."""
+    return _active.version
+
+def get_faq_index() -> FAQIndex | None:
+    """Tabla FAQ del índice activo (None si KB_FAQ está desactivado)."""
+    return _active.faq
+
+def _load_faq(manifest_path: str, embeddings) -> FAQIndex | None:
+    if not KB_FAQ:
+        return None
+    return FAQIndex.from_manifest(_load_manifest(manifest_path) or {}, embeddings)
+
+def get_lexical_index() -> BM25Index | None:
+    """Índice BM25 del índice activo (solo se construye con RETRIEVER_MODE=hybrid)."""
+    return _active.lexical
+
+def _publish(vs, lexical: BM25Index = None, faq: FAQIndex = None):
+    """Swap atómico: los lectores ven el índice anterior completo o el nuevo completo."""
+    global _active
+    _active = ActiveIndex(vs, lexical, faq, next(_index_versions))
+
+def _prune_exports(root: str, keep: str):
+    """Conserva el export actual y el anterior (puede tener lectores en curso)."""
+    exports = sorted(
+        (d for d in os.listdir(root) if d != keep and not d.endswith(".tmp")),
+        key=lambda d: os.path.getmtime(os.path.join(root, d)),
+    )
+    for old in exports[:-1]:
+        path = os.path.join(root, old)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
         else:
-            return None
+            os.remove(path)
+
+def _export_key(vs: Chroma, manifest_path: str) -> str:
+    return f"{vs._collection.name}-{_file_hash(manifest_path)[:12]}"
+
+def _as_query_store(vs: Chroma, manifest_path: str):
+    """
+    Store que atiende las consultas para una colección ya sincronizada.
+    Con el backend numpy se exporta (una vez por versión del manifest) y se abre con mmap.
+    """
+    if VECTOR_BACKEND != "numpy":
+        return vs
+
+    key = _export_key(vs, manifest_path)
+    path = os.path.join(NUMPY_INDEX_PATH, key)
+    if not os.path.exists(path):
+        export_chroma(vs, path)
+    _prune_exports(NUMPY_INDEX_PATH, key)
+
+    return NumpyVectorStore(path, vs.embeddings)
+
+def _as_lexical_index(vs: Chroma, manifest_path: str) -> BM25Index | None:
+    """Índice BM25 de una colección ya sincronizada, persistido una vez por versión del manifest."""
+    if RETRIEVER_MODE != "hybrid":
+        return None
 
-    return _vectorstore_instance
+    key = f"{_export_key(vs, manifest_path)}.json"
+    path = os.path.join(LEXICAL_INDEX_PATH, key)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    index = BM25Index.from_store(vs)
+    index.save(path)
+    _prune_exports(LEXICAL_INDEX_PATH, key)
+    return index
+
+def get_vectorstore():
+    if _active.vectorstore is None:
+        with _init_lock:
+            # otro hilo pudo haberlo construido (o publicado un índice parcial) mientras se esperaba el lock
+            if _active.vectorstore is None:
+                _open_vectorstore()
+    return _active.vectorstore
+
+def _open_vectorstore():
+    """Abre (o construye) el índice y lo publica; se llama una sola vez, con _init_lock tomado."""
+    global _ingest_store
+
+    # modo runtime: el índice se construyó offline (build_index.py), aquí solo se abre
+    if VECTORSTORE_SNAPSHOT:
+        snapshot_dir = _resolve_snapshot(VECTORSTORE_SNAPSHOT, SNAPSHOTS_PATH)
+        lexical = None
+        if RETRIEVER_MODE == "hybrid":
+            lexical = BM25Index.load(os.path.join(snapshot_dir, "lexical.json"))
+        vs = open_snapshot(VECTORSTORE_SNAPSHOT)
+        _publish(vs, lexical, _load_faq(os.path.join(snapshot_dir, "manifest.json"), vs.embeddings))
+        return
+
+    has_index = os.path.exists(CHROMA_PATH)
+    has_data = os.path.exists(DATA_PATH) and bool(os.listdir(DATA_PATH))
+
+    if not has_index and not has_data:
+        return
+
+    logger.info("--- Abriendo Vector Store (sincronización incremental) ---")
+    manifest = _load_manifest(MANIFEST_PATH) or {}
+    vs = Chroma(
+        collection_name=manifest.get("collection", DEFAULT_COLLECTION),
+        persist_directory=CHROMA_PATH,
+        embedding_function=_get_embeddings()
+    )
+
+    def publish_partial(stats: dict):
+        # con Chroma cada lote subido ya es consultable: se publica sin esperar al resto del corpus
+        # (el export numpy, BM25 y la tabla FAQ se arman una sola vez, al final)
+        if stats["chunks_added"]:
+            _publish(vs)
+            logger.info(f"   Índice parcial v{_active.version} publicado ({stats['chunks_added']} fragmentos nuevos).")
+
+    # solo se procesan archivos nuevos/modificados/eliminados según el manifest
+    if has_data:
+        sync_vectorstore(vs, DATA_PATH, MANIFEST_PATH, on_progress=publish_partial if VECTOR_BACKEND != "numpy" else None)
+
+    if vs._collection.count() == 0:
+        return
+
+    _ingest_store = vs
+    _publish(_as_query_store(vs, MANIFEST_PATH), _as_lexical_index(vs, MANIFEST_PATH),
+             _load_faq(MANIFEST_PATH, vs.embeddings))
+    logger.info("--- Vector Store Listo ---")
+
+def _has_changes(data_path: str, manifest: dict) -> bool:
+    """Compara los archivos actuales contra el manifest sin cargar nada."""
+    known_files = manifest.get("files", {})
+    current_files = _list_data_files(data_path)
+    if set(current_files) != set(known_files) or manifest.get("fingerprint") != _pipeline_fingerprint():
+        return True
+    return any(_file_hash(path) != known_files[name]["hash"] for name, path in current_files.items())
+
+def reload_vectorstore() -> bool:
+    """
+    Actualiza el índice en segundo plano y publica la versión nueva con un swap atómico.
+    La sincronización es incremental sobre la colección actual: solo se embeben y suben los fragmentos
+    de los archivos que cambiaron, y los obsoletos se borran recién cuando los nuevos ya están subidos,
+    así una consulta en curso nunca encuentra un archivo modificado sin fragmentos. El export numpy,
+    el BM25 y la tabla FAQ se rearman después y se publican junto con el store.
+    Retorna True si se publicó un índice nuevo.
+    """
+    if VECTORSTORE_SNAPSHOT:
+        logger.warning("   Recarga ignorada: en modo snapshot el índice es inmutable.")
+        return False
+
+    with _reload_lock:
+        current = _ingest_store
+        manifest = _load_manifest(MANIFEST_PATH)
+        if current is None or manifest is None:
+            # todavía no hay índice publicado: la carga normal lo construye
+            return get_vectorstore() is not None
+        if not _has_changes(DATA_PATH, manifest):
+            return False
+
+        started = time.perf_counter()
+        logger.info(f"--- 🔄 Recarga en caliente sobre la colección {current._collection.name} ---")
+        stale_ids = []
+        try:
+            sync_vectorstore(current, DATA_PATH, MANIFEST_PATH, deferred_deletes=stale_ids)
+        finally:
+            # también si la sincronización falló a mitad: los archivos ya registrados en el manifest
+            # no deben dejar sus fragmentos anteriores en el índice
+            if stale_ids:
+                current.delete(ids=stale_ids)
+
+        _publish(_as_query_store(current, MANIFEST_PATH), _as_lexical_index(current, MANIFEST_PATH),
+                 _load_faq(MANIFEST_PATH, current.embeddings))
+        logger.info(f"--- ✅ Índice v{_active.version} publicado en {time.perf_counter() - started:.1f}s "
+                    f"({len(stale_ids)} fragmentos obsoletos borrados) ---")
+        return True
+
+def _watch_loop(data_path: str, stop_event: threading.Event):
+    for changes in watch(data_path, stop_event=stop_event):
+        logger.info(f"   👀 Cambios detectados en {data_path}: {len(changes)} archivos")
+        try:
+            reload_vectorstore()
+        except Exception as e:
+            # un error de ingesta no debe matar al watcher ni al índice publicado
+            logger.error(f"   ❌ Error en la recarga en caliente: {e}")
+
+def start_watcher(data_path: str = None) -> threading.Event:
+    """
+    Vigila la carpeta de documentos y recarga el índice en un hilo en segundo plano.
+    Retorna el evento que detiene al watcher.
+    """
+    global _watcher
+    if _watcher is not None:
+        return _watcher[1]
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_watch_loop, args=(data_path or DATA_PATH, stop_event), name="kb-watcher", daemon=True)
+    thread.start()
+    _watcher = (thread, stop_event)
+    logger.info(f"--- Recarga en caliente activa sobre {data_path or DATA_PATH} ---")
+    return stop_event
+
+def stop_watcher():
+    global _watcher
+    if _watcher is not None:
+        thread, stop_event = _watcher
+        stop_event.set()
+        thread.join(timeout=10)
+        _watcher = None
 
 def get_retriever():
-    vs = get_vectorstore()
-    if not vs: return None
-    
-    # estrategia MMR
-    return vs.as_retriever(search_type="mmr", search_kwargs={'k': 8, 'fetch_k': 20})
+    global _retriever
+    if not get_vectorstore(): return None
+    # una sola lectura: store, BM25 y versión salen del mismo índice publicado
+    active = _active
+    vs = active.vectorstore
+
+    version, retriever = _retriever
+    if version == active.version and retriever is not None:
+        return retriever
+
+    # índice nuevo: los resultados en caché de la versión anterior ya no sirven
+    cache = get_query_cache()
+    cache.set_version(active.version)
+
+    retriever = None
+    if RETRIEVER_MODE == "hybrid":
+        if active.lexical is not None:
+            # vectorial + BM25 fusionados (RRF)
+            retriever = HybridRetriever(vectorstore=vs, lexical=active.lexical, cache=cache)
+        else:
+            logger.warning("   Índice léxico no disponible, se usa solo la búsqueda vectorial.")
+    elif RETRIEVER_MODE == "threshold":
+        # k adaptativo: corta en el piso de similitud o en el codo de los puntajes
+        retriever = ThresholdRetriever(vectorstore=vs, cache=cache)
+
+    # estrategia MMR (re-ranking vectorizado, permite fetch_k altos)
+    retriever = retriever or MMRRetriever(vectorstore=vs, cache=cache)
+    _retriever = (active.version, retriever)
+    return retriever
 
 # resetear el vectorstore para testing
 def reset_vectorstore():
-    global _vectorstore_instance
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
-    _vectorstore_instance = None
\ No newline at end of file
+    global _active, _ingest_store, _retriever
+    for path in (CHROMA_PATH, NUMPY_INDEX_PATH, LEXICAL_INDEX_PATH):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    for path in (MANIFEST_PATH, _dedup_path(MANIFEST_PATH)):
+        if os.path.exists(path):
+            os.remove(path)
+    _active = ActiveIndex()
+    _ingest_store = None
+    _retriever = (None, None)
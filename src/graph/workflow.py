@@ -1,9 +1,11 @@
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
 from src.state import AgentState
-from src.agents.router import router_node
-from src.agents.rag import rag_node
-from src.agents.booking import booking_node
+from src.core.llm import STREAM_TAG
+from langchain_core.runnables import RunnableLambda
+from src.agents.router import router_node, arouter_node
+from src.agents.rag import rag_node, arag_node
+from src.agents.booking import booking_node, abooking_node
 from src.tools.mock_api import request_human_agent
 
 
@@ -16,7 +18,16 @@ def escalation_node(state: AgentState):
     
     # llamar a la herramienta
     ticket_id = request_human_agent.invoke({"user_info": user_msg})
-    
+    return _escalation_reply(ticket_id)
+
+async def aescalation_node(state: AgentState):
+    """
+    Versión async de `escalation_node`.
+    """
+    ticket_id = await request_human_agent.ainvoke({"user_info": state["messages"][-1].content})
+    return _escalation_reply(ticket_id)
+
+def _escalation_reply(ticket_id: str) -> dict:
     response = f"Entiendo tu situación. He generado un ticket de atención urgente con ID **{ticket_id}**. Un especialista humano te contactará a la brevedad."
     
     return {
@@ -24,6 +35,10 @@ def escalation_node(state: AgentState):
         "next_step": "end"
     }
 
+def _node(func, afunc) -> RunnableLambda:
+    # invoke/stream ejecutan la versión sync del nodo y ainvoke/astream la async
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
 # --- GRAFO ---
 
 def create_graph():
@@ -34,10 +49,10 @@ def create_graph():
     workflow = StateGraph(AgentState)
 
     # añadir los nodos o agentes
-    workflow.add_node("router", router_node)
-    workflow.add_node("rag_agent", rag_node)
-    workflow.add_node("booking_agent", booking_node)
-    workflow.add_node("human_escalation", escalation_node)
+    workflow.add_node("router", _node(router_node, arouter_node))
+    workflow.add_node("rag_agent", _node(rag_node, arag_node))
+    workflow.add_node("booking_agent", _node(booking_node, abooking_node))
+    workflow.add_node("human_escalation", _node(escalation_node, aescalation_node))
 
     # definir el punto de entrada mapeado hacia el router
     workflow.set_entry_point("router")
@@ -61,4 +76,38 @@ def create_graph():
 
     # compilar
     app = workflow.compile()
-    return app
\ No newline at end of file
+    return app
+
+def stream_graph(app, state: dict):
+    """
+    Ejecuta el grafo emitiendo la respuesta mientras se genera.
+    Entrega ("token", texto) por cada token de las cadenas marcadas con STREAM_TAG y al final ("final", estado).
+    Las respuestas que no pasan por el LLM (FAQ, caché, citas, derivación) llegan completas en el estado final.
+    """
+    final_state = None
+    for mode, payload in app.stream(state, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state = payload
+        elif token := _user_token(payload):
+            yield "token", token
+    yield "final", final_state
+
+async def astream_graph(app, state: dict):
+    """
+    Versión async de `stream_graph` (ejecuta los nodos async): pensada para servir muchas conversaciones
+    en un mismo event loop, por ejemplo detrás de un front-end web.
+    """
+    final_state = None
+    async for mode, payload in app.astream(state, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state = payload
+        elif token := _user_token(payload):
+            yield "token", token
+    yield "final", final_state
+
+def _user_token(payload) -> str | None:
+    chunk, metadata = payload
+    # el router y el agente de citas también llaman al LLM, pero solo para extraer datos estructurados
+    if isinstance(chunk, AIMessageChunk) and chunk.content and STREAM_TAG in metadata.get("tags", []):
+        return chunk.content
+    return None
@@ -1,6 +1,6 @@
 # src/state.py
 import operator
-from typing import Annotated, TypedDict, Union, List
+from typing import Annotated, TypedDict, Union, List, NotRequired
 from langchain_core.messages import BaseMessage
 
 # Definimos el estado global del grafo
@@ -20,4 +20,11 @@ class AgentState(TypedDict):
     next_step: str
     
     # contador para prevenir loop infinito en verificación de disponibilidad (TC-E12)
-    availability_attempts: int
\ No newline at end of file
+    availability_attempts: int
+
+    # opcional: False para no usar la caché semántica de respuestas del RAG en este request
+    use_answer_cache: NotRequired[bool]
+
+    # datos de la cita que el router ya extrajo en su misma llamada al LLM (modo ROUTER_COMBINED);
+    # valen solo para el turno en que se extrajeron: el router y el agente de citas los vuelven a None
+    extracted_booking: NotRequired[dict | None]
@@ -0,0 +1,191 @@
+import os
+import random
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterator
+from src.core.logger import get_logger
+
+logger = get_logger("ClinicCalendar")
+
+# jornada de la clínica, duración de cada bloque y cuántos días hacia adelante se puede reservar
+CLINIC_OPEN_HOUR = int(os.getenv("CLINIC_OPEN_HOUR", "9"))
+CLINIC_CLOSE_HOUR = int(os.getenv("CLINIC_CLOSE_HOUR", "19"))
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", "30"))
+CALENDAR_HORIZON_DAYS = int(os.getenv("CALENDAR_HORIZON_DAYS", "60"))
+CLINIC_VETS = [v.strip() for v in os.getenv("CLINIC_VETS", "Dra. Soto,Dr. Rojas,Dra. Muñoz").split(",") if v.strip()]
+CLINIC_ROOMS = [r.strip() for r in os.getenv("CLINIC_ROOMS", "Box 1,Box 2").split(",") if r.strip()]
+# días sin atención (0 = lunes ... 6 = domingo)
+CLINIC_CLOSED_WEEKDAYS = {int(d) for d in os.getenv("CLINIC_CLOSED_WEEKDAYS", "6").split(",") if d.strip()}
+# fracción de la agenda que ya viene ocupada (simula las reservas de otros clientes; la semilla la hace reproducible)
+CALENDAR_OCCUPANCY = float(os.getenv("CALENDAR_OCCUPANCY", "0.35"))
+CALENDAR_SEED = os.getenv("CALENDAR_SEED", "vetcare")
+# alternativas que se ofrecen cuando el horario pedido está ocupado
+NEAREST_SLOTS = int(os.getenv("NEAREST_SLOTS", "3"))
+
+class ClinicCalendar:
+    """
+    Agenda en memoria de la clínica. Cada día guarda un bitmap de bloques ocupados por veterinario y por box
+    (bit i = bloque i de la jornada): un horario está libre si hay al menos un veterinario y un box libres,
+    así que el bitmap de bloques libres del día son un par de OR/AND de enteros.
+    `nearest_free` recorre esos bitmaps hacia adelante y hacia atrás desde la hora pedida y devuelve los
+    N horarios libres más cercanos en una sola consulta.
+    """
+
+    def __init__(self, vets: list[str] = CLINIC_VETS, rooms: list[str] = CLINIC_ROOMS,
+                 open_hour: int = CLINIC_OPEN_HOUR, close_hour: int = CLINIC_CLOSE_HOUR,
+                 slot_minutes: int = SLOT_MINUTES, horizon_days: int = CALENDAR_HORIZON_DAYS,
+                 closed_weekdays: set[int] = CLINIC_CLOSED_WEEKDAYS, occupancy: float = CALENDAR_OCCUPANCY,
+                 seed: str = CALENDAR_SEED, clock: Callable[[], datetime] = datetime.now):
+        self.vets = list(vets)
+        self.rooms = list(rooms)
+        self.open_hour = open_hour
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = (close_hour - open_hour) * 60 // slot_minutes
+        self.full_mask = (1 << self.slots_per_day) - 1
+        self.horizon_days = horizon_days
+        self.closed_weekdays = set(closed_weekdays)
+        self.occupancy = occupancy
+        self.seed = seed
+        self.clock = clock
+        # día -> {"vets": [bitmap por veterinario], "rooms": [bitmap por box]}
+        self._days: dict[date, dict] = {}
+        self._lock = threading.Lock()
+
+    # --- bloques y bitmaps ---
+
+    def slot_index(self, slot: datetime) -> int | None:
+        """Bloque de la jornada que empieza exactamente en `slot`; None si no coincide con un bloque."""
+        minutes = (slot.hour - self.open_hour) * 60 + slot.minute
+        if slot.second or slot.microsecond or minutes % self.slot_minutes:
+            return None
+        index = minutes // self.slot_minutes
+        return index if 0 <= index < self.slots_per_day else None
+
+    def slot_start(self, day: date, index: int) -> datetime:
+        return datetime.combine(day, datetime.min.time()) + timedelta(hours=self.open_hour, minutes=index * self.slot_minutes)
+
+    def _day(self, day: date) -> dict:
+        # los días se crean al primer uso, con la ocupación simulada de ese día
+        state = self._days.get(day)
+        if state is None:
+            state = {"vets": [0] * len(self.vets), "rooms": [0] * len(self.rooms)}
+            if self.occupancy > 0 and day.weekday() not in self.closed_weekdays:
+                self._seed_day(day, state)
+            self._days[day] = state
+        return state
+
+    def _seed_day(self, day: date, state: dict):
+        rng = random.Random(f"{self.seed}:{day.isoformat()}")
+        for index in range(self.slots_per_day):
+            for _ in range(min(len(self.vets), len(self.rooms))):
+                if rng.random() < self.occupancy:
+                    self._reserve(state, index)
+
+    @staticmethod
+    def _free_in_any(bitmaps: list[int], full_mask: int) -> int:
+        free = 0
+        for busy in bitmaps:
+            free |= ~busy & full_mask
+        return free
+
+    def free_mask(self, day: date) -> int:
+        """Bitmap de los bloques del día con algún veterinario y algún box libres (solo futuros y dentro del horizonte)."""
+        now = self.clock()
+        today = now.date()
+        if day < today or day > today + timedelta(days=self.horizon_days) or day.weekday() in self.closed_weekdays:
+            return 0
+        state = self._day(day)
+        mask = self._free_in_any(state["vets"], self.full_mask) & self._free_in_any(state["rooms"], self.full_mask)
+        if day == today:
+            # descartar los bloques que ya empezaron
+            mask &= ~((1 << self._split_index(now + timedelta(minutes=1))) - 1)
+        return mask
+
+    # --- consultas ---
+
+    def is_free(self, slot: datetime) -> bool:
+        index = self.slot_index(slot)
+        if index is None:
+            return False
+        with self._lock:
+            return bool(self.free_mask(slot.date()) >> index & 1)
+
+    def _split_index(self, slot: datetime) -> int:
+        # primer bloque que empieza en `slot` o después (puede caer fuera de la jornada)
+        minutes = (slot.hour - self.open_hour) * 60 + slot.minute
+        return max(-(-minutes // self.slot_minutes), 0)
+
+    def _forward(self, slot: datetime) -> Iterator[datetime]:
+        # bloques libres desde `slot` en adelante, en orden
+        day = slot.date()
+        last = self.clock().date() + timedelta(days=self.horizon_days)
+        while day <= last:
+            mask = self.free_mask(day)
+            if day == slot.date():
+                mask &= ~((1 << self._split_index(slot)) - 1)
+            while mask:
+                low = mask & -mask
+                yield self.slot_start(day, low.bit_length() - 1)
+                mask ^= low
+            day += timedelta(days=1)
+
+    def _backward(self, slot: datetime) -> Iterator[datetime]:
+        # bloques libres antes de `slot`, del más cercano hacia atrás (nunca antes de hoy)
+        day = slot.date()
+        today = self.clock().date()
+        while day >= today:
+            mask = self.free_mask(day)
+            if day == slot.date():
+                mask &= (1 << self._split_index(slot)) - 1
+            while mask:
+                index = mask.bit_length() - 1
+                yield self.slot_start(day, index)
+                mask ^= 1 << index
+            day -= timedelta(days=1)
+
+    def nearest_free(self, slot: datetime, n: int = NEAREST_SLOTS) -> list[datetime]:
+        """Los `n` horarios libres más cercanos a `slot` (antes o después), ordenados por cercanía."""
+        with self._lock:
+            forward, backward = self._forward(slot), self._backward(slot)
+            after, before = next(forward, None), next(backward, None)
+            found = []
+            while len(found) < n and (after or before):
+                if before is None or (after is not None and after - slot <= slot - before):
+                    found.append(after)
+                    after = next(forward, None)
+                else:
+                    found.append(before)
+                    before = next(backward, None)
+        return found
+
+    # --- reservas ---
+
+    @staticmethod
+    def _first_free(bitmaps: list[int], bit: int) -> int | None:
+        return next((i for i, busy in enumerate(bitmaps) if not busy & bit), None)
+
+    def _reserve(self, state: dict, index: int) -> tuple[int, int] | None:
+        bit = 1 << index
+        vet, room = self._first_free(state["vets"], bit), self._first_free(state["rooms"], bit)
+        if vet is None or room is None:
+            return None
+        state["vets"][vet] |= bit
+        state["rooms"][room] |= bit
+        return vet, room
+
+    def book(self, slot: datetime) -> dict | None:
+        """Reserva el bloque con el primer veterinario y box libres; None si ya no está disponible."""
+        index = self.slot_index(slot)
+        if index is None:
+            return None
+        with self._lock:
+            if not self.free_mask(slot.date()) >> index & 1:
+                return None
+            vet, room = self._reserve(self._day(slot.date()), index)
+        logger.info(f"   📅 Reservado {slot:%Y-%m-%d %H:%M} con {self.vets[vet]} en {self.rooms[room]}")
+        return {"vet": self.vets[vet], "room": self.rooms[room]}
+
+_calendar = ClinicCalendar()
+
+def get_calendar() -> ClinicCalendar:
+    return _calendar
@@ -1,41 +1,122 @@
+import os
+import time
 import random
-from langchain_core.tools import tool
+import asyncio
+from datetime import datetime
+from langchain_core.tools import StructuredTool
+from src.tools.clinic_calendar import NEAREST_SLOTS, get_calendar
 from src.core.logger import get_logger
 
 logger = get_logger("MockAPI")
 
-# decorador @tool para que LangChain sepa que estas son herramientas
-# que el LLM podría llegar a invocar si quisieramos usar tool-calling automático.
+# latencia simulada de la API de la clínica, en segundos (0 = respuesta inmediata)
+MOCK_API_LATENCY = float(os.getenv("MOCK_API_LATENCY", "0"))
 
-@tool
-def check_availability(day: str, hour: str) -> bool:
-    """
-    Verifica si una fecha y hora específicas están disponibles para una cita.
-    Retorna True si está disponible, False si no.
-    """
+# herramientas de LangChain para que el LLM pueda invocarlas si quisieramos usar tool-calling automático.
+# cada una tiene versión sync (invoke) y async (ainvoke): la async espera la "red" sin bloquear el event loop.
+
+def _slot(day: str, hour: str) -> datetime | None:
+    # día ISO ("2026-10-19") y hora "HH:MM", como los arma el agente de citas
+    try:
+        return datetime.fromisoformat(f"{day}T{hour}")
+    except ValueError:
+        return None
+
+def _availability(day: str, hour: str) -> bool:
     logger.info(f"   Consultando agenda para: {day} a las {hour}...")
-    
-    # simular una llamada a API con latencia o proceso
-    # 80% de probabilidad de que esté libre para facilitar las pruebas
-    is_available = random.random() > 0.2 
-    
+
+    slot = _slot(day, hour)
+    is_available = slot is not None and get_calendar().is_free(slot)
+
     if is_available:
         logger.info("   [SISTEMA] ✅ Horario disponible.")
     else:
         logger.info("   [SISTEMA] ❌ Horario ocupado.")
-        
+
     return is_available
 
-@tool
-def request_human_agent(user_info: str) -> str:
+def _check_availability(day: str, hour: str) -> bool:
     """
-    Escala la conversación a un agente humano generando un ticket de soporte.
+    Verifica si una fecha y hora específicas están disponibles para una cita.
+    Retorna True si está disponible, False si no.
     """
+    # simular una llamada a API con latencia
+    time.sleep(MOCK_API_LATENCY)
+    return _availability(day, hour)
+
+async def _acheck_availability(day: str, hour: str) -> bool:
+    await asyncio.sleep(MOCK_API_LATENCY)
+    return _availability(day, hour)
+
+def _book(day: str, hour: str) -> dict | None:
+    slot = _slot(day, hour)
+    if slot is None:
+        return None
+    return get_calendar().book(slot)
+
+def _book_appointment(day: str, hour: str) -> dict | None:
+    """
+    Reserva el horario si sigue libre. Retorna el veterinario y box asignados, o None si está ocupado.
+    """
+    time.sleep(MOCK_API_LATENCY)
+    return _book(day, hour)
+
+async def _abook_appointment(day: str, hour: str) -> dict | None:
+    await asyncio.sleep(MOCK_API_LATENCY)
+    return _book(day, hour)
+
+def _nearest_slots(day: str, hour: str, n: int) -> list[str]:
+    slot = _slot(day, hour)
+    if slot is None:
+        return []
+    slots = get_calendar().nearest_free(slot, n)
+    logger.info(f"   [SISTEMA] {len(slots)} horarios libres cerca de {day} {hour}.")
+    return [s.isoformat(timespec="minutes") for s in slots]
+
+def _find_available_slots(day: str, hour: str, n: int = NEAREST_SLOTS) -> list[str]:
+    """
+    Busca los N horarios libres más cercanos a la fecha y hora pedidas (formato ISO "YYYY-MM-DDTHH:MM").
+    """
+    time.sleep(MOCK_API_LATENCY)
+    return _nearest_slots(day, hour, n)
+
+async def _afind_available_slots(day: str, hour: str, n: int = NEAREST_SLOTS) -> list[str]:
+    await asyncio.sleep(MOCK_API_LATENCY)
+    return _nearest_slots(day, hour, n)
+
+def _ticket(user_info: str) -> str:
     logger.info("   [SISTEMA] 🚨 !!! INICIANDO PROTOCOLO DE ESCALACIÓN !!!")
     logger.info(f"   [SISTEMA] Creando ticket para usuario con datos: {user_info}")
-    
+
     # simular la creación del ticket
     ticket_id = f"TICKET-{random.randint(1000, 9999)}"
     logger.info(f"   [SISTEMA] ✅ Ticket creado exitosamente: {ticket_id}")
-    
-    return ticket_id
\ No newline at end of file
+
+    return ticket_id
+
+def _request_human_agent(user_info: str) -> str:
+    """
+    Escala la conversación a un agente humano generando un ticket de soporte.
+    """
+    time.sleep(MOCK_API_LATENCY)
+    return _ticket(user_info)
+
+async def _arequest_human_agent(user_info: str) -> str:
+    await asyncio.sleep(MOCK_API_LATENCY)
+    return _ticket(user_info)
+
+check_availability = StructuredTool.from_function(
+    func=_check_availability, coroutine=_acheck_availability, name="check_availability"
+)
+
+book_appointment = StructuredTool.from_function(
+    func=_book_appointment, coroutine=_abook_appointment, name="book_appointment"
+)
+
+find_available_slots = StructuredTool.from_function(
+    func=_find_available_slots, coroutine=_afind_available_slots, name="find_available_slots"
+)
+
+request_human_agent = StructuredTool.from_function(
+    func=_request_human_agent, coroutine=_arequest_human_agent, name="request_human_agent"
+)
@@ -0,0 +1,121 @@
+import re
+from src.core.lexical import STOPWORDS, normalize_text
+from src.core.logger import get_logger
+from src.utils.datetime_parser import parse_expression
+
+logger = get_logger("BookingExtractor")
+
+# frases con las que el usuario suele anteponer el dato ("mi correo es ...", "se llama ...", "es un ...")
+_LEAD_INS = [
+    re.compile(r"^(?:mi|su|el|la)?\s*(?:n[uú]mero|tel[eé]fono|fono|celular|correo(?:\s+electr[oó]nico)?|e-?mail|mail|nombre|edad)"
+               r"(?:\s+de\s+contacto)?\s*(?:es|ser[ií]a|:)?\s+", re.IGNORECASE),
+    re.compile(r"^(?:me\s+llamo|se\s+llama|mi\s+nombre\s+es|soy|tiene|es\s+una?|es|ser[ií]a|para)\s+", re.IGNORECASE),
+]
+
+_PHONE_RE = re.compile(r"^\+?[\d\s\-().]{7,20}$")
+_EMAIL_RE = re.compile(r"^[\w.+-]+@[\w-]+(\.[\w-]+)+$")
+_NUMBER_WORDS = {"un": "1", "una": "1", "uno": "1", "dos": "2", "tres": "3", "cuatro": "4", "cinco": "5",
+                 "seis": "6", "siete": "7", "ocho": "8", "nueve": "9", "diez": "10", "once": "11", "doce": "12"}
+_AGE_RE = re.compile(
+    r"^(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")\s*(años?|a|meses|mes|m|semanas?)"
+    r"(\s+y\s+(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")\s+(meses|mes))?$",
+    re.IGNORECASE,
+)
+_DAY = r"(?:hoy|mañana|manana|pasado\s+mañana|pasado\s+manana|(?:el\s+)?(?:lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo)" \
+       r"|(?:el\s+)?\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?|(?:el\s+)?\d{1,2}\s+de\s+[a-záéíóú]+)"
+_TIME = r"(?:(?:a\s+las?\s+)?\d{1,2}(?::\d{2})?\s*(?:am|pm|hrs?|horas)?(?:\s+de\s+la\s+(?:mañana|manana|tarde|noche))?" \
+        r"|(?:en\s+la|por\s+la|de\s+la)\s+(?:mañana|manana|tarde|noche)|(?:al\s+)?mediod[ií]a)"
+_DATETIME_RE = re.compile(rf"^(?:para\s+)?(?:{_DAY}(?:\s*,?\s*{_TIME})?|{_TIME}(?:\s+(?:del?\s+)?{_DAY})?)$", re.IGNORECASE)
+_SPECIES = {"perro", "perra", "gato", "gata", "conejo", "coneja", "hamster", "hámster", "ave", "pájaro", "pajaro",
+            "loro", "tortuga", "cobayo", "cuy", "huron", "hurón", "canino", "felino"}
+_NAME_RE = re.compile(r"^[A-Za-zÁÉÍÓÚÜÑáéíóúüñ'-]+(?:\s+[A-Za-zÁÉÍÓÚÜÑáéíóúüñ'-]+){0,3}$")
+# palabras que delatan una frase y no un nombre ("no sé", "quiero agendar", "hola")
+_NOT_NAME = (STOPWORDS - {"de", "del", "la", "las", "los", "y"}) | {
+    "quiero", "quisiera", "necesito", "puedo", "agendar", "hora", "cita", "hola", "gracias", "ok", "vale", "se",
+    "sé", "bueno", "claro", "nose", "mascota", "veterinario",
+}
+
+def _clean(text: str) -> str:
+    value = text.strip().strip(".!¡¿?").strip()
+    for lead_in in _LEAD_INS:
+        value = lead_in.sub("", value, count=1).strip()
+    return value
+
+def _phone(value: str) -> str | None:
+    return value if _PHONE_RE.match(value) else None
+
+def _email(value: str) -> str | None:
+    return value if _EMAIL_RE.match(value) else None
+
+def _age(value: str) -> str | None:
+    match = _AGE_RE.match(value)
+    if not match:
+        return None
+    # el validador de BookingSchema exige un número: "un año" -> "1 año"
+    return re.sub(r"\b(" + "|".join(_NUMBER_WORDS) + r")\b",
+                  lambda m: _NUMBER_WORDS[m.group(1).lower()], value, flags=re.IGNORECASE)
+
+def _datetime(value: str) -> str | None:
+    # el mensaje completo debe ser una fecha/hora y el parser tiene que entenderla
+    if not _DATETIME_RE.match(value) or parse_expression(value) is None:
+        return None
+    return value
+
+def _species(value: str) -> str | None:
+    return value.lower() if value.lower() in _SPECIES else None
+
+def _name(value: str) -> str | None:
+    # un nombre suelto ("Ana Pérez", "Max"); cualquier frase es texto libre para el LLM
+    if not _NAME_RE.match(value):
+        return None
+    words = normalize_text(value).split()
+    if words[0] in STOPWORDS or any(word in _NOT_NAME or word in _SPECIES for word in words):
+        return None
+    return value
+
+# extractores por campo; motivo y raza son texto libre y siempre van al LLM
+FIELD_PARSERS = {
+    "phone": _phone,
+    "email": _email,
+    "pet_age": _age,
+    "desired_time": _datetime,
+    "pet_species": _species,
+    "owner_name": _name,
+    "pet_name": _name,
+}
+
+_ORDINALS = {"primera": 1, "primero": 1, "segunda": 2, "segundo": 2, "tercera": 3, "tercero": 3,
+             "cuarta": 4, "cuarto": 4, "quinta": 5, "quinto": 5, "ultima": -1, "ultimo": -1}
+_CHOICE_RE = re.compile(r"^(?:(?:la|el)\s+)?(?:opcion\s+)?(\d|" + "|".join(_ORDINALS) + r")(?:\s+opcion)?$")
+
+def extract_offered_choice(text: str, options: list[str]) -> dict | None:
+    """
+    Horario elegido entre los que ofreció el agente ("2", "la primera", "opción 3").
+    Retorna {"desired_time": horario} o None si el mensaje no es una de esas opciones.
+    """
+    match = _CHOICE_RE.match(normalize_text(text).strip(" .!¡¿?"))
+    if not match:
+        return None
+    choice = match.group(1)
+    position = int(choice) if choice.isdigit() else _ORDINALS[choice]
+    if position == -1:
+        position = len(options)
+    if not 1 <= position <= len(options):
+        return None
+    logger.info(f"   ⚡ horario elegido sin LLM: opción {position}")
+    return {"desired_time": options[position - 1]}
+
+def extract_asked_field(text: str, field: str | None) -> dict | None:
+    """
+    Extracción determinista del dato que el agente de citas acaba de pedir, cuando el mensaje es
+    solo ese valor ("+56 9 1234 5678", "ana@mail.cl", "3 años", "mañana a las 4pm").
+    Retorna {campo: valor} sin validar (lo valida BookingSchema) o None si el mensaje es ambiguo o texto libre.
+    """
+    parser = FIELD_PARSERS.get(field)
+    if parser is None:
+        return None
+    value = parser(_clean(text))
+    if value is None:
+        return None
+    logger.info(f"   ⚡ {field} extraído sin LLM: '{value}'")
+    return {field: value}
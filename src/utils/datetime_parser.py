@@ -0,0 +1,185 @@
+import os
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Callable, NamedTuple
+from src.core.lexical import normalize_text
+from src.core.logger import get_logger
+
+logger = get_logger("DateTimeParser")
+
+# expresiones distintas que se recuerdan ya interpretadas (la resolución a una fecha concreta es aritmética)
+DATETIME_CACHE_SIZE = int(os.getenv("DATETIME_CACHE_SIZE", "512"))
+
+WEEKDAYS = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+WEEKDAYS_ES = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+MONTHS = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+          "septiembre", "octubre", "noviembre", "diciembre"]
+# hora por defecto cuando solo se dice el momento del día
+PERIOD_HOURS = {"manana": 10, "tarde": 15, "noche": 19}
+
+_SPACES_RE = re.compile(r"\s+")
+_DATE_PATTERNS = [
+    ("iso", re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")),
+    ("date", re.compile(r"\b(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?\b")),
+    ("month", re.compile(rf"\b(\d{{1,2}}) de ({'|'.join(MONTHS)})(?: (?:de|del) (\d{{4}}))?\b")),
+    ("offset", re.compile(r"\bpasado manana\b")),
+    ("offset", re.compile(r"\bmanana\b")),
+    ("offset", re.compile(r"\bhoy\b")),
+    ("weekday", re.compile(rf"\b({'|'.join(WEEKDAYS)})\b")),
+]
+_PERIOD_RE = re.compile(r"\b(?:de|en|por|a) la (manana|tarde|noche)\b")
+_TIME_PATTERNS = [
+    re.compile(r"\b(\d{1,2}):(\d{2})\s*(am|pm|hrs?|horas)?\b"),
+    re.compile(r"\ba las? (\d{1,2})(?:\s*(am|pm|hrs?|horas))?\b"),
+    re.compile(r"\b(\d{1,2})\s*(am|pm|hrs|horas)\b"),
+]
+_NOON_RE = re.compile(r"\bmediodia\b")
+_BARE_HOUR_RE = re.compile(r"\b(\d{1,2})\b")
+
+class DateExpression(NamedTuple):
+    """Interpretación de la frase, independiente del día en que se dice (se puede memorizar)."""
+    day_kind: str | None   # "offset", "weekday", "date" o None (solo hora)
+    day_value: tuple       # (días,) | (día de la semana,) | (día, mes, año o None)
+    hour: int | None
+    minute: int
+    period: str | None     # "manana", "tarde", "noche"
+    meridian: str | None   # "am", "pm"
+
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def parse_expression(text: str) -> DateExpression | None:
+    """Interpreta "mañana a las 4pm", "el lunes en la tarde", "15/11 10:30", "3 de marzo a las 9"..."""
+    text = _SPACES_RE.sub(" ", normalize_text(text)).strip()
+
+    # "de la mañana" es un momento del día, no el día siguiente
+    period = None
+    period_match = _PERIOD_RE.search(text)
+    if period_match:
+        period = period_match.group(1)
+        text = text[:period_match.start()] + text[period_match.end():]
+
+    hour, minute, meridian = None, 0, None
+    if _NOON_RE.search(text):
+        hour = 12
+        text = _NOON_RE.sub("", text)
+    for pattern in _TIME_PATTERNS:
+        match = pattern.search(text)
+        if hour is None and match:
+            groups = match.groups()
+            hour = int(groups[0])
+            if pattern.groups == 3:
+                minute, suffix = int(groups[1]), groups[2]
+            else:
+                suffix = groups[1]
+            meridian = suffix if suffix in ("am", "pm") else None
+            text = text[:match.start()] + text[match.end():]
+
+    day_kind, day_value = None, ()
+    for kind, pattern in _DATE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if kind == "iso":
+            year, month, day = match.groups()
+            day_value = (int(day), int(month), int(year))
+            kind = "date"
+        elif kind == "date":
+            day, month, year = match.groups()
+            day_value = (int(day), int(month), _full_year(year))
+        elif kind == "month":
+            day, month, year = match.groups()
+            day_value = (int(day), MONTHS.index(month) + 1, int(year) if year else None)
+            kind = "date"
+        elif kind == "offset":
+            day_value = ({"hoy": 0, "manana": 1}.get(match.group(0), 2),)
+        else:
+            day_value = (WEEKDAYS.index(match.group(1)),)
+        day_kind = kind
+        text = text[:match.start()] + text[match.end():]
+        break
+
+    # "4 de la tarde": un número suelto es la hora si viene con el momento del día
+    if hour is None and period:
+        match = _BARE_HOUR_RE.search(text)
+        if match:
+            hour = int(match.group(1))
+
+    if day_kind is None and hour is None:
+        return None
+    if hour is not None and not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return DateExpression(day_kind, day_value, hour, minute, period, meridian)
+
+def _full_year(year: str | None) -> int | None:
+    if not year:
+        return None
+    return int(year) + 2000 if len(year) == 2 else int(year)
+
+def _hour_24(expression: DateExpression) -> int | None:
+    hour = expression.hour
+    if hour is None:
+        # solo el momento del día ("mañana en la tarde"): hora típica de ese bloque
+        return PERIOD_HOURS.get(expression.period)
+    if expression.meridian == "pm" or expression.period in ("tarde", "noche"):
+        return hour + 12 if hour < 12 else hour
+    if expression.meridian == "am" or expression.period == "manana":
+        return 0 if hour == 12 else hour
+    # "a las 4" en una clínica es de la tarde; de 8 a 12 se entiende de la mañana
+    return hour + 12 if 1 <= hour <= 7 else hour
+
+def resolve(expression: DateExpression, now: datetime) -> datetime | None:
+    """Fecha y hora concretas de la expresión, relativas a `now`; None si falta la hora o la fecha no existe."""
+    hour = _hour_24(expression)
+    if hour is None:
+        return None
+    today = now.date()
+    if expression.day_kind == "offset":
+        day = today + timedelta(days=expression.day_value[0])
+    elif expression.day_kind == "weekday":
+        ahead = (expression.day_value[0] - today.weekday()) % 7
+        day = today + timedelta(days=ahead)
+        # "el lunes" dicho un lunes después de esa hora es el de la semana siguiente
+        if ahead == 0 and datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=expression.minute) <= now:
+            day += timedelta(days=7)
+    elif expression.day_kind == "date":
+        day_of_month, month, year = expression.day_value
+        try:
+            day = date(year or today.year, month, day_of_month)
+            if year is None and day < today:
+                day = date(today.year + 1, month, day_of_month)
+        except ValueError:
+            return None
+    else:
+        # solo la hora: hoy si todavía no pasó, si no mañana
+        day = today
+        if datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=expression.minute) <= now:
+            day += timedelta(days=1)
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=expression.minute)
+
+def format_slot(slot: datetime) -> str:
+    """Forma canónica que se guarda en `desired_time` (y que el parser vuelve a entender)."""
+    return f"{WEEKDAYS_ES[slot.weekday()]} {slot:%d/%m/%Y} a las {slot:%H:%M}"
+
+class DateTimeParser:
+    """
+    Convierte fechas y horas en español ("mañana a las 4pm", "el viernes en la tarde") en un datetime concreto.
+    El reloj se inyecta para poder probar con una fecha fija; la interpretación de cada frase se memoriza
+    (`parse_expression`), así las frases repetidas solo cuestan la aritmética de la fecha.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        self.clock = clock
+
+    def parse(self, text: str) -> datetime | None:
+        expression = parse_expression(text)
+        if expression is None:
+            return None
+        return resolve(expression, self.clock())
+
+_parser = DateTimeParser()
+
+def get_datetime_parser() -> DateTimeParser:
+    return _parser
+
+def parse_desired_time(text: str) -> datetime | None:
+    return get_datetime_parser().parse(text)
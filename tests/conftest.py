@@ -0,0 +1,48 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_chroma import Chroma
+from src.core import vectorstore
+
+## fixtures compartidas de la base de conocimiento: embeddings falsos, sin OpenAI
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """embeddings falsos que cuentan cuántos textos se embebieron"""
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+@pytest.fixture
+def kb(tmp_path):
+    """base de conocimiento aislada en un directorio temporal"""
+    data_path = tmp_path / "info-mascotas"
+    data_path.mkdir()
+    embeddings = CountingEmbeddings(size=16)
+    vs = Chroma(persist_directory=str(tmp_path / "chroma"), embedding_function=embeddings)
+    manifest_path = str(tmp_path / "manifest.json")
+
+    def sync():
+        return vectorstore.sync_vectorstore(vs, str(data_path), manifest_path)
+
+    return data_path, vs, embeddings, sync
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    embeddings = CountingEmbeddings(size=16)
+    monkeypatch.setattr(vectorstore, "_get_embeddings", lambda: embeddings)
+    return embeddings
+
+@pytest.fixture
+def live_kb(tmp_path, fake_embeddings, monkeypatch):
+    """singleton del vectorstore apuntando a un directorio temporal"""
+    data_path = tmp_path / "info-mascotas"
+    data_path.mkdir()
+    monkeypatch.setattr(vectorstore, "DATA_PATH", str(data_path))
+    monkeypatch.setattr(vectorstore, "CHROMA_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setattr(vectorstore, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(vectorstore, "VECTORSTORE_SNAPSHOT", "")
+    monkeypatch.setattr(vectorstore, "_active", vectorstore.ActiveIndex())
+    monkeypatch.setattr(vectorstore, "_ingest_store", None)
+    yield data_path
+    vectorstore.stop_watcher()
@@ -0,0 +1,110 @@
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from src.agents import rag
+from src.core.answer_cache import SemanticAnswerCache, answer_key
+from src.core.query_cache import QueryCache
+from src.core.retrieval import MMRRetriever
+
+## tests de la caché semántica de respuestas (LLM y embeddings falsos, sin OpenAI)
+
+class CountingChatModel(FakeListChatModel):
+    """LLM falso que cuenta cuántas veces se le pidió una respuesta"""
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+def test_similar_question_reuses_answer():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.store("¿cada cuánto vacuno a mi perro?", [1.0, 0.0, 0.0], "Una vez al año.", version=1)
+
+    assert cache.lookup([0.95, 0.1, 0.0], version=1) == ("Una vez al año.", pytest.approx(0.9945, abs=1e-3))
+    assert cache.lookup([0.0, 1.0, 0.0], version=1) is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+
+def test_new_index_version_invalidates_answers():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.store("pulgas", [1.0, 0.0], "Pipetas.", version=1)
+
+    assert cache.lookup([1.0, 0.0], version=2) is None
+    assert len(cache) == 0
+
+def test_least_recently_used_answer_is_evicted():
+    cache = SemanticAnswerCache(maxsize=2, threshold=0.99)
+    cache.store("a", [1.0, 0.0, 0.0], "A", version=1)
+    cache.store("b", [0.0, 1.0, 0.0], "B", version=1)
+    cache.lookup([1.0, 0.0, 0.0], version=1)  # "b" pasa a ser la menos usada
+
+    cache.store("c", [0.0, 0.0, 1.0], "C", version=1)
+
+    assert cache.lookup([0.0, 1.0, 0.0], version=1) is None
+    assert cache.lookup([1.0, 0.0, 0.0], version=1)[0] == "A"
+    assert cache.evictions == 1 and len(cache) == 2
+
+def test_near_paraphrase_about_another_species_is_not_reused():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.store("¿vacuna para perros?", [1.0, 0.0], "Antirrábica y óctuple.", version=1, key=answer_key("¿vacuna para perros?"))
+
+    # embeddings casi idénticos, pero la especie (o la dosis) cambia la respuesta
+    assert cache.lookup([0.99, 0.05], version=1, key=answer_key("¿vacuna para gatos?")) is None
+    assert cache.lookup([0.99, 0.05], version=1, key=answer_key("¿vacuna para perros de 3 meses?")) is None
+    assert cache.lookup([0.99, 0.05], version=1, key=answer_key("¿Vacunas para mi perro?"))[0] == "Antirrábica y óctuple."
+
+def test_follow_up_depends_on_the_previous_question():
+    after_fleas = answer_key("¿y para gatos?", "¿Cómo saco las pulgas a mi perro?")
+
+    assert after_fleas != answer_key("¿y para gatos?", "¿Qué vacunas necesita mi perro?")
+    assert after_fleas != answer_key("¿y para gatos?")
+    assert after_fleas == answer_key("¿Y para gatos?", "¿como saco las pulgas a mi perro")
+
+@pytest.fixture
+def fake_rag(tmp_path, monkeypatch):
+    """rag_node con un retriever sobre embeddings falsos y un LLM falso"""
+    vs = Chroma.from_texts(["La vacuna antirrábica se aplica una vez al año."], DeterministicFakeEmbedding(size=16),
+                           persist_directory=str(tmp_path / "chroma"))
+    retriever = MMRRetriever(vectorstore=vs, k=1, cache=QueryCache(maxsize=10, ttl=60))
+    llm = CountingChatModel(responses=["La antirrábica se aplica una vez al año."])
+    cache = SemanticAnswerCache(maxsize=10, threshold=0.95)
+    monkeypatch.setattr(rag, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(rag, "get_llm", lambda: llm)
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(rag, "get_index_version", lambda: 1)
+    return llm, cache
+
+def ask(question, **extra):
+    return rag.rag_node({"messages": [HumanMessage(content=question)], "booking_info": {}, "next_step": "", **extra})
+
+def test_repeated_question_skips_the_llm(fake_rag):
+    llm, cache = fake_rag
+    first = ask("¿Cada cuánto vacuno a mi perro?")
+    second = ask("cada cuánto vacuno a mi perro")
+
+    assert second["messages"][0].content == first["messages"][0].content
+    assert llm.calls == 1
+    assert cache.hits == 1
+
+def test_answer_cache_can_be_disabled_per_request(fake_rag):
+    llm, cache = fake_rag
+    ask("¿Cada cuánto vacuno a mi perro?")
+    ask("¿Cada cuánto vacuno a mi perro?", use_answer_cache=False)
+
+    assert llm.calls == 2
+    assert cache.hits == 0 and len(cache) == 1
+
+def test_follow_up_in_another_conversation_goes_to_the_llm(fake_rag):
+    llm, cache = fake_rag
+    llm.responses = ["Pipetas cada mes.", "Antirrábica anual."]
+    ask_in = lambda history, question: rag.rag_node({"messages": history + [HumanMessage(content=question)],
+                                                      "booking_info": {}, "next_step": ""})
+    fleas = [HumanMessage(content="¿Cómo trato las pulgas de mi perro?"), AIMessage(content="Con pipetas.")]
+    vaccines = [HumanMessage(content="¿Qué vacunas necesita mi perro?"), AIMessage(content="La antirrábica.")]
+
+    first = ask_in(fleas, "¿y cada cuánto?")
+    second = ask_in(vaccines, "¿y cada cuánto?")
+
+    assert llm.calls == 2 and cache.hits == 0
+    assert first["messages"][0].content != second["messages"][0].content
@@ -0,0 +1,113 @@
+import time
+import asyncio
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from src.agents import booking, rag
+from src.agents.booking import BookingSchema
+from src.agents.router import arouter_node
+from src.graph import workflow
+from src.core.answer_cache import SemanticAnswerCache
+from src.core.query_cache import QueryCache
+from src.core.retrieval import MMRRetriever
+from src.tools import mock_api
+
+## tests del camino async del grafo (ainvoke/astream) con LLM y embeddings falsos, sin OpenAI
+
+DELAY = 0.2
+CONVERSATIONS = 20
+
+class SlowChatModel(FakeListChatModel):
+    """LLM falso con latencia de red simulada que registra cuántas llamadas hubo en vuelo a la vez"""
+    delay: float = DELAY
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return self._generate(messages, stop=stop, **kwargs)
+
+async def route_technical(state):
+    return {"next_step": "technical_question"}
+
+@pytest.fixture
+def fake_rag(tmp_path, monkeypatch):
+    """RAG sobre embeddings falsos con el router fijo en preguntas técnicas"""
+    vs = Chroma.from_texts(["La vacuna antirrábica se aplica una vez al año."], DeterministicFakeEmbedding(size=16),
+                           persist_directory=str(tmp_path / "chroma"))
+    retriever = MMRRetriever(vectorstore=vs, k=1, cache=QueryCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(rag, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: SemanticAnswerCache(maxsize=100))
+    monkeypatch.setattr(rag, "get_faq_index", lambda: None)
+    monkeypatch.setattr(workflow, "arouter_node", route_technical)
+
+def initial_state(question, **extra):
+    return {"messages": [HumanMessage(content=question)], "booking_info": {}, "next_step": "", **extra}
+
+def test_conversations_progress_concurrently_on_one_event_loop(fake_rag, monkeypatch):
+    llm = SlowChatModel(responses=["Una vez al año."])
+    monkeypatch.setattr(rag, "get_llm", lambda: llm)
+    app = workflow.create_graph()
+
+    async def serve():
+        return await asyncio.gather(*(
+            app.ainvoke(initial_state(f"¿Cada cuánto vacuno a mi perro número {n}?")) for n in range(CONVERSATIONS)
+        ))
+
+    start = time.perf_counter()
+    results = asyncio.run(serve())
+    elapsed = time.perf_counter() - start
+
+    assert [r["messages"][-1].content for r in results] == ["Una vez al año."] * CONVERSATIONS
+    # en serie serían CONVERSATIONS * DELAY = 4 s
+    assert llm.max_in_flight == CONVERSATIONS
+    assert elapsed < CONVERSATIONS * DELAY / 4
+
+def test_astream_yields_tokens_then_final_state(fake_rag, monkeypatch):
+    answer = "La antirrábica se aplica una vez al año."
+    monkeypatch.setattr(rag, "get_llm", lambda: GenericFakeChatModel(messages=iter([AIMessage(content=answer)])))
+
+    async def collect():
+        return [event async for event in workflow.astream_graph(workflow.create_graph(), initial_state("¿Vacuna del perro?"))]
+
+    events = asyncio.run(collect())
+
+    assert "".join(payload for kind, payload in events if kind == "token") == answer
+    assert events[-1][0] == "final" and events[-1][1]["messages"][-1].content == answer
+
+def test_async_booking_waits_on_tools_without_blocking(monkeypatch):
+    monkeypatch.setattr(mock_api, "MOCK_API_LATENCY", DELAY)
+    monkeypatch.setattr(mock_api, "_book", lambda day, hour: {"vet": "Dra. Soto", "room": "Box 1"})  # siempre disponible
+    monkeypatch.setattr(booking, "_extraction_chain",
+                        lambda: RunnableLambda(lambda _: BookingSchema(desired_time="mañana a las 10")))
+    info = {"owner_name": "Ana", "phone": "123456789", "email": "ana@test.com", "pet_name": "Max",
+            "pet_species": "perro", "pet_age": "5 años", "reason": "control"}
+
+    async def book_all():
+        return await asyncio.gather(*(
+            booking.abooking_node(initial_state("mañana a las 10", booking_info=dict(info)))
+            for _ in range(10)
+        ))
+
+    start = time.perf_counter()
+    results = asyncio.run(book_all())
+
+    assert all("confirmado la cita para Max" in r["messages"][0].content for r in results)
+    assert time.perf_counter() - start < 10 * DELAY / 2
+
+def test_async_router_skips_llm_for_active_booking(monkeypatch):
+    def no_llm():
+        raise AssertionError("con una cita en curso no se clasifica con el LLM")
+    monkeypatch.setattr("src.agents.router.get_llm", no_llm)
+
+    result = asyncio.run(arouter_node(initial_state("mi perro se llama Max", booking_info={"pet_species": "perro"})))
+
+    assert result == {"next_step": "schedule_appointment", "extracted_booking": None}
@@ -0,0 +1,56 @@
+import pytest
+from langchain_core.messages import HumanMessage
+from src.agents import booking
+from src.utils.booking_extractor import extract_asked_field
+
+## tests de la extracción determinista del dato pedido en el agendamiento (sin LLM)
+
+@pytest.mark.parametrize("text, field, expected", [
+    ("+56 9 1234 5678", "phone", "+56 9 1234 5678"),
+    ("mi teléfono es 912345678", "phone", "912345678"),
+    ("ana@mail.cl", "email", "ana@mail.cl"),
+    ("Mi correo es ana@mail.cl", "email", "ana@mail.cl"),
+    ("3 años", "pet_age", "3 años"),
+    ("tiene un año y 2 meses", "pet_age", "1 año y 2 meses"),
+    ("mañana a las 4pm", "desired_time", "mañana a las 4pm"),
+    ("el lunes a las 10:30", "desired_time", "el lunes a las 10:30"),
+    ("es un gato", "pet_species", "gato"),
+    ("me llamo Ana Pérez", "owner_name", "Ana Pérez"),
+    ("Max", "pet_name", "Max"),
+])
+def test_bare_values_are_extracted(text, field, expected):
+    assert extract_asked_field(text, field) == {field: expected}
+
+@pytest.mark.parametrize("text, field", [
+    ("no sé, cuando tengan un hueco", "desired_time"),
+    ("quiero que lo revisen porque vomita", "pet_name"),
+    ("perro", "pet_name"),
+    ("control anual de vacunas", "reason"),  # texto libre: siempre el LLM
+    ("ana@mail.cl", None),  # no se estaba preguntando nada
+])
+def test_free_text_goes_to_the_llm(text, field):
+    assert extract_asked_field(text, field) is None
+
+def no_llm():
+    raise AssertionError("un dato suelto no debe llamar al LLM")
+
+def turn(monkeypatch, text, info):
+    monkeypatch.setattr(booking, "get_llm", no_llm)
+    return booking.booking_node({"messages": [HumanMessage(content=text)], "booking_info": info, "next_step": ""})
+
+def test_booking_turn_with_the_asked_value_skips_the_llm(monkeypatch):
+    info = {"status": "in_progress", "owner_name": "Ana", "asking": "phone"}
+
+    result = turn(monkeypatch, "+56 9 1234 5678", info)
+
+    assert result["booking_info"]["phone"] == "+56912345678"  # normalizado por el validador de BookingSchema
+    assert result["booking_info"]["asking"] == "email"
+    assert "correo electrónico" in result["messages"][0].content
+
+def test_invalid_bare_value_gets_the_format_reply_without_llm(monkeypatch):
+    info = {"status": "in_progress", "owner_name": "Ana", "asking": "phone"}
+
+    result = turn(monkeypatch, "1234-5678-9012-3456", info)
+
+    assert "número de teléfono que proporcionaste no tiene un formato válido" in result["messages"][0].content
+    assert "phone" not in result["booking_info"] and result["booking_info"]["asking"] == "phone"
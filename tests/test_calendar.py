@@ -0,0 +1,112 @@
+from datetime import datetime
+import pytest
+from langchain_core.messages import HumanMessage
+from src.agents import booking
+from src.tools import mock_api
+from src.tools.clinic_calendar import ClinicCalendar
+from src.utils import datetime_parser
+from src.utils.datetime_parser import DateTimeParser
+
+## tests de la agenda de la clínica (bitmaps por veterinario y box) y de las alternativas en el agendamiento
+
+NOW = datetime(2026, 10, 17, 11, 0)  # sábado; los domingos la clínica está cerrada
+MONDAY_10 = datetime(2026, 10, 19, 10, 0)
+
+def empty_calendar(**kwargs):
+    return ClinicCalendar(occupancy=0, clock=lambda: NOW, **kwargs)
+
+def test_slot_needs_a_free_vet_and_a_free_room():
+    calendar = empty_calendar(vets=["Dra. Soto", "Dr. Rojas"], rooms=["Box 1"])
+
+    assert calendar.book(MONDAY_10) == {"vet": "Dra. Soto", "room": "Box 1"}
+    assert not calendar.is_free(MONDAY_10)  # queda un veterinario libre, pero ningún box
+    assert calendar.book(MONDAY_10) is None
+
+@pytest.mark.parametrize("slot", [
+    datetime(2026, 10, 17, 10, 30),  # ya pasó
+    datetime(2026, 10, 18, 10, 0),   # domingo
+    datetime(2026, 10, 19, 10, 15),  # no coincide con un bloque
+    datetime(2026, 10, 19, 19, 0),   # fuera de la jornada
+    datetime(2027, 3, 1, 10, 0),     # fuera del horizonte de reservas
+])
+def test_closed_or_invalid_slots_are_never_free(slot):
+    assert not empty_calendar().is_free(slot)
+
+def test_nearest_free_slots_are_ordered_by_distance():
+    calendar = empty_calendar(vets=["Dra. Soto"], rooms=["Box 1"])
+    for hour, minute in [(10, 0), (10, 30), (11, 0)]:
+        calendar.book(MONDAY_10.replace(hour=hour, minute=minute))
+
+    assert calendar.nearest_free(MONDAY_10, 3) == [
+        datetime(2026, 10, 19, 9, 30), datetime(2026, 10, 19, 9, 0), datetime(2026, 10, 19, 11, 30),
+    ]
+
+def test_nearest_free_skips_closed_days_and_the_past():
+    calendar = empty_calendar()
+
+    # domingo: lo más cercano es el sábado en la tarde, nunca antes de ahora
+    assert calendar.nearest_free(datetime(2026, 10, 18, 12, 0), 2) == [datetime(2026, 10, 17, 18, 30), datetime(2026, 10, 17, 18, 0)]
+    assert calendar.nearest_free(datetime(2026, 10, 17, 9, 0), 1) == [datetime(2026, 10, 17, 11, 30)]
+
+def test_simulated_occupancy_is_reproducible():
+    first, second = ClinicCalendar(clock=lambda: NOW), ClinicCalendar(clock=lambda: NOW)
+
+    assert first.free_mask(MONDAY_10.date()) == second.free_mask(MONDAY_10.date()) != first.full_mask
+
+@pytest.fixture
+def busy_monday(monkeypatch):
+    calendar = empty_calendar(vets=["Dra. Soto"], rooms=["Box 1"])
+    calendar.book(MONDAY_10)
+    monkeypatch.setattr(mock_api, "get_calendar", lambda: calendar)
+    monkeypatch.setattr(datetime_parser, "_parser", DateTimeParser(clock=lambda: NOW))
+    monkeypatch.setattr(booking, "get_llm", lambda: pytest.fail("elegir un horario no debe llamar al LLM"))
+    return calendar
+
+def turn(text, info, attempts=0):
+    return booking.booking_node({"messages": [HumanMessage(content=text)], "booking_info": info,
+                                 "availability_attempts": attempts, "next_step": ""})
+
+def full_info():
+    return {"status": "in_progress", "owner_name": "Ana", "phone": "123456789", "email": "ana@test.com",
+            "pet_name": "Max", "pet_species": "perro", "pet_age": "5 años", "reason": "control", "asking": "desired_time"}
+
+def test_busy_slot_offers_the_nearest_alternatives_and_books_the_choice(busy_monday):
+    result = turn("el lunes a las 10", full_info())
+
+    assert "NO está disponible" in result["messages"][0].content
+    assert result["booking_info"]["offered_slots"] == [
+        "lunes 19/10/2026 a las 10:30", "lunes 19/10/2026 a las 09:30", "lunes 19/10/2026 a las 11:00",
+    ]
+    assert "1. lunes 19/10/2026 a las 10:30" in result["messages"][0].content
+
+    result = turn("la primera", result["booking_info"], result["availability_attempts"])
+
+    assert "confirmado la cita para Max (perro) el lunes 19/10/2026 a las 10:30 con Dra. Soto en Box 1" in result["messages"][0].content
+    assert not busy_monday.is_free(datetime(2026, 10, 19, 10, 30))
+
+def test_escalates_after_max_attempts(busy_monday, monkeypatch):
+    monkeypatch.setattr(mock_api, "_ticket", lambda user_info: "TICKET-1234")
+
+    result = turn("el lunes a las 10", full_info(), attempts=booking.MAX_ATTEMPTS - 1)
+
+    assert "TICKET-1234" in result["messages"][0].content
+    assert result["availability_attempts"] == 0
+    assert f"has intentado {booking.MAX_ATTEMPTS} horarios" in result["messages"][0].content
+
+def test_escalates_on_first_attempt_when_nothing_is_free_nearby(monkeypatch):
+    calendar = empty_calendar(vets=["Dra. Soto"], rooms=["Box 1"], horizon_days=2)
+    calendar.book(MONDAY_10)
+    for slot in calendar.nearest_free(MONDAY_10, 100):
+        calendar.book(slot)
+    monkeypatch.setattr(mock_api, "get_calendar", lambda: calendar)
+    monkeypatch.setattr(datetime_parser, "_parser", DateTimeParser(clock=lambda: NOW))
+    tickets = []
+    monkeypatch.setattr(mock_api, "_ticket", lambda user_info: tickets.append(user_info) or "TICKET-5678")
+
+    result = turn("el lunes a las 10", full_info())
+
+    reply = result["messages"][0].content
+    assert "TICKET-5678" in reply
+    assert "no quedan horarios libres cerca de 'lunes 19/10/2026 a las 10:00'" in reply
+    assert "has intentado" not in reply
+    assert "no quedan horarios libres" in tickets[0]
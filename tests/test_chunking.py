@@ -0,0 +1,76 @@
+from langchain_core.documents import Document
+from src.core.chunking import markdown_sections, split_structured, text_sections
+
+## tests del troceado por estructura (encabezados Markdown y títulos de TXT/PDF)
+
+GUIDE = """# Guía de cuidados
+
+Introducción breve a la guía.
+
+## Vacunas
+
+La vacuna antirrábica es obligatoria desde los tres meses.
+
+### Refuerzos
+
+Se aplica un refuerzo una vez al año.
+
+# Alimentación
+
+Los cachorros comen cuatro veces al día.
+"""
+
+def md(text, source="data/guia.md"):
+    return Document(page_content=text, metadata={"source": source})
+
+def test_markdown_sections_carry_heading_path():
+    sections = markdown_sections(GUIDE)
+
+    assert [path for path, _ in sections] == [
+        ["Guía de cuidados"],
+        ["Guía de cuidados", "Vacunas"],
+        ["Guía de cuidados", "Vacunas", "Refuerzos"],
+        ["Alimentación"],
+    ]
+    assert sections[2][1].startswith("### Refuerzos")
+
+def test_small_sections_of_same_chapter_are_grouped():
+    chunks = split_structured([md(GUIDE)], max_tokens=500)
+
+    # el capítulo 1 entra entero; el siguiente capítulo nunca se mezcla con el anterior
+    assert [c.metadata["headings"] for c in chunks] == ["Guía de cuidados", "Alimentación"]
+    assert "Refuerzos" in chunks[0].page_content
+    assert all(c.metadata["source"] == "data/guia.md" for c in chunks)
+
+def test_sections_never_cross_the_budget():
+    chunks = split_structured([md(GUIDE)], max_tokens=20, overlap=0)
+
+    assert "Guía de cuidados > Vacunas > Refuerzos" in [c.metadata["headings"] for c in chunks]
+    assert not any("Vacunas" in c.page_content and "Alimentación" in c.page_content for c in chunks)
+
+def test_long_section_is_split_keeping_its_headings():
+    body = "\n\n".join(f"Párrafo {i} sobre la dieta de gatos adultos con detalle." for i in range(40))
+    chunks = split_structured([md(f"# Dieta\n\n{body}")], max_tokens=60, overlap=10)
+
+    assert len(chunks) > 1
+    assert {c.metadata["headings"] for c in chunks} == {"Dieta"}
+
+def test_bold_line_is_a_subheading():
+    sections = markdown_sections("# Gatos\n\n**Cuidado dental:**\n\nCepillar dos veces por semana.")
+
+    assert sections[-1][0] == ["Gatos", "Cuidado dental"]
+
+def test_text_blocks_use_short_lines_as_titles():
+    page = "Parásitos internos\n\nLos gusanos intestinales se tratan cada tres meses.\n\nOtra línea del mismo tema."
+
+    assert text_sections(page) == [
+        (["Parásitos internos"], "Parásitos internos\n\nLos gusanos intestinales se tratan cada tres meses."
+                                 "\n\nOtra línea del mismo tema.")
+    ]
+
+def test_pdf_pages_are_chunked_separately():
+    pages = [Document(page_content=f"Página {n}\n\nTexto de la página {n}.", metadata={"source": "m.pdf", "page": n})
+             for n in range(2)]
+    chunks = split_structured(pages, max_tokens=500)
+
+    assert [(c.metadata["page"], c.metadata["headings"]) for c in chunks] == [(0, "Página 0"), (1, "Página 1")]
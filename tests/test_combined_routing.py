@@ -0,0 +1,65 @@
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+from src.agents import booking, router
+from src.agents.booking import BookingSchema
+from src.graph import workflow
+
+## tests del modo combinado: una sola llamada al LLM decide la ruta y extrae los datos de la cita
+
+def combined_llm(calls, **fields):
+    """cadena falsa del router que responde con RouteWithBooking y cuenta las llamadas"""
+    def answer(payload):
+        calls.append(payload["question"])
+        return router.RouteWithBooking(**fields)
+    return lambda: RunnableLambda(answer)
+
+def no_llm():
+    raise AssertionError("el agente de citas no debe volver a llamar al LLM")
+
+def start(monkeypatch, calls, **fields):
+    monkeypatch.setattr(router, "ROUTER_COMBINED", True)
+    monkeypatch.setattr(router, "ROUTER_LOCAL", False)
+    monkeypatch.setattr(router, "_router_chain", combined_llm(calls, **fields))
+    monkeypatch.setattr(booking, "get_llm", no_llm)
+    return workflow.create_graph()
+
+def state(text):
+    return {"messages": [HumanMessage(content=text)], "booking_info": {}, "next_step": ""}
+
+def test_booking_reuses_fields_extracted_by_the_router(monkeypatch):
+    calls = []
+    app = start(monkeypatch, calls, destination="schedule_appointment", owner_name="Ana", pet_name="Max", pet_species="perro")
+
+    result = app.invoke(state("Hola, soy Ana y quiero una hora para mi perro Max"))
+
+    assert calls == ["Hola, soy Ana y quiero una hora para mi perro Max"]  # una sola llamada, con mayúsculas
+    assert {k: result["booking_info"][k] for k in ("owner_name", "pet_name", "pet_species")} == \
+        {"owner_name": "Ana", "pet_name": "Max", "pet_species": "perro"}
+    assert "Para atender a Max, necesito un teléfono de contacto" in result["messages"][-1].content
+
+def test_invalid_prefilled_field_gets_the_format_reply(monkeypatch):
+    app = start(monkeypatch, [], destination="schedule_appointment", email="ana-arroba-mail")
+
+    result = app.invoke(state("Quiero una cita, mi correo es ana-arroba-mail"))
+
+    assert "correo electrónico que proporcionaste no tiene un formato válido" in result["messages"][-1].content
+    assert "email" not in result["booking_info"]
+
+def test_other_routes_carry_no_booking_fields():
+    decision = router.RouteWithBooking(destination="technical_question", pet_name="Max")
+
+    assert router._route_update(decision) == {"next_step": "technical_question", "extracted_booking": None}
+
+def test_router_fields_are_not_reapplied_on_the_next_turn(monkeypatch):
+    app = start(monkeypatch, [], destination="schedule_appointment", owner_name="Ana", pet_name="Max",
+                desired_time="el lunes a las 10")
+    first = app.invoke(state("Soy Ana, quiero una hora para Max el lunes a las 10"))
+    assert first["booking_info"]["desired_time"].startswith("lunes")
+    assert first["extracted_booking"] is None
+
+    # segundo turno: con la cita en curso el router no clasifica y el mensaje nuevo pasa por el extractor
+    monkeypatch.setattr(booking, "_extraction_chain", lambda: RunnableLambda(lambda _: BookingSchema(desired_time="el martes a las 11")))
+    second = app.invoke({**first, "messages": first["messages"] + [HumanMessage(content="Mejor el martes a las 11")]})
+
+    assert second["booking_info"]["desired_time"].startswith("martes")
+    assert second["booking_info"]["desired_time"].endswith("a las 11:00")
@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+from src.core.context import drop_near_duplicates, merge_overlapping, pack_context
+
+## tests del armado de contexto (tokens contados por palabras para no depender de tiktoken)
+
+def words(text):
+    return len(text.split())
+
+def chunk(text, source="guia.md", page=None):
+    metadata = {"source": source}
+    if page is not None:
+        metadata["page"] = page
+    return Document(page_content=text, metadata=metadata)
+
+FIRST = "La vacuna antirrábica es obligatoria para perros y gatos desde los tres meses de edad."
+SECOND = "desde los tres meses de edad. Luego se aplica un refuerzo una vez al año."
+
+def test_overlapping_chunks_of_same_source_are_merged():
+    merged = merge_overlapping([chunk(SECOND), chunk(FIRST)])
+
+    assert [d.page_content for d in merged] == [
+        "La vacuna antirrábica es obligatoria para perros y gatos desde los tres meses de edad."
+        " Luego se aplica un refuerzo una vez al año."
+    ]
+
+def test_chunks_from_other_sources_or_pages_are_not_merged():
+    assert len(merge_overlapping([chunk(FIRST), chunk(SECOND, source="otro.md")])) == 2
+    assert len(merge_overlapping([chunk(FIRST, page=1), chunk(SECOND, page=2)])) == 2
+
+def test_contained_chunk_is_absorbed():
+    assert [d.page_content for d in merge_overlapping([chunk(FIRST), chunk("obligatoria para perros y gatos")])] == [FIRST]
+
+def test_near_duplicates_keep_the_best_ranked():
+    copy = FIRST.replace("edad.", "edad!")
+    kept = drop_near_duplicates([chunk(FIRST, source="a.md"), chunk(copy, source="b.md"), chunk(SECOND)])
+
+    assert [d.metadata["source"] for d in kept] == ["a.md", "guia.md"]
+
+def test_packing_respects_budget_and_rank():
+    docs = [chunk("uno dos tres", source="a"), chunk("cuatro cinco seis siete ocho", source="b"),
+            chunk("nueve diez", source="c")]
+
+    context, packed = pack_context(docs, budget=6, count=words)
+
+    # el segundo no entra, pero el tercero sí
+    assert [d.metadata["source"] for d in packed] == ["a", "c"]
+    assert context == "uno dos tres\n\nnueve diez"
+
+def test_best_chunk_is_truncated_when_nothing_fits():
+    context, packed = pack_context([chunk("a " * 5000, source="a")], budget=10)
+
+    assert len(packed) == 1 and 0 < len(context) < 100
@@ -0,0 +1,73 @@
+from datetime import datetime
+import pytest
+from langchain_core.messages import HumanMessage
+from pydantic import ValidationError
+from src.agents import booking
+from src.agents.booking import BookingSchema
+from src.tools import mock_api
+from src.utils import datetime_parser
+from src.utils.datetime_parser import DateTimeParser, format_slot, parse_expression
+
+## tests del normalizador local de fechas y horas en español (sin LLM)
+
+NOW = datetime(2026, 10, 17, 11, 0)  # sábado
+
+@pytest.fixture
+def parser(monkeypatch):
+    fixed = DateTimeParser(clock=lambda: NOW)
+    monkeypatch.setattr(datetime_parser, "_parser", fixed)
+    return fixed
+
+@pytest.mark.parametrize("text, expected", [
+    ("mañana a las 4pm", datetime(2026, 10, 18, 16, 0)),
+    ("pasado mañana a las 10:30", datetime(2026, 10, 19, 10, 30)),
+    ("hoy a las 5", datetime(2026, 10, 17, 17, 0)),
+    ("el lunes en la tarde", datetime(2026, 10, 19, 15, 0)),
+    ("el jueves 9 de la mañana", datetime(2026, 10, 22, 9, 0)),
+    ("mañana 4 de la tarde", datetime(2026, 10, 18, 16, 0)),
+    ("sábado a las 10", datetime(2026, 10, 24, 10, 0)),  # hoy es sábado y las 10 ya pasaron
+    ("15/11 al mediodía", datetime(2026, 11, 15, 12, 0)),
+    ("3 de marzo a las 9", datetime(2027, 3, 3, 9, 0)),  # sin año y ya pasó: el próximo
+    ("2026-12-01 18:00", datetime(2026, 12, 1, 18, 0)),
+    ("a las 10", datetime(2026, 10, 18, 10, 0)),  # solo la hora y ya pasó: mañana
+])
+def test_phrases_resolve_to_concrete_slots(parser, text, expected):
+    assert parser.parse(text) == expected
+
+@pytest.mark.parametrize("text", ["el lunes", "31/02 a las 10", "mañana a las 25:00", "cuando tengan un hueco"])
+def test_incomplete_or_invalid_phrases_are_rejected(parser, text):
+    assert parser.parse(text) is None
+
+def test_canonical_form_parses_back_to_the_same_slot(parser):
+    slot = datetime(2026, 10, 18, 16, 0)
+
+    assert format_slot(slot) == "domingo 18/10/2026 a las 16:00"
+    assert parser.parse(format_slot(slot)) == slot
+
+def test_repeated_phrases_hit_the_memo_cache():
+    parse_expression.cache_clear()
+    today = DateTimeParser(clock=lambda: NOW)
+    next_week = DateTimeParser(clock=lambda: datetime(2026, 10, 24, 11, 0))
+
+    assert today.parse("el martes a las 4") == datetime(2026, 10, 20, 16, 0)
+    assert next_week.parse("el martes a las 4") == datetime(2026, 10, 27, 16, 0)
+    assert parse_expression.cache_info().hits == 1
+
+def test_booking_schema_normalizes_desired_time(parser):
+    assert BookingSchema(desired_time="mañana a las 4pm").desired_time == "domingo 18/10/2026 a las 16:00"
+
+@pytest.mark.parametrize("text, message", [("hoy a las 9am", "ya pasó"), ("cuando puedan", "indica el día y la hora")])
+def test_booking_schema_rejects_past_or_unclear_times(parser, text, message):
+    with pytest.raises(ValidationError, match=message):
+        BookingSchema(desired_time=text)
+
+def test_availability_is_checked_with_iso_day_and_hour(parser, monkeypatch):
+    queries = []
+    monkeypatch.setattr(mock_api, "_book", lambda day, hour: queries.append((day, hour)) or {"vet": "Dra. Soto", "room": "Box 1"})
+    info = {"status": "in_progress", "owner_name": "Ana", "phone": "123456789", "email": "ana@test.com",
+            "pet_name": "Max", "pet_species": "perro", "pet_age": "5 años", "reason": "control", "asking": "desired_time"}
+
+    result = booking.booking_node({"messages": [HumanMessage(content="el lunes a las 10:30")], "booking_info": info, "next_step": ""})
+
+    assert queries == [("2026-10-19", "10:30")]
+    assert "el lunes 19/10/2026 a las 10:30" in result["messages"][0].content
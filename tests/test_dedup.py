@@ -0,0 +1,91 @@
+import json
+import numpy as np
+from src.core.dedup import BANDS, DedupIndex, minhash_signature
+
+## tests de la eliminación de fragmentos casi duplicados (MinHash + LSH), sin OpenAI
+
+BROCHURE = (
+    "La vacuna antirrábica es obligatoria para perros y gatos a partir de los tres meses de edad. "
+    "Se aplica un refuerzo anual y el certificado debe presentarse en cada control veterinario. "
+    "Los cachorros también deben recibir la vacuna séxtuple en tres dosis separadas por tres semanas, "
+    "y los gatitos la triple felina. Mantén el carnet de vacunas al día y consulta a tu veterinario "
+    "ante cualquier reacción como fiebre, decaimiento o inflamación en el lugar de la inyección."
+)
+# la copia escaneada del mismo folleto, con una diferencia menor
+SCANNED_COPY = BROCHURE.replace("decaimiento", "decaimiento general")
+
+def similarity(a, b):
+    return float(np.mean(minhash_signature(a) == minhash_signature(b)))
+
+def test_signatures_estimate_similarity():
+    assert similarity(BROCHURE, SCANNED_COPY) > 0.85
+    # tildes y mayúsculas no cuentan
+    assert similarity(BROCHURE, BROCHURE.upper().replace("á", "a")) == 1.0
+    assert similarity(BROCHURE, "Las pulgas se controlan con pipetas mensuales y collares antiparasitarios.") < 0.2
+
+def test_index_finds_and_forgets_representatives(tmp_path):
+    index = DedupIndex(str(tmp_path / "minhash.sqlite"))
+    index.add("folleto", minhash_signature(BROCHURE))
+
+    assert index.find(minhash_signature(SCANNED_COPY))[0] == "folleto"
+    assert index.find(minhash_signature("Los cachorros comen cuatro veces al día.")) is None
+
+    index.remove(["folleto"])
+    assert index.find(minhash_signature(SCANNED_COPY)) is None
+
+def test_re_adding_a_chunk_does_not_duplicate_its_bands(tmp_path):
+    path = str(tmp_path / "minhash.sqlite")
+    index = DedupIndex(path)
+    # índice creado antes de la restricción única, con las bandas del folleto repetidas
+    index.conn.execute("DROP INDEX bands_unique")
+    index.add("folleto", minhash_signature(BROCHURE))
+    index.add("folleto", minhash_signature(BROCHURE))
+    index.close()
+
+    index = DedupIndex(path)
+    index.add("folleto", minhash_signature(BROCHURE))
+    index.add("folleto", minhash_signature(BROCHURE))
+
+    assert index.conn.execute("SELECT COUNT(*) FROM bands").fetchone()[0] == BANDS
+    assert index.find(minhash_signature(SCANNED_COPY))[0] == "folleto"
+
+def test_near_duplicate_files_are_embedded_once(kb, tmp_path):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "a-folleto.md").write_text(BROCHURE, encoding="utf-8")
+    (data_path / "b-escaneo.txt").write_text(SCANNED_COPY, encoding="utf-8")
+
+    stats = sync()
+
+    assert stats["duplicates"] == 1
+    assert embeddings.embedded == 1 and vs._collection.count() == 1
+    assert vs.get()["metadatas"][0]["duplicate_sources"] == "b-escaneo.txt"
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert list(manifest["files"]["b-escaneo.txt"]["merged"].values()) == manifest["files"]["a-folleto.md"]["chunks"]
+
+def test_deleting_the_representative_restores_its_duplicate(kb):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "a-folleto.md").write_text(BROCHURE, encoding="utf-8")
+    (data_path / "b-escaneo.txt").write_text(SCANNED_COPY, encoding="utf-8")
+    sync()
+
+    (data_path / "a-folleto.md").unlink()
+    sync()
+
+    assert vs.get()["documents"] == [SCANNED_COPY]
+    # y al volver el folleto, ahora es él quien se absorbe
+    (data_path / "a-folleto.md").write_text(BROCHURE, encoding="utf-8")
+    stats = sync()
+    assert stats["duplicates"] == 1 and vs._collection.count() == 1
+    assert vs.get()["metadatas"][0]["duplicate_sources"] == "a-folleto.md"
+
+def test_deleting_a_duplicate_updates_the_representative(kb):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "a-folleto.md").write_text(BROCHURE, encoding="utf-8")
+    (data_path / "b-escaneo.txt").write_text(SCANNED_COPY, encoding="utf-8")
+    sync()
+
+    (data_path / "b-escaneo.txt").unlink()
+    sync()
+
+    assert vs.get()["metadatas"][0]["duplicate_sources"] == ""
+    assert vs._collection.count() == 1
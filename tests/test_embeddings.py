@@ -0,0 +1,73 @@
+import time
+import threading
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.core.embeddings import CachedEmbeddings
+
+## tests de la caché de embeddings (sin llamadas a OpenAI)
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    """embeddings falsos que registran los lotes recibidos y la concurrencia máxima"""
+    delay: float = 0.0
+    batches: list = []
+    in_flight: int = 0
+    max_in_flight: int = 0
+    lock: object = None
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.batches.append(list(texts))
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return super().embed_documents(texts)
+
+def make_underlying(**kwargs):
+    return RecordingEmbeddings(size=8, batches=[], lock=threading.Lock(), **kwargs)
+
+def test_cached_vectors_are_not_requested_again(tmp_path):
+    cache_path = str(tmp_path / "emb.sqlite")
+    first = CachedEmbeddings(make_underlying(), cache_path, model_name="fake")
+    vectors = first.embed_documents(["pulgas", "vacunas"])
+
+    # una instancia nueva (otro proceso) reutiliza la misma caché en disco
+    underlying = make_underlying()
+    second = CachedEmbeddings(underlying, cache_path, model_name="fake")
+    again = second.embed_documents(["vacunas", "pulgas", "garrapatas"])
+
+    assert underlying.batches == [["garrapatas"]]
+    assert again[:2] == [vectors[1], vectors[0]]
+    assert (second.hits, second.misses) == (2, 1)
+
+def test_cache_is_scoped_by_model_name(tmp_path):
+    cache_path = str(tmp_path / "emb.sqlite")
+    CachedEmbeddings(make_underlying(), cache_path, model_name="modelo-a").embed_documents(["pulgas"])
+
+    underlying = make_underlying()
+    CachedEmbeddings(underlying, cache_path, model_name="modelo-b").embed_documents(["pulgas"])
+
+    assert underlying.batches == [["pulgas"]]
+
+def test_duplicate_texts_are_embedded_once(tmp_path):
+    underlying = make_underlying()
+    cached = CachedEmbeddings(underlying, str(tmp_path / "emb.sqlite"), model_name="fake")
+
+    vectors = cached.embed_documents(["pulgas", "pulgas", "pulgas"])
+
+    assert underlying.batches == [["pulgas"]]
+    assert vectors[0] == vectors[1] == vectors[2]
+
+def test_batches_run_concurrently_within_limit(tmp_path):
+    underlying = make_underlying(delay=0.05)
+    cached = CachedEmbeddings(underlying, str(tmp_path / "emb.sqlite"), model_name="fake",
+                              batch_size=2, max_concurrency=3)
+
+    texts = [f"fragmento {i}" for i in range(12)]
+    vectors = cached.embed_documents(texts)
+
+    assert len(underlying.batches) == 6
+    assert all(len(batch) == 2 for batch in underlying.batches)
+    assert 1 < underlying.max_in_flight <= 3
+    # el orden de salida respeta el de entrada aunque los lotes terminen desordenados
+    assert vectors == [cached.embed_documents([t])[0] for t in texts]
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import HumanMessage
+from src.agents import rag
+from src.core import faq, vectorstore
+from src.core.faq import FAQIndex, extract_faq
+
+## tests de la tabla de preguntas frecuentes (sin OpenAI)
+
+GUIDE = """# Guía de cuidados
+
+**¿Cada cuánto se vacuna un perro?**
+-----------------------------------
+
+La vacuna antirrábica se aplica una vez al año.
+
+**Dieta**
+
+Los cachorros comen cuatro veces al día.
+
+## ¿Cómo se controlan las pulgas?
+
+Con pipetas mensuales.
+"""
+
+def test_question_headings_become_entries():
+    entries = extract_faq(GUIDE)
+
+    assert [e["question"] for e in entries] == ["¿Cada cuánto se vacuna un perro?", "¿Cómo se controlan las pulgas?"]
+    # la sección termina en el siguiente encabezado del mismo nivel, los sub-encabezados quedan dentro
+    assert entries[0]["answer"].startswith("La vacuna antirrábica")
+    assert "cuatro veces al día" in entries[0]["answer"]
+    assert entries[1]["answer"] == "Con pipetas mensuales."
+
+def test_exact_match_ignores_case_accents_and_punctuation():
+    index = FAQIndex([{"question": "¿Cada cuánto se vacuna un perro?", "answer": "Una vez al año."}], embeddings=None)
+
+    assert index.match("cada cuanto se VACUNA un perro")[0]["answer"] == "Una vez al año."
+    assert index.match("¿qué come un gato?") is None
+
+def test_nearest_neighbour_uses_threshold():
+    embeddings = DeterministicFakeEmbedding(size=16)
+    index = FAQIndex([{"question": "¿Cada cuánto se vacuna un perro?", "answer": "Una vez al año."}], embeddings,
+                     threshold=0.9)
+    same_vector = lambda q: embeddings.embed_query("¿Cada cuánto se vacuna un perro?")
+
+    entry, similarity = index.match("¿cada cuánto hay que vacunar al perro?", same_vector)
+    assert entry["answer"] == "Una vez al año." and similarity > 0.99
+    assert index.match("¿qué come un gato?", embeddings.embed_query) is None
+
+def test_question_about_another_species_is_not_matched():
+    embeddings = DeterministicFakeEmbedding(size=16)
+    index = FAQIndex([{"question": "¿Vacuna para perros?", "answer": "Antirrábica y óctuple."}], embeddings)
+    # el peor caso: el embedding de la pregunta es idéntico al de la tabla
+    same_vector = lambda q: embeddings.embed_query("¿Vacuna para perros?")
+
+    assert index.match("¿Vacuna para gatos?", same_vector) is None
+    assert index.match("¿Vacuna para perros de 2 meses?", same_vector) is None
+    assert index.match("¿Qué vacuna necesitan los perros?", same_vector)[0]["answer"] == "Antirrábica y óctuple."
+
+class ThreadRecordingEmbeddings(DeterministicFakeEmbedding):
+    """embeddings falsos que anotan en qué hilo se embebieron las preguntas de la tabla"""
+    threads: list = []
+
+    def embed_documents(self, texts):
+        self.threads.append(threading.current_thread())
+        return super().embed_documents(texts)
+
+def test_async_rag_builds_faq_matrix_off_the_event_loop(monkeypatch):
+    embeddings = ThreadRecordingEmbeddings(size=16, threads=[])
+    index = FAQIndex([{"question": "¿Cada cuánto se vacuna un perro?", "answer": "Una vez al año."}], embeddings)
+
+    class Retriever:
+        async def aembed_query(self, question):
+            return embeddings.embed_query("¿Cada cuánto se vacuna un perro?")
+    monkeypatch.setattr(rag, "get_retriever", lambda: Retriever())
+    monkeypatch.setattr(rag, "get_faq_index", lambda: index)
+
+    async def ask():
+        loop_thread = threading.current_thread()
+        result = await rag.arag_node({"messages": [HumanMessage(content="¿cada cuánto hay que vacunar al perro?")],
+                                      "booking_info": {}, "next_step": ""})
+        return loop_thread, result
+
+    loop_thread, result = asyncio.run(ask())
+
+    assert result["messages"][0].content == "Una vez al año."
+    assert embeddings.threads and loop_thread not in embeddings.threads
+
+def test_ingestion_builds_faq_and_rag_answers_from_it(live_kb, monkeypatch):
+    monkeypatch.setattr(vectorstore, "KB_FAQ", True)
+    (live_kb / "guia.md").write_text(GUIDE, encoding="utf-8")
+    retriever = vectorstore.get_retriever()
+
+    table = vectorstore.get_faq_index()
+    assert len(table) == 2
+    assert all(entry["chunks"] for entry in table.entries)
+
+    def no_llm():
+        raise AssertionError("una pregunta de la tabla FAQ no debe llegar al LLM")
+    monkeypatch.setattr(rag, "get_llm", no_llm)
+    monkeypatch.setattr(rag, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(rag, "get_faq_index", vectorstore.get_faq_index)
+
+    result = rag.rag_node({"messages": [HumanMessage(content="¿Cómo se controlan las pulgas?")],
+                           "booking_info": {}, "next_step": ""})
+    assert result["messages"][0].content == "Con pipetas mensuales."
+
+def test_existing_index_is_backfilled_without_reembedding(live_kb, fake_embeddings, monkeypatch):
+    (live_kb / "guia.md").write_text(GUIDE, encoding="utf-8")
+    vectorstore.get_vectorstore()
+    fake_embeddings.embedded = 0
+
+    monkeypatch.setattr(vectorstore, "KB_FAQ", True)
+    monkeypatch.setattr(vectorstore, "_active", vectorstore._active._replace(vectorstore=None))
+    vectorstore.get_vectorstore()
+
+    assert len(vectorstore.get_faq_index()) == 2
+    assert fake_embeddings.embedded == 0
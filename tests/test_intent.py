@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.messages import HumanMessage
+from src.agents import router
+from src.core.intent import IntentClassifier, NgramIntentModel
+
+## tests del clasificador local de intención (reglas + n-gramas) delante del router LLM
+
+@pytest.mark.parametrize("text, expected", [
+    ("Quiero agendar una hora para mi gato", "schedule_appointment"),
+    ("¿Tienen disponibilidad el jueves?", "schedule_appointment"),
+    ("Mi perro vomita desde ayer", "technical_question"),
+    ("¿Cada cuánto hay que desparasitar?", "technical_question"),
+    ("Mi gata está convulsionando", "escalate_to_human"),
+    ("Quiero hablar con un humano", "escalate_to_human"),
+    ("Pásame con una persona, por favor", "escalate_to_human"),
+])
+def test_rules_resolve_obvious_messages(text, expected):
+    route, confidence, source = IntentClassifier().classify(text)
+
+    assert (route, source) == (expected, "reglas")
+    assert confidence >= 0.85
+
+@pytest.mark.parametrize("text", [
+    "¿La toxocariasis se transmite al humano?",
+    "¿Los perros pueden contagiar enfermedades al humano?",
+    "¿Qué hago en una emergencia si mi perro se intoxica?",
+    "Quiero cancelar mi suscripción de noticias",
+])
+def test_mentions_without_an_explicit_request_are_not_escalated_locally(text):
+    classifier = IntentClassifier()
+
+    route, confidence, _ = classifier.classify(text)
+
+    assert route != "escalate_to_human" or confidence < classifier.threshold
+
+def test_conflicting_rules_defer_to_the_llm():
+    classifier = IntentClassifier()
+
+    route, confidence, _ = classifier.classify("Necesito una cita urgente porque mi perro vomita, es una emergencia")
+
+    assert route == "escalate_to_human"
+    assert confidence < classifier.threshold
+
+def test_ngram_model_learns_from_examples():
+    model = NgramIntentModel({
+        "technical_question": ["mi perro no come", "mi gato no come nada"],
+        "schedule_appointment": ["quiero ir el lunes", "puedo ir el martes"],
+    })
+
+    assert model.predict("el gato no come")[0] == "technical_question"
+    assert model.predict("puedo ir el viernes")[0] == "schedule_appointment"
+    assert model.predict("xyz")[1] == 0.0
+
+def test_hit_rates_are_counted_per_route():
+    classifier = IntentClassifier(threshold=0.8)
+    classifier.route("quiero reservar una hora")
+    classifier.route("mi perro tiene pulgas")
+    assert classifier.route("hola") is None
+    classifier.record_llm("technical_question")
+
+    assert classifier.stats() == {
+        "technical_question": {"local": 1, "llm": 1},
+        "schedule_appointment": {"local": 1, "llm": 0},
+        "escalate_to_human": {"local": 0, "llm": 0},
+    }
+    assert classifier.hit_rate == pytest.approx(2 / 3)
+
+def test_router_skips_llm_when_local_classifier_is_confident(monkeypatch):
+    classifier = IntentClassifier()
+    monkeypatch.setattr(router, "ROUTER_LOCAL", True)
+    monkeypatch.setattr(router, "get_intent_classifier", lambda: classifier)
+    def no_llm():
+        raise AssertionError("un mensaje obvio no debe llamar al LLM")
+    monkeypatch.setattr(router, "get_llm", no_llm)
+
+    result = router.router_node({"messages": [HumanMessage(content="Quiero agendar una hora")], "booking_info": {}, "next_step": ""})
+
+    assert result == {"next_step": "schedule_appointment", "extracted_booking": None}
+    assert classifier.local_hits["schedule_appointment"] == 1
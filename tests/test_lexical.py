@@ -0,0 +1,70 @@
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.core import vectorstore
+from src.core.lexical import BM25Index, tokenize
+from src.core.retrieval import HybridRetriever, reciprocal_rank_fusion
+
+## tests de la recuperación híbrida (BM25 + vectorial), sin OpenAI
+
+CHUNKS = {
+    "vacunas": "La vacuna antirrábica es obligatoria para perros y gatos.",
+    "parasitos": "La Toxocariasis es transmitida por perros y gatos con parásitos intestinales.",
+    "dieta": "Los cachorros comen cuatro veces al día.",
+    "pulgas": "Las pulgas se controlan con pipetas de fipronil.",
+}
+
+def make_index():
+    index = BM25Index()
+    for doc_id, text in CHUNKS.items():
+        index.add(doc_id, text, {"source": f"{doc_id}.md"})
+    return index
+
+def test_tokenize_normalizes_accents_case_and_stopwords():
+    assert tokenize("¿La vacuna ANTIRRÁBICA es obligatoria?") == ["vacuna", "antirrabica", "obligatoria"]
+    assert tokenize("vacunas") == tokenize("vacuna")
+
+def test_exact_terms_rank_first():
+    index = make_index()
+
+    assert index.search("antirrabica", k=1)[0][0] == "vacunas"
+    assert index.search("¿Quién transmite la toxocariasis?", k=1)[0][0] == "parasitos"
+    assert index.search("fipronil", k=5) == [("pulgas", index.search("fipronil", k=1)[0][1])]
+    assert index.search("jirafa") == []
+
+def test_remove_and_persistence(tmp_path):
+    index = make_index()
+    index.remove("pulgas")
+    index.save(str(tmp_path / "lexical.json"))
+
+    loaded = BM25Index.load(str(tmp_path / "lexical.json"))
+
+    assert len(loaded) == 3 and "fipronil" not in loaded.postings
+    assert loaded.search("perros gatos") == index.search("perros gatos")
+    assert loaded.document("vacunas").metadata == {"source": "vacunas.md"}
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+
+def test_hybrid_retriever_surfaces_lexical_matches(tmp_path):
+    vs = Chroma.from_texts(list(CHUNKS.values()), DeterministicFakeEmbedding(size=16), ids=list(CHUNKS),
+                           persist_directory=str(tmp_path / "chroma"))
+    retriever = HybridRetriever(vectorstore=vs, lexical=BM25Index.from_store(vs), k=2, fetch_k=4)
+
+    docs = retriever.invoke("fipronil")
+
+    # los embeddings falsos son aleatorios: el término exacto llega por el lado léxico
+    assert "pulgas" in [d.id for d in docs]
+    pulgas = next(d for d in docs if d.id == "pulgas")
+    assert {"rrf_score", "bm25_score", "relevance_score"} <= set(pulgas.metadata)
+
+def test_hybrid_mode_persists_lexical_index(live_kb, monkeypatch, tmp_path):
+    monkeypatch.setattr(vectorstore, "RETRIEVER_MODE", "hybrid")
+    monkeypatch.setattr(vectorstore, "LEXICAL_INDEX_PATH", str(tmp_path / "lexical"))
+    (live_kb / "vacunas.md").write_text(CHUNKS["vacunas"], encoding="utf-8")
+
+    retriever = vectorstore.get_retriever()
+
+    assert isinstance(retriever, HybridRetriever)
+    assert len(list((tmp_path / "lexical").iterdir())) == 1
+    assert retriever.invoke("antirrábica")[0].page_content == CHUNKS["vacunas"]
@@ -0,0 +1,79 @@
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.core import vectorstore
+from src.core.numpy_index import NumpyVectorStore
+
+## tests del índice NumPy en mmap (embeddings falsos, sin OpenAI)
+
+TEXTS = [
+    "La vacuna antirrábica es obligatoria.",
+    "Las pulgas se controlan con pipetas.",
+    "Los cachorros comen cuatro veces al día.",
+    "El gato necesita arenero limpio.",
+    "La desparasitación interna es trimestral.",
+]
+
+def make_store(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    metadatas = [{"source": f"doc{i}.md"} for i in range(len(TEXTS))]
+    store = NumpyVectorStore.from_texts(TEXTS, embeddings, metadatas, ids=[f"id{i}" for i in range(len(TEXTS))],
+                                        path=str(tmp_path / "index"))
+    return store, embeddings
+
+def test_top_k_matches_brute_force(tmp_path):
+    store, embeddings = make_store(tmp_path)
+    query = "¿cada cuánto se desparasita?"
+
+    results = store.similarity_search_with_score(query, k=3)
+
+    matrix = np.asarray(embeddings.embed_documents(TEXTS))
+    vector = np.asarray(embeddings.embed_query(query))
+    cosine = matrix @ vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector))
+    expected = [TEXTS[i] for i in np.argsort(-cosine)[:3]]
+    assert [doc.page_content for doc, _ in results] == expected
+    assert [round(s, 5) for _, s in results] == [round(float(c), 5) for c in sorted(cosine, reverse=True)[:3]]
+
+def test_matrix_is_memory_mapped(tmp_path):
+    store, _ = make_store(tmp_path)
+    assert isinstance(store.matrix, np.memmap)
+    assert store.matrix.dtype == np.float32 and store.matrix.shape == (5, 16)
+
+def test_mmr_retriever_and_get_by_ids(tmp_path):
+    store, _ = make_store(tmp_path)
+
+    docs = store.as_retriever(search_type="mmr", search_kwargs={"k": 3, "fetch_k": 5}).invoke("vacunas")
+
+    assert len(docs) == 3 and len({d.id for d in docs}) == 3
+    assert [d.metadata["source"] for d in store.get_by_ids(["id1", "no-existe"])] == ["doc1.md"]
+
+def test_numpy_backend_is_exported_once_per_index_version(live_kb, monkeypatch, tmp_path):
+    monkeypatch.setattr(vectorstore, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(vectorstore, "NUMPY_INDEX_PATH", str(tmp_path / "numpy"))
+    (live_kb / "vacunas.md").write_text(TEXTS[0], encoding="utf-8")
+
+    vs = vectorstore.get_vectorstore()
+    assert isinstance(vs, NumpyVectorStore)
+    assert [d.page_content for d in vs.similarity_search("vacuna", k=1)] == [TEXTS[0]]
+
+    # un reinicio sin cambios reutiliza el export existente
+    exports = sorted(p.name for p in (tmp_path / "numpy").iterdir())
+    monkeypatch.setattr(vectorstore, "_active", vectorstore._active._replace(vectorstore=None))
+    vectorstore.get_vectorstore()
+    assert sorted(p.name for p in (tmp_path / "numpy").iterdir()) == exports
+
+    # la recarga ingesta sobre Chroma y publica un export nuevo
+    (live_kb / "pulgas.txt").write_text(TEXTS[1], encoding="utf-8")
+    assert vectorstore.reload_vectorstore()
+    assert len(vectorstore.get_vectorstore()) == 2
+
+def test_snapshot_opens_numpy_index(tmp_path, fake_embeddings, monkeypatch):
+    data_path = tmp_path / "info-mascotas"
+    data_path.mkdir()
+    (data_path / "vacunas.md").write_text(TEXTS[0], encoding="utf-8")
+    vectorstore.build_snapshot(str(data_path), str(tmp_path / "snapshots"), name="v1")
+    monkeypatch.setattr(vectorstore, "VECTOR_BACKEND", "numpy")
+
+    vs = vectorstore.open_snapshot("v1", str(tmp_path / "snapshots"))
+
+    assert isinstance(vs, NumpyVectorStore)
+    assert vs.documents == [TEXTS[0]]
@@ -0,0 +1,183 @@
+import threading
+import pytest
+import fitz
+from src.core import ocr
+
+## tests del OCR paralelo: se generan PDFs "escaneados" (páginas que son solo una imagen)
+
+def make_pdf(path, pages):
+    """crea un PDF donde cada página es ('text', ...) con capa de texto o ('img'/'color', ...) escaneada"""
+    out = fitz.open()
+    for kind, text in pages:
+        if kind == "text":
+            page = out.new_page()
+            page.insert_text((72, 72), text, fontsize=12)
+        else:
+            src = fitz.open()
+            src_page = src.new_page(width=400, height=200)
+            if kind == "color":
+                # texto azul sobre fondo amarillo: el orden de los canales importa
+                src_page.draw_rect(src_page.rect, color=None, fill=(1, 0.85, 0.2))
+            src_page.insert_text((20, 100), text, fontsize=28, color=(0.1, 0.2, 0.8) if kind == "color" else None)
+            page = out.new_page(width=400, height=200)
+            page.insert_image(page.rect, pixmap=src_page.get_pixmap(dpi=100))
+    out.save(str(path))
+    return str(path)
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """cada test usa su propia caché OCR, nunca la de data/"""
+    monkeypatch.setattr(ocr, "OCR_CACHE_PATH", str(tmp_path / "ocr_cache.sqlite"))
+    monkeypatch.setattr(ocr, "_cache", None)
+    yield
+    if ocr._cache is not None:
+        ocr._cache.close()
+
+@pytest.fixture(scope="module")
+def pdfs(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("pdfs")
+    a = make_pdf(tmp / "a.pdf", [
+        ("img", "VACUNA"),
+        ("text", "Texto seleccionable de la segunda pagina con mas de cincuenta caracteres."),
+        ("img", "PULGAS"),
+    ])
+    b = make_pdf(tmp / "b.pdf", [("img", "TOXOCARIASIS")])
+    return [a, b]
+
+def summarize(results):
+    return [(path, [(d.metadata["page"], d.page_content) for d in docs]) for path, docs in results]
+
+def test_scanned_pages_are_ocred_in_page_order(pdfs):
+    results = summarize(ocr.load_pdfs(pdfs, workers=1))
+
+    assert [path for path, _ in results] == pdfs
+    pages = results[0][1]
+    assert [page for page, _ in pages] == [1, 2, 3]
+    assert "VACUNA" in pages[0][1]
+    assert "segunda pagina" in pages[1][1]
+    assert "PULGAS" in pages[2][1]
+    assert "TOXOCARIASIS" in results[1][1][0][1]
+
+def test_process_pool_matches_serial_result(pdfs):
+    serial = summarize(ocr.load_pdfs(pdfs, workers=1))
+    parallel = summarize(ocr.load_pdfs(pdfs, workers=3))
+
+    assert parallel == serial
+
+def test_pool_uses_spawn_and_no_pdf_stays_open(pdfs, monkeypatch):
+    contexts = []
+    original_pool = ocr.ProcessPoolExecutor
+    def recording_pool(**kwargs):
+        contexts.append(kwargs["mp_context"].get_start_method())
+        return original_pool(**kwargs)
+    monkeypatch.setattr(ocr, "ProcessPoolExecutor", recording_pool)
+
+    list(ocr.load_pdfs(pdfs, workers=2))
+    list(ocr.load_pdfs(pdfs, workers=1))
+
+    assert contexts == ["spawn"]
+    assert ocr._open_doc.current == (None, None)
+
+def test_broken_pdf_is_reported_without_stopping_others(pdfs, tmp_path):
+    broken = tmp_path / "roto.pdf"
+    broken.write_bytes(b"esto no es un pdf")
+
+    results = dict(ocr.load_pdfs([str(broken), pdfs[1]], workers=1))
+
+    assert results[str(broken)] is None
+    assert "TOXOCARIASIS" in results[pdfs[1]][0].page_content
+
+def test_unchanged_pages_are_served_from_cache(pdfs, monkeypatch):
+    stats = {}
+    first = summarize(ocr.load_pdfs(pdfs, workers=1, stats=stats))
+    assert stats == {"ocr_cache_hits": 0, "ocr_cache_misses": 3}
+
+    # si el motor se llegara a usar, el test falla
+    def no_engine():
+        raise AssertionError("no debería ejecutarse OCR con la caché llena")
+    monkeypatch.setattr(ocr, "_get_engine", no_engine)
+
+    stats = {}
+    second = summarize(ocr.load_pdfs(pdfs, workers=1, stats=stats))
+
+    assert second == first
+    assert stats == {"ocr_cache_hits": 3, "ocr_cache_misses": 0}
+
+def test_cache_key_depends_on_engine_version(pdfs, monkeypatch):
+    page = fitz.open(pdfs[1])[0]
+    pix = page.get_pixmap()
+    key = ocr.page_cache_key(pix)
+
+    monkeypatch.setattr(ocr, "ENGINE_VERSION", "otra-version")
+
+    assert ocr.page_cache_key(pix) != key
+    assert ocr.page_cache_key(page.get_pixmap()) == ocr.page_cache_key(pix)
+
+def test_pixmap_array_is_a_view_equal_to_png_decode(pdfs):
+    from io import BytesIO
+    import numpy as np
+    from PIL import Image
+
+    pix = ocr.render_page(fitz.open(pdfs[1])[0])
+    array = ocr.pixmap_to_array(pix)
+    decoded = np.array(Image.open(BytesIO(pix.tobytes("png"))))
+
+    assert np.array_equal(array, decoded)
+    # sin copias: el arreglo apunta al mismo buffer del pixmap
+    assert np.shares_memory(array, np.frombuffer(pix.samples_mv, dtype=np.uint8))
+
+def test_color_page_reads_like_the_png_path(tmp_path, monkeypatch):
+    import cv2
+    import numpy as np
+    path = make_pdf(tmp_path / "color.pdf", [("color", "DESPARASITAR")])
+    engine = ocr._get_engine()
+    seen = []
+    monkeypatch.setattr(ocr, "_get_engine", lambda: lambda image: seen.append(image) or engine(image))
+
+    text, _, _ = ocr.ocr_page(path, 0)
+
+    # camino anterior: PNG decodificado como lo hace OpenCV (BGR)
+    pix = ocr.render_page(fitz.open(path)[0])
+    decoded = cv2.imdecode(np.frombuffer(pix.tobytes("png"), dtype=np.uint8), cv2.IMREAD_COLOR)
+    png_result, _ = engine(decoded)
+
+    assert np.array_equal(seen[0], decoded)
+    assert "DESPARASITAR" in text
+    assert text == "\n".join(line[1] for line in png_result)
+
+def test_grayscale_render_is_ocred(pdfs, monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_COLORSPACE", "gray")
+    monkeypatch.setattr(ocr, "OCR_DPI", 96)
+
+    pix = ocr.render_page(fitz.open(pdfs[1])[0])
+    assert ocr.pixmap_to_array(pix).ndim == 2
+
+    results = dict(ocr.load_pdfs([pdfs[1]], workers=1))
+    assert "TOXOCARIASIS" in results[pdfs[1]][0].page_content
+
+def test_pdfs_are_read_lazily_with_backpressure(pdfs, monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_MAX_PENDING_PAGES", 2)
+    read = []
+    original = ocr._read_text_layer
+    def recording_read(path):
+        read.append(path)
+        return original(path)
+    monkeypatch.setattr(ocr, "_read_text_layer", recording_read)
+
+    results = ocr.load_pdfs([pdfs[1]] * 6, workers=1)
+    next(results)
+
+    # al entregar el primer archivo solo se leyó la ventana, no todo el corpus
+    assert len(read) <= 3
+    assert len(list(results)) == 5
+
+def test_pdfs_can_be_loaded_from_another_thread(pdfs):
+    # la caché la abre el hilo principal y la usa después el watcher de ingesta
+    first = summarize(ocr.load_pdfs(pdfs, workers=1))
+    results = []
+
+    worker = threading.Thread(target=lambda: results.extend(summarize(ocr.load_pdfs(pdfs, workers=1))))
+    worker.start()
+    worker.join()
+
+    assert results == first
@@ -0,0 +1,90 @@
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.core import vectorstore
+from src.core.query_cache import QueryCache, normalize_question
+from src.core.retrieval import MMRRetriever
+
+## tests de la caché de embeddings de consulta y de resultados (sin OpenAI)
+
+class QueryCountingEmbeddings(DeterministicFakeEmbedding):
+    """embeddings falsos que cuentan las consultas embebidas"""
+    queries: int = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_normalize_question():
+    assert normalize_question("  ¿Cada cuánto VACUNO   a mi perro? ") == "cada cuánto vacuno a mi perro"
+
+def test_entries_expire_after_ttl():
+    timer = FakeTimer()
+    cache = QueryCache(maxsize=10, ttl=60, timer=timer)
+    cache.put_results("pulgas", "scope", [("id1", 1.0, {})])
+
+    timer.now = 59
+    assert cache.get_results("pulgas", "scope") is not None
+    timer.now = 61
+    assert cache.get_results("pulgas", "scope") is None
+
+def test_least_recently_used_is_evicted():
+    cache = QueryCache(maxsize=2, ttl=60)
+    calls = []
+    embed = lambda q: calls.append(q) or [1.0]
+    cache.embed_query("vacunas", "m", embed)
+    cache.embed_query("pulgas", "m", embed)
+    cache.embed_query("vacunas", "m", embed)  # "pulgas" pasa a ser el menos usado
+    cache.embed_query("dieta", "m", embed)
+
+    cache.embed_query("vacunas", "m", embed)
+    cache.embed_query("pulgas", "m", embed)
+
+    assert calls == ["vacunas", "pulgas", "dieta", "pulgas"]
+    assert cache.stats["embedding_hits"] == 2
+
+def test_index_version_change_drops_results_but_keeps_embeddings():
+    cache = QueryCache(maxsize=10, ttl=60)
+    cache.set_version(1)
+    cache.embed_query("pulgas", "m", lambda q: [1.0])
+    cache.put_results("pulgas", "scope", [("id1", 1.0, {})])
+
+    cache.set_version(2)
+
+    assert cache.get_results("pulgas", "scope") is None
+    assert cache.embed_query("pulgas", "m", lambda q: [2.0]) == [1.0]
+
+def test_repeated_question_skips_embedding_and_search(tmp_path, monkeypatch):
+    embeddings = QueryCountingEmbeddings(size=16)
+    vs = Chroma.from_texts(["La vacuna antirrábica es obligatoria.", "Las pulgas se controlan con pipetas."],
+                           embeddings, persist_directory=str(tmp_path / "chroma"))
+    retriever = MMRRetriever(vectorstore=vs, k=2, cache=QueryCache(maxsize=10, ttl=60))
+    first = retriever.invoke("¿Cada cuánto vacuno a mi perro?")
+
+    def no_search(*args, **kwargs):
+        raise AssertionError("la pregunta repetida no debe consultar el índice")
+    monkeypatch.setattr("src.core.retrieval.fetch_candidates", no_search)
+    again = retriever.invoke("cada cuánto vacuno a mi perro")
+
+    assert embeddings.queries == 1
+    assert [(d.id, d.page_content, d.metadata) for d in again] == [(d.id, d.page_content, d.metadata) for d in first]
+
+def test_retriever_is_reused_until_the_index_changes(live_kb):
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    retriever = vectorstore.get_retriever()
+    assert vectorstore.get_retriever() is retriever
+    retriever.invoke("vacuna")
+
+    (live_kb / "pulgas.txt").write_text("Las pulgas se controlan con pipetas.", encoding="utf-8")
+    vectorstore.reload_vectorstore()
+
+    new = vectorstore.get_retriever()
+    assert new is not retriever
+    assert len(new.cache.results) == 0
+    assert len(new.invoke("vacuna")) == 2
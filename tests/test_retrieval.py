@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from src.core.numpy_index import NumpyVectorStore
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage
+from src.agents import rag
+from src.core.retrieval import MMRRetriever, ScoredRetriever, ThresholdRetriever, adaptive_cutoff, mmr_select
+
+## tests del re-ranking MMR vectorizado (embeddings falsos, sin OpenAI)
+
+TEXTS = [
+    "La vacuna antirrábica es obligatoria.",
+    "La vacuna antirrábica se aplica cada año.",
+    "Las pulgas se controlan con pipetas.",
+    "Los cachorros comen cuatro veces al día.",
+    "El gato necesita arenero limpio.",
+    "La desparasitación interna es trimestral.",
+]
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.3, 0.5, 1.0])
+def test_selection_matches_reference_implementation(lambda_mult):
+    rng = np.random.default_rng(7)
+    query = rng.normal(size=32)
+    candidates = rng.normal(size=(60, 32))
+
+    selected, _ = mmr_select(query, candidates, k=10, lambda_mult=lambda_mult)
+
+    assert selected == maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=10)
+
+def test_scores_follow_the_mmr_formula():
+    rng = np.random.default_rng(3)
+    query = rng.normal(size=16)
+    candidates = rng.normal(size=(20, 16))
+
+    selected, scores = mmr_select(query, candidates, k=3, lambda_mult=0.5)
+
+    unit = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    relevance = unit @ (query / np.linalg.norm(query))
+    assert scores[0] == pytest.approx(relevance[selected[0]], abs=1e-5)
+    redundancy = max(unit[selected[2]] @ unit[j] for j in selected[:2])
+    assert scores[2] == pytest.approx(0.5 * relevance[selected[2]] - 0.5 * redundancy, abs=1e-5)
+
+def test_k_larger_than_candidates_and_empty_input():
+    assert mmr_select(np.ones(4), np.eye(4)[:2], k=5)[0] in ([0, 1], [1, 0])
+    assert mmr_select(np.ones(4), np.empty((0, 4)), k=5) == ([], [])
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_retriever_returns_scored_documents(tmp_path, backend):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    if backend == "numpy":
+        store = NumpyVectorStore.from_texts(TEXTS, embeddings, path=str(tmp_path / "index"))
+    else:
+        store = Chroma.from_texts(TEXTS, embeddings, persist_directory=str(tmp_path / "chroma"))
+    retriever = MMRRetriever(vectorstore=store, k=3, fetch_k=50)
+
+    docs = retriever.invoke("¿la vacuna antirrábica es obligatoria?")
+
+    assert len(docs) == 3 and len({d.page_content for d in docs}) == 3
+    assert all({"mmr_score", "relevance_score"} <= set(d.metadata) for d in docs)
+    # el primero es el más relevante: su puntaje MMR es su coseno con la pregunta
+    assert docs[0].metadata["mmr_score"] == pytest.approx(docs[0].metadata["relevance_score"])
+    assert docs[0].metadata["relevance_score"] == max(d.metadata["relevance_score"] for d in docs)
+
+@pytest.mark.parametrize("scores, expected", [
+    ([0.6, 0.5], 0),                    # nada supera el piso
+    ([0.95, 0.93, 0.91, 0.9], 4),       # todo relevante y sin codo
+    ([0.95, 0.93, 0.80, 0.79], 2),      # codo después del segundo
+    ([0.95, 0.70, 0.69], 2),            # min_k obliga a conservar dos
+    ([0.9] * 10, 5),                    # max_k
+])
+def test_adaptive_cutoff(scores, expected):
+    assert adaptive_cutoff(scores, min_score=0.75, elbow_gap=0.05, min_k=2, max_k=5) == expected
+
+class TableEmbeddings(Embeddings):
+    """embeddings fijos por texto, para controlar las similitudes"""
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts):
+        return [self.table[t] for t in texts]
+
+    def embed_query(self, text):
+        return self.table[text]
+
+VECTORS = {
+    "vacuna anual": [1.0, 0.0, 0.0],
+    "vacuna cachorro": [0.97, 0.24, 0.0],
+    "pulgas": [0.0, 1.0, 0.0],
+    "¿cada cuánto se vacuna?": [1.0, 0.05, 0.0],
+    "¿qué es la fotosíntesis?": [0.0, 0.0, 1.0],
+}
+
+@pytest.fixture
+def threshold_retriever(tmp_path):
+    texts = ["vacuna anual", "vacuna cachorro", "pulgas"]
+    store = NumpyVectorStore.from_texts(texts, TableEmbeddings(VECTORS), path=str(tmp_path / "index"))
+    return ThresholdRetriever(vectorstore=store, k=3, min_k=1, min_score=0.75, elbow_gap=0.05)
+
+def test_threshold_retriever_returns_only_relevant_chunks(threshold_retriever):
+    docs = threshold_retriever.invoke("¿cada cuánto se vacuna?")
+
+    assert [d.page_content for d in docs] == ["vacuna anual", "vacuna cachorro"]
+    assert docs[0].metadata["relevance_score"] > docs[1].metadata["relevance_score"] > 0.75
+
+def test_unanswerable_question_skips_the_llm(threshold_retriever, monkeypatch):
+    def no_llm():
+        raise AssertionError("sin contexto relevante no se debe llamar al LLM")
+    monkeypatch.setattr(rag, "get_retriever", lambda: threshold_retriever)
+    monkeypatch.setattr(rag, "get_llm", no_llm)
+    monkeypatch.setattr(rag, "get_faq_index", lambda: None)
+
+    result = rag.rag_node({"messages": [HumanMessage(content="¿qué es la fotosíntesis?")],
+                           "booking_info": {}, "next_step": "", "use_answer_cache": False})
+
+    assert "no encontré información" in result["messages"][0].content
+
+def test_async_search_runs_off_the_event_loop(threshold_retriever, monkeypatch):
+    threads = []
+    for name in ("_search", "_cached_results"):
+        original = getattr(ThresholdRetriever, name)
+        monkeypatch.setattr(ThresholdRetriever, name, lambda self, *args, original=original:
+                            threads.append(threading.current_thread()) or original(self, *args))
+
+    async def ask():
+        return threading.current_thread(), await threshold_retriever.ainvoke("¿cada cuánto se vacuna?")
+
+    loop_thread, docs = asyncio.run(ask())
+
+    assert [d.page_content for d in docs] == ["vacuna anual", "vacuna cachorro"]
+    assert len(threads) == 2 and loop_thread not in threads
+
+def test_async_rag_opens_the_index_off_the_event_loop(threshold_retriever, monkeypatch):
+    threads = []
+    monkeypatch.setattr(rag, "get_retriever", lambda: threads.append(threading.current_thread()) or threshold_retriever)
+    monkeypatch.setattr(rag, "get_faq_index", lambda: threads.append(threading.current_thread()))
+    monkeypatch.setattr(rag, "get_llm", lambda: pytest.fail("sin contexto relevante no se debe llamar al LLM"))
+
+    async def ask():
+        return threading.current_thread(), await rag.arag_node({"messages": [HumanMessage(content="¿qué es la fotosíntesis?")],
+                                                                "booking_info": {}, "next_step": "", "use_answer_cache": False})
+
+    loop_thread, result = asyncio.run(ask())
+
+    assert "no encontré información" in result["messages"][0].content
+    assert len(threads) == 2 and loop_thread not in threads
+
+def test_retrievers_must_define_their_search():
+    class NoSearch(ScoredRetriever):
+        pass
+
+    with pytest.raises(TypeError):
+        NoSearch(vectorstore=None)
@@ -0,0 +1,50 @@
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from src.agents import rag
+from src.graph import workflow
+from src.core.answer_cache import SemanticAnswerCache
+from src.core.query_cache import QueryCache
+from src.core.retrieval import MMRRetriever
+
+## tests del streaming de respuestas por el grafo (LLM falso que emite palabra por palabra, sin OpenAI)
+
+ANSWER = "La antirrábica se aplica una vez al año."
+
+def route_to(step):
+    return lambda state: {"next_step": step}
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    """grafo completo con el router fijo en preguntas técnicas y un RAG sobre embeddings falsos"""
+    vs = Chroma.from_texts(["La vacuna antirrábica se aplica una vez al año."], DeterministicFakeEmbedding(size=16),
+                           persist_directory=str(tmp_path / "chroma"))
+    retriever = MMRRetriever(vectorstore=vs, k=1, cache=QueryCache(maxsize=10, ttl=60))
+    monkeypatch.setattr(rag, "get_retriever", lambda: retriever)
+    monkeypatch.setattr(rag, "get_llm", lambda: GenericFakeChatModel(messages=iter([AIMessage(content=ANSWER)])))
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: SemanticAnswerCache(maxsize=10))
+    monkeypatch.setattr(rag, "get_faq_index", lambda: None)
+    monkeypatch.setattr(workflow, "router_node", route_to("technical_question"))
+    return workflow.create_graph()
+
+def initial_state(question):
+    return {"messages": [HumanMessage(content=question)], "booking_info": {}, "next_step": ""}
+
+def test_rag_answer_is_streamed_token_by_token(graph):
+    events = list(workflow.stream_graph(graph, initial_state("¿Cada cuánto vacuno a mi perro?")))
+
+    tokens = [payload for kind, payload in events if kind == "token"]
+    kind, final = events[-1]
+    assert len(tokens) > 1
+    assert "".join(tokens) == ANSWER
+    assert kind == "final" and final["messages"][-1].content == ANSWER
+
+def test_non_generated_answers_only_arrive_in_final_state(graph, monkeypatch):
+    monkeypatch.setattr(workflow, "router_node", route_to("escalate_to_human"))
+
+    events = list(workflow.stream_graph(workflow.create_graph(), initial_state("Mi perro no respira")))
+
+    assert [kind for kind, _ in events] == ["final"]
+    assert "TICKET-" in events[0][1]["messages"][-1].content
@@ -0,0 +1,292 @@
+import json
+import threading
+import pytest
+from src.core import context, vectorstore
+
+## tests de la ingesta incremental: no usan OpenAI, se reemplazan los embeddings por unos falsos
+
+def test_initial_sync_indexes_all_files(kb):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    (data_path / "pulgas.txt").write_text("Las pulgas se controlan con pipetas.", encoding="utf-8")
+
+    stats = sync()
+
+    assert stats["added"] == 2
+    assert vs._collection.count() == 2
+    assert embeddings.embedded == 2
+
+def test_unchanged_files_are_not_reembedded(kb):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    sync()
+    embeddings.embedded = 0
+
+    stats = sync()
+
+    assert stats["unchanged"] == 1
+    assert embeddings.embedded == 0
+
+def test_changed_file_only_reembeds_new_chunks(kb):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    (data_path / "pulgas.txt").write_text("Las pulgas se controlan con pipetas.", encoding="utf-8")
+    sync()
+    embeddings.embedded = 0
+
+    (data_path / "pulgas.txt").write_text("Las garrapatas se controlan con collares.", encoding="utf-8")
+    stats = sync()
+
+    assert stats["changed"] == 1 and stats["unchanged"] == 1
+    assert embeddings.embedded == 1
+    contents = vs.get()["documents"]
+    assert "Las garrapatas se controlan con collares." in contents
+    assert "Las pulgas se controlan con pipetas." not in contents
+
+def test_deleted_file_removes_its_chunks(kb):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    (data_path / "pulgas.txt").write_text("Las pulgas se controlan con pipetas.", encoding="utf-8")
+    sync()
+
+    (data_path / "pulgas.txt").unlink()
+    stats = sync()
+
+    assert stats["deleted"] == 1
+    assert vs.get()["documents"] == ["La vacuna antirrábica es obligatoria."]
+
+def test_missing_manifest_rebuilds_from_scratch(kb, tmp_path):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    sync()
+    (tmp_path / "manifest.json").unlink()
+
+    sync()
+
+    # no debe quedar duplicado el fragmento del índice anterior
+    assert vs._collection.count() == 1
+
+class WordEncoding:
+    """encoding falso con la interfaz de tiktoken: un token por palabra"""
+    def encode(self, text):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+def test_tokenizer_fallback_does_not_force_a_reindex(kb, monkeypatch):
+    data_path, vs, embeddings, sync = kb
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    monkeypatch.setattr(context, "_encoding", WordEncoding())
+    sync()
+    embeddings.embedded = 0
+
+    # tiktoken sin su encoding (p. ej. sin red): los tokens se estiman por largo
+    monkeypatch.setattr(context, "_encoding", False)
+    stats = sync()
+
+    assert embeddings.embedded == 0
+    assert stats["unchanged"] == 1
+
+def test_streaming_sync_flushes_fixed_size_batches(kb, monkeypatch):
+    data_path, vs, embeddings, sync = kb
+    for i in range(5):
+        (data_path / f"nota{i}.txt").write_text(f"Nota número {i} sobre cuidados de mascotas.", encoding="utf-8")
+    monkeypatch.setattr(vectorstore, "INGEST_BATCH_SIZE", 2)
+
+    batch_sizes = []
+    original_add = vs.add_documents
+    def recording_add(documents, ids):
+        batch_sizes.append(len(documents))
+        return original_add(documents=documents, ids=ids)
+    monkeypatch.setattr(vs, "add_documents", recording_add)
+
+    progress = []
+    stats = vectorstore.sync_vectorstore(vs, str(data_path), str(data_path.parent / "manifest.json"),
+                                         on_progress=progress.append)
+
+    assert batch_sizes == [2, 2, 1]
+    assert vs._collection.count() == 5
+    assert stats["files_done"] == stats["files_total"] == 5
+    assert stats["chunks"] == 5 and stats["bytes"] > 0
+    # el progreso se informa en cada lote y nunca retrocede
+    chunks_seen = [p["chunks_added"] for p in progress]
+    assert chunks_seen == sorted(chunks_seen) and chunks_seen[-1] == 5
+
+def test_first_load_publishes_each_batch_before_the_last_file(live_kb, monkeypatch):
+    for i in range(3):
+        (live_kb / f"nota{i}.txt").write_text(f"Nota número {i} sobre cuidados de mascotas.", encoding="utf-8")
+    monkeypatch.setattr(vectorstore, "INGEST_BATCH_SIZE", 1)
+
+    searchable = []
+    original_load = vectorstore._load_files
+    def recording_load(file_paths, stats=None):
+        for item in original_load(file_paths, stats):
+            # antes de leer cada archivo, cuánto del índice publicado ya se puede consultar
+            store = vectorstore._active.vectorstore
+            searchable.append(store._collection.count() if store else 0)
+            yield item
+    monkeypatch.setattr(vectorstore, "_load_files", recording_load)
+
+    vectorstore.get_vectorstore()
+
+    assert searchable == [0, 1, 2]
+    assert vectorstore.get_vectorstore()._collection.count() == 3
+
+def test_build_snapshot_publishes_versioned_directory(tmp_path, fake_embeddings):
+    data_path = tmp_path / "info-mascotas"
+    data_path.mkdir()
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    snapshots = tmp_path / "snapshots"
+
+    snapshot_dir = vectorstore.build_snapshot(str(data_path), str(snapshots), name="v1")
+
+    info = json.loads((snapshots / "v1" / "snapshot.json").read_text(encoding="utf-8"))
+    assert snapshot_dir == str(snapshots / "v1")
+    assert info["chunk_count"] == 1 and info["files"] == 1
+    assert info["embedding_model"] == "CountingEmbeddings"
+    assert "total_s" in info["timings"]
+    assert (snapshots / "v1" / "manifest.json").exists()
+    assert (snapshots / "LATEST").read_text() == "v1"
+    # sin restos del directorio temporal
+    assert sorted(p.name for p in snapshots.iterdir()) == ["LATEST", "v1"]
+
+    # los snapshots son inmutables
+    with pytest.raises(FileExistsError):
+        vectorstore.build_snapshot(str(data_path), str(snapshots), name="v1")
+
+def test_failed_latest_update_keeps_previous_pointer(tmp_path, monkeypatch):
+    vectorstore._write_latest(str(tmp_path), "v1")
+
+    # simular una caída justo al publicar el puntero del snapshot nuevo
+    def crash(src, dst):
+        raise OSError("caída simulada")
+    monkeypatch.setattr(vectorstore.os, "replace", crash)
+
+    with pytest.raises(OSError):
+        vectorstore._write_latest(str(tmp_path), "v2")
+
+    assert (tmp_path / "LATEST").read_text() == "v1"
+
+def test_snapshot_mode_opens_read_only_without_ingesting(tmp_path, fake_embeddings, monkeypatch):
+    data_path = tmp_path / "info-mascotas"
+    data_path.mkdir()
+    (data_path / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    vectorstore.build_snapshot(str(data_path), str(tmp_path / "snapshots"), name="v1")
+
+    def no_sync(*args, **kwargs):
+        raise AssertionError("el modo snapshot no debe ingestar")
+    monkeypatch.setattr(vectorstore, "sync_vectorstore", no_sync)
+    monkeypatch.setattr(vectorstore, "SNAPSHOTS_PATH", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(vectorstore, "VECTORSTORE_SNAPSHOT", "latest")
+    monkeypatch.setattr(vectorstore, "_active", vectorstore._active._replace(vectorstore=None))
+
+    vs = vectorstore.get_vectorstore()
+
+    assert vs.get()["documents"] == ["La vacuna antirrábica es obligatoria."]
+
+def test_missing_snapshot_fails_fast(tmp_path, fake_embeddings):
+    with pytest.raises(FileNotFoundError):
+        vectorstore.open_snapshot("no-existe", str(tmp_path))
+
+def test_reload_only_processes_changed_files(live_kb, fake_embeddings, monkeypatch):
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    (live_kb / "pulgas.txt").write_text("Las pulgas se controlan con pipetas.", encoding="utf-8")
+    vs = vectorstore.get_vectorstore()
+    version = vectorstore.get_index_version()
+    fake_embeddings.embedded = 0
+
+    # lo que ve una consulta mientras se suben los fragmentos nuevos
+    visible = []
+    original_add = vs.add_documents
+    def recording_add(documents, ids):
+        visible.append(sorted(vs.get()["documents"]))
+        return original_add(documents=documents, ids=ids)
+    monkeypatch.setattr(vs, "add_documents", recording_add)
+
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica se aplica cada año.", encoding="utf-8")
+    (live_kb / "dieta.txt").write_text("Los cachorros comen cuatro veces al día.", encoding="utf-8")
+    assert vectorstore.reload_vectorstore()
+
+    # misma colección, sin copiarla: solo se embebieron los dos fragmentos nuevos
+    assert vectorstore.get_vectorstore() is vs
+    assert vectorstore.get_index_version() > version
+    assert fake_embeddings.embedded == 2
+    # el archivo modificado nunca quedó sin fragmentos; el obsoleto se borra al terminar
+    assert visible == [["La vacuna antirrábica es obligatoria.", "Las pulgas se controlan con pipetas."]]
+    assert sorted(vs.get()["documents"]) == [
+        "La vacuna antirrábica se aplica cada año.", "Las pulgas se controlan con pipetas.", "Los cachorros comen cuatro veces al día.",
+    ]
+
+    (live_kb / "pulgas.txt").unlink()
+    assert vectorstore.reload_vectorstore()
+    assert vs._collection.count() == 2
+    assert [c.name for c in vs._client.list_collections()] == [vs._collection.name]
+
+def test_concurrent_first_calls_build_the_index_once(live_kb, monkeypatch):
+    import time
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    syncs = []
+    original_sync = vectorstore.sync_vectorstore
+    def slow_sync(*args, **kwargs):
+        syncs.append(1)
+        time.sleep(0.2)
+        return original_sync(*args, **kwargs)
+    monkeypatch.setattr(vectorstore, "sync_vectorstore", slow_sync)
+
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(vectorstore.get_vectorstore())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(syncs) == 1
+    assert len(stores) == 4 and all(store is stores[0] for store in stores)
+
+def test_publish_swaps_store_and_side_indexes_together(live_kb, monkeypatch):
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    vectorstore.get_vectorstore()
+    before = vectorstore._active
+
+    vectorstore._publish("store-nuevo", lexical="bm25-nuevo", faq="faq-nueva")
+
+    # el índice anterior queda intacto para los lectores que ya lo tomaron
+    assert before.vectorstore is not None and before.lexical is None
+    assert vectorstore._active[:3] == ("store-nuevo", "bm25-nuevo", "faq-nueva")
+    assert vectorstore.get_index_version() > before.version
+
+def test_reload_without_changes_keeps_current_index(live_kb):
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    current = vectorstore.get_vectorstore()
+
+    assert not vectorstore.reload_vectorstore()
+    assert vectorstore.get_vectorstore() is current
+
+def test_reloaded_index_survives_restart(live_kb, monkeypatch):
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    vectorstore.get_vectorstore()
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica se aplica cada año.", encoding="utf-8")
+    vectorstore.reload_vectorstore()
+
+    # simular un reinicio del proceso
+    monkeypatch.setattr(vectorstore, "_active", vectorstore._active._replace(vectorstore=None))
+    vs = vectorstore.get_vectorstore()
+
+    assert vs.get()["documents"] == ["La vacuna antirrábica se aplica cada año."]
+
+def test_watcher_reloads_in_background(live_kb):
+    import time
+    (live_kb / "vacunas.md").write_text("La vacuna antirrábica es obligatoria.", encoding="utf-8")
+    vectorstore.get_vectorstore()
+    version = vectorstore.get_index_version()
+    vectorstore.start_watcher(str(live_kb))
+    time.sleep(0.5)
+
+    (live_kb / "pulgas.txt").write_text("Las pulgas se controlan con pipetas.", encoding="utf-8")
+
+    deadline = time.time() + 15
+    while vectorstore.get_index_version() == version and time.time() < deadline:
+        time.sleep(0.1)
+    assert vectorstore.get_index_version() == version + 1
+    assert vectorstore.get_vectorstore()._collection.count() == 2